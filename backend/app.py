@@ -1,14 +1,20 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 import logging
 import os
 from datetime import datetime
-from config import DB_CONFIG, POOL_CONFIG, API_CONFIG, APP_CONFIG, SECURITY_CONFIG, StatusCode, Messages
+from config import DB_CONFIG, POOL_CONFIG, API_CONFIG, APP_CONFIG, SECURITY_CONFIG, METRICS_CONFIG, StatusCode, Messages
 from utils import api_response, handle_api_error
 from routes.auth import auth_bp
 from routes.queries import queries_bp
+from routes.export import export_bp
 from auth import permission_required
-from db import get_db
+from db import get_db, get_read_db, close_request_db, get_pool_stats, PoolTimeoutError, QueryTimeoutError, replica_monitor
+from cache import query_cache, refresh_scheduler
+from compression import StaticAssetManifest, compress_response
+import metrics
+import profiling
+from sql_trace import slow_sql_log, explain as explain_statement
 
 # 配置日志
 logging.basicConfig(
@@ -40,6 +46,50 @@ app.config['MAX_CONTENT_LENGTH'] = SECURITY_CONFIG.get('MAX_CONTENT_LENGTH', 16
 # 注册蓝图
 app.register_blueprint(auth_bp, url_prefix='/api')
 app.register_blueprint(queries_bp, url_prefix='/api')
+app.register_blueprint(export_bp, url_prefix='/api')
+
+# 启动时建立前端静态资源清单（preload_app模式下由所有工作进程共享），前端重新构建后自动重新扫描
+static_manifest = StaticAssetManifest(APP_CONFIG['frontend_dist']).load()
+
+# 较大的JSON响应按Accept-Encoding进行gzip压缩
+app.after_request(compress_response)
+
+# 请求结束时归还请求绑定的数据库连接
+app.teardown_appcontext(close_request_db)
+
+# 记录每个接口的延迟、状态码、数据库耗时和序列化耗时
+if METRICS_CONFIG['enabled']:
+    metrics.init_app(app)
+
+# 管理员按需分析单个请求的Python耗时（?__profile=1）
+profiling.init_app(app)
+
+@app.errorhandler(PoolTimeoutError)
+def handle_pool_timeout(error):
+    """连接池排队超时，返回503让客户端稍后重试"""
+    logger.warning(f"数据库连接池排队超时: {error}")
+    response, status_code = api_response(
+        success=False,
+        message=Messages.SERVER_BUSY,
+        status_code=StatusCode.SERVICE_UNAVAILABLE
+    )
+    response.headers['Retry-After'] = '1'
+    return response, status_code
+
+@app.errorhandler(QueryTimeoutError)
+def handle_query_timeout(error):
+    """查询超过执行时间预算，提示用户缩小查询范围"""
+    logger.warning(f"查询超过执行时间预算 {request.method} {request.full_path}: {error}")
+    return api_response(
+        success=False,
+        message=Messages.QUERY_TOO_EXPENSIVE,
+        data={
+            'error': 'QUERY_TOO_EXPENSIVE',
+            'timeout': error.timeout,
+            'path': request.path
+        },
+        status_code=StatusCode.UNPROCESSABLE
+    )
 
 def check_tables_exist():
     """检查必要的数据表是否存在 - 缓存结果避免重复查询"""
@@ -112,6 +162,7 @@ def update_comments():
             return api_response(success=False, message="未找到相关记录或更新失败")
         
         db.commit()
+        query_cache.invalidate('load_user_query_stats')
         return api_response(success=True, message=f"更新成功，状态已更新为{reviewed_status}")
         
     except Exception as e:
@@ -140,65 +191,80 @@ def health_check():
         }
     )
 
+@app.route('/api/system/pool')
+@permission_required('SYSTEM_LOGS')
+def pool_stats():
+    """数据库连接池统计（当前工作进程）"""
+    return api_response(success=True, message="查询成功", data=get_pool_stats())
+
+@app.route('/api/system/slow-sql')
+@permission_required('SYSTEM_LOGS')
+@handle_api_error("QUERY_ERROR")
+def slow_sql():
+    """本系统接口自身的慢SQL（汇总所有工作进程），explain=1 时附带执行计划"""
+    limit = min(request.args.get('limit', 50, type=int), API_CONFIG['SQL_TRACE_BUFFER_SIZE'])
+    entries = slow_sql_log.recent(limit)
+
+    if request.args.get('explain', '').lower() in ('1', 'true', 'yes'):
+        db = get_read_db()
+        for entry in entries:
+            if not entry.get('explainable'):
+                continue
+            try:
+                entry['plan'] = explain_statement(db, entry)
+            except Exception as e:
+                entry['explain_error'] = str(e)
+
+    return api_response(
+        success=True,
+        message="查询成功",
+        data={
+            'threshold': slow_sql_log.threshold,
+            'enabled': slow_sql_log.enabled,
+            'items': entries
+        }
+    )
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus抓取接口，汇总所有工作进程的指标"""
+    if not METRICS_CONFIG['enabled']:
+        return jsonify({"error": "Not Found", "path": "metrics"}), 404
+    token = METRICS_CONFIG['token']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return Response("unauthorized\n", status=StatusCode.UNAUTHORIZED, mimetype='text/plain')
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/')
 def index():
     """根路径重定向到前端页面"""
-    # 使用绝对路径确保路径正确
-    frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'frontend', 'dist'))
-    index_file = os.path.join(frontend_path, 'index.html')
-    
-    # 调试信息
-    logger.debug(f"Frontend path: {frontend_path}")
-    logger.debug(f"Index file path: {index_file}")
-    logger.debug(f"Index file exists: {os.path.exists(index_file)}")
-    
-    if os.path.exists(index_file):
-        return send_from_directory(frontend_path, 'index.html')
-    else:
-        return jsonify({
-            "message": "慢查询分析系统后端API",
-            "api_docs": "/api/health",
-            "version": "1.0.0",
-            "frontend": f"前端文件未找到，路径: {frontend_path}",
-            "debug": {
-                "frontend_path": frontend_path,
-                "index_exists": os.path.exists(index_file),
-                "current_dir": os.getcwd()
-            }
-        })
+    response = static_manifest.serve('index.html')
+    if response is not None:
+        return response
+
+    return jsonify({
+        "message": "慢查询分析系统后端API",
+        "api_docs": "/api/health",
+        "version": "1.0.0",
+        "frontend": f"前端文件未找到，路径: {static_manifest.root}",
+        "debug": {
+            "frontend_path": static_manifest.root,
+            "index_exists": False,
+            "current_dir": os.getcwd()
+        }
+    })
 
 @app.route('/<path:path>')
 def serve_static(path):
-    """提供前端静态文件 - 优化版本"""
-    # 使用绝对路径确保路径正确
-    frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'frontend', 'dist'))
-    
-    # 检查文件是否存在
-    file_path = os.path.join(frontend_path, path)
-    logger.debug(f"Serving static file: {path}, full path: {file_path}")
-    
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        response = send_from_directory(frontend_path, path)
-        
-        # 添加缓存头以提高加载速度
-        if path.endswith(('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.ico', '.svg', '.woff', '.woff2', '.ttf', '.eot')):
-            response.headers['Cache-Control'] = 'public, max-age=31536000'  # 1年缓存
-            response.headers['Expires'] = 'Thu, 31 Dec 2025 23:59:59 GMT'
-        elif path.endswith('.html'):
-            response.headers['Cache-Control'] = 'public, max-age=3600'  # 1小时缓存
-        
-        # 启用压缩
-        if path.endswith(('.js', '.css', '.html', '.json')):
-            response.headers['Content-Encoding'] = 'gzip'
-            
+    """提供前端静态文件 - 使用启动时建立的清单和构建时预压缩的文件"""
+    response = static_manifest.serve(path)
+    if response is not None:
         return response
     
     # 如果文件不存在且不是API路径，返回index.html (SPA路由)
     if not path.startswith('api/'):
-        index_file = os.path.join(frontend_path, 'index.html')
-        if os.path.exists(index_file):
-            response = send_from_directory(frontend_path, 'index.html')
-            response.headers['Cache-Control'] = 'public, max-age=3600'
+        response = static_manifest.serve('index.html')
+        if response is not None:
             return response
     
     # API路径或其他情况返回404
@@ -211,4 +277,8 @@ if __name__ == '__main__':
     debug = APP_CONFIG.get('debug', True)
     
     logger.info(f"Starting application on {host}:{port} (debug={debug})")
+    metrics.reset_metrics_dir()
+    refresh_scheduler.start()
+    replica_monitor.start()
+    metrics.periodic_flusher.start()
     app.run(host=host, port=port, debug=debug)
\ No newline at end of file
@@ -102,6 +102,7 @@ def permission_required(permission_code):
         @login_required
         def decorated_function(*args, **kwargs):
             from db import get_db
+            # 权限校验始终读主库: 只读副本可能有延迟，撤销的权限和禁用的用户须立即生效
             db = get_db()
             try:
                 permissions = get_user_permissions(db, g.user_id)
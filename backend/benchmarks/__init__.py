@@ -0,0 +1,4 @@
+"""
+性能基准测试
+在backend目录下运行，例如: python -m benchmarks.bench_serialization
+"""
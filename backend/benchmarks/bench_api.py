@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询接口压力测试
+seed: 向本地MySQL写入指定数量的指纹和明细（指纹热度、用户分布均为Zipf倾斜），用于评估千万/亿级明细下的接口表现
+run:  以多个已登录的并发客户端请求 列表/详情/按用户统计/用户列表/数据库列表 接口，
+      报告每个接口的 p50/p95/p99 延迟和吞吐量，结果可写入JSON便于对比表结构或缓存改动前后的差异
+
+使用方法（backend目录下）:
+    python -m benchmarks.bench_api seed --fingerprints 50000 --details 10000000 --truncate
+    python -m benchmarks.bench_api run --url http://127.0.0.1:5172 --clients 20 --duration 60 --json result.json
+seed 使用 config.DB_CONFIG（可通过 DB_HOST/DB_NAME 等环境变量指定），请只对测试库使用
+"""
+
+import argparse
+import bisect
+import hashlib
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote, urlencode, urlparse
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from benchmarks.bench_concurrency import percentile
+from benchmarks.slowlog_generator import SqlTemplate
+
+# 接口及默认请求比例，接近前端实际的访问分布
+ENDPOINTS = {
+    'list': 0.4,
+    'detail': 0.3,
+    'by_user': 0.15,
+    'users': 0.1,
+    'databases': 0.05,
+}
+
+REVIEW_STATUSES = ['待优化', '待优化', '待优化', '已优化', '无需优化']
+
+
+def zipf_cumulative(count, exponent):
+    weights = [1.0 / ((rank + 1) ** exponent) for rank in range(count)]
+    total = sum(weights)
+    cumulative = []
+    acc = 0.0
+    for weight in weights:
+        acc += weight / total
+        cumulative.append(acc)
+    return cumulative
+
+
+def zipf_pick(rng, cumulative):
+    return min(bisect.bisect_left(cumulative, rng.random()), len(cumulative) - 1)
+
+
+def normalize(sql):
+    """简化的归一化，只用于生成测试数据的指纹"""
+    sql = re.sub(r"'(?:[^'\\]|\\.)*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', sql)
+    return re.sub(r'\s+', ' ', sql).strip().upper()
+
+
+def seed_database(args):
+    """写入测试数据"""
+    import mysql.connector
+    from config import DB_CONFIG
+    from init_tables import init_tables
+    import rollups
+
+    init_tables()
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM slow_query_fingerprint")
+        existing = cursor.fetchone()[0]
+        if existing and not args.truncate:
+            print(f"{DB_CONFIG['database']} 中已有 {existing} 条指纹，使用 --truncate 清空后再写入")
+            return
+        if args.truncate:
+            print(f"清空 {DB_CONFIG['host']}/{DB_CONFIG['database']} 的慢查询数据...")
+            cursor.execute("DELETE FROM slow_query_detail")
+            cursor.execute("DELETE FROM slow_query_rollup")
+            cursor.execute("DELETE FROM slow_query_fingerprint")
+            conn.commit()
+
+        rng = random.Random(args.seed)
+        users = [f"app_user{i}" for i in range(args.users)]
+        user_weights = zipf_cumulative(len(users), args.zipf)
+        now = datetime.now().replace(microsecond=0)
+        begin = now - timedelta(days=args.days)
+
+        # 指纹: 模板按序号生成不同结构（序号越大别名越多，不会无限重复），用户按Zipf分布分配
+        started = time.time()
+        fingerprints = []
+        seen = set()
+        index = 0
+        while len(fingerprints) < args.fingerprints:
+            template = SqlTemplate(rng, index)
+            index += 1
+            raw_sql = template.render(rng)
+            normalized = normalize(raw_sql)
+            checksum = hashlib.md5(normalized.encode('utf-8')).hexdigest()
+            if checksum in seen:
+                continue
+            seen.add(checksum)
+            user = users[zipf_pick(rng, user_weights)]
+            first_seen = begin + timedelta(seconds=rng.randrange(args.days * 86400))
+            fingerprints.append((checksum, normalized, raw_sql, user, f"db_{users.index(user) % args.databases}",
+                                 first_seen, now, rng.choice(REVIEW_STATUSES), None))
+
+        for offset in range(0, len(fingerprints), args.batch_size):
+            cursor.executemany("""
+                INSERT INTO slow_query_fingerprint
+                (checksum, normalized_sql, raw_sql, username, dbname,
+                 first_seen, last_seen, reviewed_status, comments)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, fingerprints[offset:offset + args.batch_size])
+            conn.commit()
+        print(f"已写入 {len(fingerprints)} 条指纹，耗时 {time.time() - started:.1f} 秒")
+
+        # 明细: 指纹按Zipf分布，少数热点SQL占大部分执行次数
+        started = time.time()
+        fingerprint_weights = zipf_cumulative(len(fingerprints), args.zipf)
+        span = args.days * 86400
+        written = 0
+        while written < args.details:
+            batch = []
+            for _ in range(min(args.batch_size, args.details - written)):
+                fp = fingerprints[zipf_pick(rng, fingerprint_weights)]
+                rows_sent = rng.randint(0, 5000)
+                batch.append((
+                    fp[0],
+                    fp[2],
+                    begin + timedelta(seconds=rng.randrange(span)),
+                    round(5 * rng.lognormvariate(0.4, 0.6), 6),
+                    round(rng.random() * 0.01, 6),
+                    rows_sent,
+                    rows_sent + rng.randint(0, 5000000),
+                ))
+            cursor.executemany("""
+                INSERT INTO slow_query_detail
+                (checksum, sql_text, timestamp, query_time, lock_time, rows_sent, rows_examined)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, batch)
+            conn.commit()
+            written += len(batch)
+            if written % (args.batch_size * 100) == 0 or written == args.details:
+                elapsed = time.time() - started
+                print(f"已写入 {written}/{args.details} 条明细 ({written / max(elapsed, 0.001):.0f} 行/秒)")
+
+        # 统计类接口读取按天汇总
+        started = time.time()
+        folded = rollups.backfill(conn, cursor)
+        print(f"已将 {folded} 条明细计入按天汇总，耗时 {time.time() - started:.1f} 秒")
+
+        cursor.execute("ANALYZE TABLE slow_query_fingerprint, slow_query_detail, slow_query_rollup")
+        cursor.fetchall()
+        print(f"写入完成: {len(fingerprints)} 条指纹，{written} 条明细，{len(users)} 个用户")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+class ApiClient:
+    """保持长连接的HTTP客户端，每个线程一个"""
+
+    def __init__(self, url, token=None, timeout=120):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.https = parsed.scheme == 'https'
+        self.timeout = timeout
+        self.token = token
+        self.conn = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.conn = cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None):
+        """返回 (状态码, 解析后的JSON或None)"""
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        for attempt in range(2):
+            if self.conn is None:
+                self._connect()
+            try:
+                self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # 服务端关闭了长连接，重连一次
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        try:
+            return response.status, json.loads(payload)
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def login(url, username, password):
+    client = ApiClient(url)
+    try:
+        status, payload = client.request('POST', '/api/login', {'username': username, 'password': password})
+    finally:
+        client.close()
+    if status != 200 or not payload or not payload.get('success'):
+        raise RuntimeError(f"登录失败: {payload.get('message') if payload else status}")
+    return payload['data']['token']
+
+
+def discover_targets(client, pages):
+    """从接口获取用于详情和按用户统计请求的校验和与用户名"""
+    checksums = []
+    for page in range(1, pages + 1):
+        status, payload = client.request('GET', f'/api/queries?page={page}&per_page=100')
+        if status != 200 or not payload or not payload.get('data'):
+            break
+        rows = payload['data']['data']
+        checksums.extend(row['checksum'] for row in rows)
+        if len(rows) < 100:
+            break
+    status, payload = client.request('GET', '/api/queries/users')
+    users = [row['username'] for row in payload['data']] if status == 200 and payload else []
+    if not checksums or not users:
+        raise RuntimeError("接口未返回任何慢查询数据，请先运行 seed")
+    return checksums, users
+
+
+def build_path(rng, endpoint, targets, max_page):
+    checksums, users = targets
+    if endpoint == 'list':
+        # 前几页访问最多，偶尔翻到深页
+        page = 1 if rng.random() < 0.6 else rng.randint(1, max_page)
+        query = {'page': page, 'per_page': 20}
+        if rng.random() < 0.3:
+            query['username'] = rng.choice(users)
+        return f"/api/queries?{urlencode(query)}"
+    if endpoint == 'detail':
+        # 热门SQL被查看得更多
+        return f"/api/queries/{checksums[min(int(rng.paretovariate(1.2)) - 1, len(checksums) - 1)]}"
+    if endpoint == 'by_user':
+        return f"/api/queries/stats/by-user/{quote(rng.choice(users))}"
+    if endpoint == 'users':
+        return "/api/queries/users"
+    return "/api/queries/databases"
+
+
+def run_load(args):
+    token = login(args.url, args.username, args.password)
+    discovery = ApiClient(args.url, token)
+    try:
+        targets = discover_targets(discovery, args.discover_pages)
+    finally:
+        discovery.close()
+    print(f"已获取 {len(targets[0])} 个校验和、{len(targets[1])} 个用户，"
+          f"{args.clients} 个客户端运行 {args.duration} 秒...")
+
+    weights = dict(ENDPOINTS)
+    if args.endpoints:
+        weights = {name: weight for name, weight in weights.items() if name in args.endpoints}
+    results = {name: {'latencies': [], 'errors': 0, 'status': {}} for name in weights}
+    lock = threading.Lock()
+    started = time.time()
+    stop_at = started + args.duration
+
+    def client(worker_id):
+        rng = random.Random(args.seed + worker_id)
+        api = ApiClient(args.url, token)
+        names = list(weights)
+        cumulative = []
+        acc = 0.0
+        for name in names:
+            acc += weights[name] / sum(weights.values())
+            cumulative.append(acc)
+        try:
+            while time.time() < stop_at:
+                endpoint = names[min(bisect.bisect_left(cumulative, rng.random()), len(names) - 1)]
+                path = build_path(rng, endpoint, targets, args.max_page)
+                start = time.perf_counter()
+                try:
+                    status, _ = api.request('GET', path)
+                except Exception:
+                    status = 0
+                elapsed = time.perf_counter() - start
+                with lock:
+                    result = results[endpoint]
+                    result['status'][str(status)] = result['status'].get(str(status), 0) + 1
+                    if status == 200:
+                        result['latencies'].append(elapsed)
+                    else:
+                        result['errors'] += 1
+        finally:
+            api.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.time() - started
+
+    report = {}
+    for name, result in results.items():
+        latencies = result['latencies']
+        report[name] = {
+            'requests': len(latencies) + result['errors'],
+            'errors': result['errors'],
+            'status': result['status'],
+            'throughput': round(len(latencies) / wall, 2),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2) if latencies else 0.0,
+        }
+    return wall, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查询接口压力测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed = subparsers.add_parser('seed', help='写入测试数据')
+    seed.add_argument('--fingerprints', type=int, default=10000, help='指纹数量 (默认: %(default)s)')
+    seed.add_argument('--details', type=int, default=1000000, help='明细数量 (默认: %(default)s)')
+    seed.add_argument('--users', type=int, default=50, help='用户数量 (默认: %(default)s)')
+    seed.add_argument('--databases', type=int, default=20, help='数据库数量 (默认: %(default)s)')
+    seed.add_argument('--days', type=int, default=90, help='明细的时间跨度（天），截止到当前时间 (默认: %(default)s)')
+    seed.add_argument('--zipf', type=float, default=1.1, help='指纹和用户分布的Zipf指数 (默认: %(default)s)')
+    seed.add_argument('--batch-size', type=int, default=5000, help='每批写入行数 (默认: %(default)s)')
+    seed.add_argument('--seed', type=int, default=42, help='随机种子 (默认: %(default)s)')
+    seed.add_argument('--truncate', action='store_true', help='写入前清空已有的慢查询数据')
+
+    run = subparsers.add_parser('run', help='运行压力测试')
+    run.add_argument('--url', default='http://127.0.0.1:5172', help='服务地址 (默认: %(default)s)')
+    run.add_argument('--username', default='admin', help='登录用户名 (默认: %(default)s)')
+    run.add_argument('--password', default=os.getenv('BENCH_PASSWORD', 'admin'),
+                     help='登录密码，也可通过 BENCH_PASSWORD 环境变量指定')
+    run.add_argument('--clients', type=int, default=10, help='并发客户端数 (默认: %(default)s)')
+    run.add_argument('--duration', type=int, default=30, help='测试时长秒数 (默认: %(default)s)')
+    run.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), help='只测试指定接口 (默认: 全部)')
+    run.add_argument('--max-page', type=int, default=50, help='列表接口翻页的最大页码 (默认: %(default)s)')
+    run.add_argument('--discover-pages', type=int, default=5, help='获取校验和时读取的列表页数 (默认: %(default)s)')
+    run.add_argument('--seed', type=int, default=42, help='随机种子 (默认: %(default)s)')
+    run.add_argument('--label', default='', help='写入JSON结果的标签，如分支名或改动说明')
+    run.add_argument('--json', metavar='PATH', help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        seed_database(args)
+        return
+
+    wall, report = run_load(args)
+    print(f"{'接口':>10} {'请求数':>8} {'错误':>6} {'吞吐(次/秒)':>12} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9}")
+    for name, item in report.items():
+        print(f"{name:>10} {item['requests']:>8} {item['errors']:>6} {item['throughput']:>12.1f} "
+              f"{item['p50_ms']:>9.1f} {item['p95_ms']:>9.1f} {item['p99_ms']:>9.1f}")
+    total = sum(item['requests'] - item['errors'] for item in report.values())
+    print(f"总吞吐量: {total / wall:.1f} 次/秒")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'label': args.label,
+                'generated_at': datetime.now().isoformat(timespec='seconds'),
+                'params': {'url': args.url, 'clients': args.clients, 'duration': args.duration,
+                           'endpoints': list(report), 'seed': args.seed},
+                'wall_seconds': round(wall, 2),
+                'throughput': round(total / wall, 2),
+                'endpoints': report,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发模式吞吐量基准测试
+依次以 sync / gthread / gevent 模式启动gunicorn，使用并发客户端发送混合的慢/快请求，
+报告各模式的吞吐量以及快请求的延迟（慢请求占满工作进程时快请求是否被阻塞）
+
+使用方法（backend目录下）:
+    python -m benchmarks.bench_concurrency --profiles sync gthread --duration 20
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from config import WORKER_PROFILES, get_worker_concurrency, get_pool_size
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def start_server(profile, port, workers):
+    settings = WORKER_PROFILES[profile]
+    cmd = [
+        sys.executable, '-m', 'gunicorn', 'benchmarks.mixed_app:app',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--worker-class', settings['worker_class'],
+        '--threads', str(settings['threads']),
+        '--worker-connections', str(settings['worker_connections']),
+        '--timeout', '120',
+        '--log-level', 'warning',
+    ]
+    proc = subprocess.Popen(cmd, cwd=backend_dir)
+
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/fast', timeout=1).read()
+            return proc
+        except Exception:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"{profile} 模式的gunicorn启动失败")
+
+
+def run_clients(port, clients, duration, slow_ratio):
+    results = {'slow': [], 'fast': [], 'errors': 0}
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client():
+        rng = random.Random()
+        while time.time() < stop_at:
+            kind = 'slow' if rng.random() < slow_ratio else 'fast'
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/{kind}', timeout=60).read()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    results[kind].append(elapsed)
+            except Exception:
+                with lock:
+                    results['errors'] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gunicorn并发模式吞吐量基准测试')
+    parser.add_argument('--profiles', nargs='+', default=list(WORKER_PROFILES),
+                        choices=list(WORKER_PROFILES), help='测试的并发模式')
+    parser.add_argument('--workers', type=int, default=2, help='工作进程数 (默认: %(default)s)')
+    parser.add_argument('--clients', type=int, default=20, help='并发客户端数 (默认: %(default)s)')
+    parser.add_argument('--duration', type=int, default=20, help='每个模式的测试时长秒数 (默认: %(default)s)')
+    parser.add_argument('--slow-ratio', type=float, default=0.1, help='慢请求比例 (默认: %(default)s)')
+    parser.add_argument('--port', type=int, default=18172, help='测试端口 (默认: %(default)s)')
+    args = parser.parse_args()
+
+    print(f"{'模式':>8} {'并发/进程':>9} {'连接池':>6} {'吞吐(req/s)':>12} {'快请求p50':>10} {'快请求p99':>10} {'慢请求数':>8} {'错误':>6}")
+    for profile in args.profiles:
+        try:
+            proc = start_server(profile, args.port, args.workers)
+        except Exception as e:
+            print(f"{profile:>8} 跳过: {e}")
+            continue
+        try:
+            results = run_clients(args.port, args.clients, args.duration, args.slow_ratio)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+        total = len(results['slow']) + len(results['fast'])
+        print(f"{profile:>8} {get_worker_concurrency(profile):>9} {get_pool_size(profile):>6} "
+              f"{total / args.duration:>12.1f} "
+              f"{percentile(results['fast'], 50) * 1000:>8.0f}ms "
+              f"{percentile(results['fast'], 99) * 1000:>8.0f}ms "
+              f"{len(results['slow']):>8} {results['errors']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQL指纹正确性与性能基准测试
+用 fingerprint_corpus 中的语料测试各解析器模块的 normalize_sql:
+- 指纹膨胀: 同一组变体产生的指纹数（理想为1），膨胀会让指纹表基数和所有聚合查询变大
+- 误合并: 不同结构的组被归为同一指纹
+- 与理想指纹完全一致的组数
+- 归一化吞吐量（条/秒、MB/秒）
+与保存的基线对比，指纹数增加、误合并增加或吞吐量下降超过容差时返回非0退出码
+
+使用方法（backend目录下，需要可导入各模块依赖的数据库驱动）:
+    python -m benchmarks.bench_fingerprint --save-baseline
+    python -m benchmarks.bench_fingerprint --verbose
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import re
+import sys
+import time
+from datetime import datetime
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from benchmarks.fingerprint_corpus import build_corpus
+
+PARSER_MODULES = [
+    'server_side_slow_log_parser_py3',
+    'server_side_slow_log_parser',
+    'slow_log_parser_clean',
+    'slow_log_parser_optimized',
+    'parse_slow_log',
+]
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'fingerprint.json')
+
+
+def load_normalizer(name):
+    """导入模块并返回其 normalize_sql，导入失败时返回错误信息"""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            module = importlib.import_module(name)
+            parser = module.SlowLogParser()
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    return parser.normalize_sql, None
+
+
+def canonical(fingerprint):
+    """忽略占位符引号和空白的差异，用于与理想指纹比较"""
+    fingerprint = re.sub(r"""(['"])\?\1""", '?', fingerprint)
+    return re.sub(r'\s+', ' ', fingerprint).strip()
+
+
+def evaluate(normalize, corpus):
+    """返回指纹质量统计和每组的明细"""
+    owners = {}
+    groups = []
+    for name, expected, queries in corpus:
+        fingerprints = {}
+        for sql in queries:
+            fingerprints.setdefault(normalize(sql), sql)
+        for fingerprint in fingerprints:
+            owners.setdefault(fingerprint, set()).add(name)
+        groups.append({
+            'group': name,
+            'variants': len(queries),
+            'fingerprints': len(fingerprints),
+            'exact': len(fingerprints) == 1 and canonical(next(iter(fingerprints))) == expected,
+            'samples': list(fingerprints)[:3],
+        })
+    merged = sorted(tuple(sorted(names)) for names in owners.values() if len(names) > 1)
+    return {
+        'groups': len(corpus),
+        'variants': sum(item['variants'] for item in groups),
+        'fingerprints': sum(item['fingerprints'] for item in groups),
+        'split_groups': sum(1 for item in groups if item['fingerprints'] > 1),
+        'merged_groups': sum(len(names) for names in merged),
+        'exact': sum(1 for item in groups if item['exact']),
+    }, groups, merged
+
+
+def throughput(normalize, queries, repeat):
+    """对整个语料取 repeat 次中最快的一次"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for sql in queries:
+            normalize(sql)
+        best = min(best, time.perf_counter() - start)
+    size = sum(len(sql.encode('utf-8')) for sql in queries)
+    return {
+        'seconds': round(best, 5),
+        'per_second': round(len(queries) / best, 1),
+        'mb_per_second': round(size / best / (1024 * 1024), 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """与基线对比，返回回归项列表"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or 'quality' not in current:
+            continue
+        quality, before = current['quality'], previous['quality']
+        if quality['fingerprints'] > before['fingerprints']:
+            regressions.append(f"{name}: 指纹数 {before['fingerprints']} -> {quality['fingerprints']}（膨胀）")
+        if quality['merged_groups'] > before['merged_groups']:
+            regressions.append(f"{name}: 误合并组数 {before['merged_groups']} -> {quality['merged_groups']}")
+        speed, speed_before = current['speed'], previous['speed']
+        if speed['per_second'] < speed_before['per_second'] * (1 - tolerance):
+            regressions.append(f"{name}: 归一化吞吐量 {speed['per_second']:.0f}/s，基线 {speed_before['per_second']:.0f}/s "
+                               f"({(speed['per_second'] / speed_before['per_second'] - 1) * 100:+.1f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQL指纹正确性与性能基准测试')
+    parser.add_argument('--modules', nargs='+', default=PARSER_MODULES, help='要测试的模块 (默认: 全部解析器)')
+    parser.add_argument('--repeat', type=int, default=20, help='吞吐量测试重复次数，取最快一次 (默认: %(default)s)')
+    parser.add_argument('--seed', type=int, default=42, help='语料随机种子 (默认: %(default)s)')
+    parser.add_argument('--verbose', action='store_true', help='显示被拆分的组和误合并的组')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线文件路径 (默认: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='允许的吞吐量下降比例 (默认: %(default)s)')
+    parser.add_argument('--json', metavar='PATH', help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.seed)
+    queries = [sql for _, _, variants in corpus for sql in variants]
+    print(f"语料: {len(corpus)} 组，{len(queries)} 条SQL")
+    print(f"{'模块':<34} {'指纹数':>6} {'拆分组':>6} {'误合并':>6} {'理想':>6} {'条/秒':>10} {'MB/秒':>8}")
+
+    results = {}
+    for name in args.modules:
+        normalize, error = load_normalizer(name)
+        if normalize is None:
+            results[name] = {'error': error}
+            print(f"{name:<34} 跳过: {error}")
+            continue
+        quality, groups, merged = evaluate(normalize, corpus)
+        speed = throughput(normalize, queries, args.repeat)
+        results[name] = {'quality': quality, 'speed': speed}
+        print(f"{name:<34} {quality['fingerprints']:>6} {quality['split_groups']:>6} {quality['merged_groups']:>6} "
+              f"{quality['exact']:>3}/{quality['groups']:<2} {speed['per_second']:>10.0f} {speed['mb_per_second']:>8.2f}")
+        if args.verbose:
+            for item in groups:
+                if item['fingerprints'] > 1:
+                    print(f"    拆分 {item['group']}: {item['variants']} 条变体 -> {item['fingerprints']} 个指纹")
+                    for sample in item['samples']:
+                        print(f"        {sample[:120]}")
+            for names in merged:
+                print(f"    误合并: {', '.join(names)}")
+
+    output = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version()},
+        'corpus': {'groups': len(corpus), 'queries': len(queries), 'seed': args.seed},
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\n未找到基线 {args.baseline}，使用 --save-baseline 生成")
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('corpus') != output['corpus']:
+        print("\n警告: 语料与基线不同，对比结果仅供参考")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n指纹回归 ({len(regressions)} 项):")
+        for item in regressions:
+            print(f"  {item}")
+        sys.exit(1)
+    print(f"\n与基线 ({baseline['generated_at']}) 相比未发现回归")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+慢日志解析器基准测试
+- 分阶段: 时间戳解析、normalize_sql、generate_checksum、format_sql、单条目完整解析，报告每秒处理条数
+- 端到端: 在子进程中解析生成的日志文件，报告 条/秒、MB/秒、峰值RSS 和各阶段耗时占比
+- 与保存的基线对比，吞吐量下降或内存增长超过容差时返回非0退出码，可用于CI
+
+使用方法（backend目录下，需要可导入 pymysql）:
+    python -m benchmarks.bench_parser --size 200MB --save-baseline
+    python -m benchmarks.bench_parser --size 200MB
+基线与机器相关，应在同一台机器上生成和对比
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from benchmarks.slowlog_generator import DEFAULT_END, SlowLogGenerator, parse_size
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'parser.json')
+
+# 端到端模式: 标准流式解析 / 二分定位时间范围后解析
+E2E_MODES = {
+    'standard': {'use_optimization': False},
+    'optimized': {'use_optimization': True, 'optimization_threshold': 0},
+}
+
+
+def load_parser_module():
+    # 解析器导入时会打印配置加载信息
+    with contextlib.redirect_stdout(io.StringIO()):
+        import server_side_slow_log_parser_py3 as module
+    return module
+
+
+def sample_entries(count, seed, fingerprints):
+    """生成内存中的样本条目，返回 [(条目文本, 时间行, SQL)]"""
+    generator = SlowLogGenerator(seed=seed, fingerprints=fingerprints, huge_ratio=0.001)
+    end = datetime.strptime(DEFAULT_END, '%Y-%m-%d %H:%M:%S')
+    moment = end - timedelta(days=1)
+    step = timedelta(days=1) / count
+    samples = []
+    for _ in range(count):
+        text = generator.entry(moment)
+        moment += step
+        lines = text.split('\n')
+        sql = '\n'.join(line for line in lines[1:]
+                        if line and not line.startswith(('#', 'use ', 'SET timestamp=')))
+        samples.append((text, lines[0], sql.rstrip(';')))
+    return samples
+
+
+def best_of(func, items, repeat):
+    """对每个输入调用一次 func，取 repeat 次中最快的一次"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_stages(count, repeat, seed, fingerprints):
+    """分阶段基准测试，返回 {阶段: {seconds, per_second}}"""
+    module = load_parser_module()
+    parser = module.SlowLogParser(min_query_time=5.0)
+    samples = sample_entries(count, seed, fingerprints)
+    time_lines = [line for _, line, _ in samples]
+    sqls = [sql for _, _, sql in samples]
+    normalized = [parser.normalize_sql(sql) for sql in sqls]
+    start_time = datetime(2000, 1, 1)
+    end_time = datetime(2100, 1, 1)
+
+    def parse_entry(text):
+        parser._parse_single_entry_with_time_check(text, start_time, end_time)
+
+    stages = {
+        'timestamp': (parser._extract_timestamp_from_line, time_lines),
+        'normalize': (parser.normalize_sql, sqls),
+        'checksum': (parser.generate_checksum, normalized),
+        'format': (parser.format_sql, sqls),
+        'entry': (parse_entry, [text for text, _, _ in samples]),
+    }
+    results = {}
+    for name, (func, items) in stages.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = best_of(func, items, repeat)
+        results[name] = {'seconds': round(elapsed, 4), 'per_second': round(len(items) / elapsed, 1)}
+    return results
+
+
+def child_main(log_path, mode, start, end):
+    """子进程: 解析整个文件，把统计报告写到标准输出"""
+    module = load_parser_module()
+    parser = module.SlowLogParser(min_query_time=5.0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser.parse_slow_log_with_time_range(log_path, start, end, **E2E_MODES[mode])
+    report = parser.timer.report(parser.stats, len(parser.details))
+    # Linux 上 ru_maxrss 单位为KB
+    report['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps(report, ensure_ascii=False))
+
+
+def run_e2e(log_path, mode, start, end, repeat):
+    """端到端基准测试，每次在新的子进程中运行以得到独立的峰值RSS"""
+    best = None
+    for _ in range(repeat):
+        cmd = [sys.executable, '-m', 'benchmarks.bench_parser', '--child', log_path, '--mode', mode,
+               '--start', start.strftime('%Y-%m-%d %H:%M:%S'), '--end', end.strftime('%Y-%m-%d %H:%M:%S')]
+        output = subprocess.run(cmd, cwd=backend_dir, check=True, capture_output=True, text=True).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        if best is None or report['elapsed_seconds'] < best['elapsed_seconds']:
+            best = report
+    return {
+        'seconds': best['elapsed_seconds'],
+        'per_second': best['entries']['per_second'],
+        'mb_per_second': round(best['bytes_per_second'] / (1024 * 1024), 2),
+        'peak_rss_mb': round(best['peak_rss'] / (1024 * 1024), 1),
+        'entries': best['entries']['total'],
+        'parsed': best['entries']['parsed'],
+        'fingerprints': best['unique_fingerprints'],
+        'hot_stage': best['hot_stage'],
+        'stage_percent': {name: stage['wall_percent'] for name, stage in best['stages'].items() if stage['calls']},
+    }
+
+
+def prepare_log(args):
+    """使用指定的日志文件，或按大小和种子生成（已存在时复用）"""
+    if args.log:
+        return args.log, None, None
+    end = datetime.strptime(DEFAULT_END, '%Y-%m-%d %H:%M:%S')
+    start = end - timedelta(days=args.days)
+    path = os.path.join(tempfile.gettempdir(),
+                        f"bench_slow_{args.size}_{args.seed}_{args.fingerprints}_{args.days}.log")
+    if not os.path.exists(path):
+        print(f"生成测试日志 {path} ({args.size / (1024 * 1024):.0f} MB)...")
+        generator = SlowLogGenerator(seed=args.seed, fingerprints=args.fingerprints)
+        generator.write(path, args.size, start, end)
+    return path, start, end
+
+
+def compare(results, baseline, tolerance, rss_tolerance):
+    """与基线对比，返回回归项列表"""
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get('results', {}).get(case)
+        if not previous:
+            continue
+        if current['per_second'] < previous['per_second'] * (1 - tolerance):
+            regressions.append(f"{case}: 吞吐量 {current['per_second']:.0f}/s，基线 {previous['per_second']:.0f}/s "
+                               f"({(current['per_second'] / previous['per_second'] - 1) * 100:+.1f}%)")
+        if 'peak_rss_mb' in previous and current['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + rss_tolerance):
+            regressions.append(f"{case}: 峰值RSS {current['peak_rss_mb']} MB，基线 {previous['peak_rss_mb']} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='慢日志解析器基准测试')
+    parser.add_argument('--log', help='使用已有的慢日志文件，不指定时按 --size 生成')
+    parser.add_argument('--size', type=parse_size, default=parse_size('100MB'),
+                        help='生成的测试日志大小 (默认: 100MB)')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子 (默认: %(default)s)')
+    parser.add_argument('--fingerprints', type=int, default=2000, help='SQL指纹数量 (默认: %(default)s)')
+    parser.add_argument('--days', type=int, default=7, help='日志时间跨度（天） (默认: %(default)s)')
+    parser.add_argument('--modes', nargs='+', choices=list(E2E_MODES), default=list(E2E_MODES),
+                        help='端到端测试的解析模式 (默认: 全部)')
+    parser.add_argument('--stage-entries', type=int, default=20000, help='分阶段测试的条目数 (默认: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次 (默认: %(default)s)')
+    parser.add_argument('--skip-stages', action='store_true', help='跳过分阶段测试')
+    parser.add_argument('--skip-e2e', action='store_true', help='跳过端到端测试')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线文件路径 (默认: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='允许的吞吐量下降比例 (默认: %(default)s)')
+    parser.add_argument('--rss-tolerance', type=float, default=0.20, help='允许的峰值RSS增长比例 (默认: %(default)s)')
+    parser.add_argument('--json', metavar='PATH', help='把结果写入JSON文件')
+    # 内部使用: 端到端测试的子进程
+    parser.add_argument('--child', metavar='LOG', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', choices=list(E2E_MODES), help=argparse.SUPPRESS)
+    parser.add_argument('--start', help=argparse.SUPPRESS)
+    parser.add_argument('--end', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args.child, args.mode, datetime.strptime(args.start, '%Y-%m-%d %H:%M:%S'),
+                   datetime.strptime(args.end, '%Y-%m-%d %H:%M:%S'))
+        return
+
+    results = {}
+    if not args.skip_stages:
+        print(f"分阶段测试 ({args.stage_entries} 条，取 {args.repeat} 次中最快)")
+        print(f"{'阶段':>12} {'耗时(s)':>10} {'条/秒':>12}")
+        for name, result in run_stages(args.stage_entries, args.repeat, args.seed, args.fingerprints).items():
+            results[f"stage:{name}"] = result
+            print(f"{name:>12} {result['seconds']:>10.3f} {result['per_second']:>12.0f}")
+
+    if not args.skip_e2e:
+        log_path, start, end = prepare_log(args)
+        if start is None:
+            # 已有日志文件: 解析全部内容
+            start, end = datetime(2000, 1, 1), datetime(2100, 1, 1)
+        size_mb = os.path.getsize(log_path) / (1024 * 1024)
+        print(f"\n端到端测试 {log_path} ({size_mb:.1f} MB)")
+        print(f"{'模式':>10} {'耗时(s)':>9} {'条/秒':>10} {'MB/秒':>8} {'峰值RSS(MB)':>12} {'最耗时阶段':>12}")
+        for mode in args.modes:
+            result = run_e2e(log_path, mode, start, end, args.repeat)
+            results[f"e2e:{mode}"] = result
+            print(f"{mode:>10} {result['seconds']:>9.2f} {result['per_second']:>10.0f} {result['mb_per_second']:>8.2f} "
+                  f"{result['peak_rss_mb']:>12.1f} {result['hot_stage'] or '-':>12}")
+
+    output = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'params': {'size': args.size if not args.log else None, 'seed': args.seed,
+                   'fingerprints': args.fingerprints, 'stage_entries': args.stage_entries},
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\n未找到基线 {args.baseline}，使用 --save-baseline 生成")
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('params') != output['params']:
+        print("\n警告: 本次参数与基线不同，对比结果仅供参考")
+    regressions = compare(results, baseline, args.tolerance, args.rss_tolerance)
+    if regressions:
+        print(f"\n性能回归 ({len(regressions)} 项):")
+        for item in regressions:
+            print(f"  {item}")
+        sys.exit(1)
+    print(f"\n与基线 ({baseline['generated_at']}) 相比未发现性能回归")
+
+
+if __name__ == '__main__':
+    main()
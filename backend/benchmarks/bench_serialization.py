@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API响应JSON序列化基准测试
+构造与列表接口/按用户统计接口相同结构的数据（datetime + AVG()产生的Decimal），
+对比各序列化实现的耗时
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, date
+from decimal import Decimal
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+from serializer import SERIALIZERS
+
+
+def build_payload(rows):
+    """构造与 /api/queries/stats/by-user/<username> 相同结构的响应"""
+    now = datetime.now()
+    queries = []
+    for i in range(rows):
+        queries.append({
+            'id': i,
+            'checksum': f'{i:032x}',
+            'normalized_sql': f'SELECT * FROM TABLE_{i % 50} WHERE ID = ? AND STATUS = ?',
+            'dbname': f'db{i % 10}',
+            'reviewed_status': '待优化',
+            'first_seen': now - timedelta(days=30, seconds=i),
+            'last_seen': now - timedelta(seconds=i),
+            'occurrences': i % 1000,
+            'avg_query_time': Decimal('5.1234567') + Decimal(i % 100),
+            'max_query_time': 12.5 + i % 7,
+            'min_query_time': 5.0,
+            'last_occurrence': now - timedelta(seconds=i),
+            'total_rows_examined': Decimal(i * 1000),
+            'total_rows_sent': Decimal(i),
+        })
+    time_distribution = [
+        {'query_date': date.today() - timedelta(days=d), 'daily_count': d * 10,
+         'avg_daily_time': Decimal('6.25')}
+        for d in range(30)
+    ]
+    return {
+        'success': True,
+        'message': '用户详细统计查询成功',
+        'data': {'queries': queries, 'time_distribution': time_distribution}
+    }
+
+
+def bench(func, payload, repeat):
+    best = float('inf')
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(func(payload))
+        best = min(best, time.perf_counter() - start)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API响应JSON序列化基准测试')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='每次测试的数据行数 (默认: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数，取最快一次 (默认: %(default)s)')
+    args = parser.parse_args()
+
+    print(f"可用序列化器: {', '.join(SERIALIZERS)}")
+    print(f"{'行数':>8} {'序列化器':>10} {'耗时(ms)':>10} {'大小(KB)':>10} {'加速比':>8}")
+    for rows in args.rows:
+        payload = build_payload(rows)
+        baseline = None
+        for name, func in SERIALIZERS.items():
+            elapsed, size = bench(func, payload, args.repeat)
+            if baseline is None:
+                baseline = elapsed
+            print(f"{rows:>8} {name:>10} {elapsed * 1000:>10.2f} {size / 1024:>10.1f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQL指纹语料
+每组是同一种查询结构的不同写法（字面量、IN列表长度、多行VALUES、注释、引号、提示、大小写、换行），
+理想的 normalize_sql 应把同一组归为一个指纹、不同组归为不同指纹
+expected 为理想指纹（字面量替换为 ?，IN/VALUES 列表折叠，注释去除，关键字大写），供对照
+"""
+
+import random
+
+# IN列表中的字符串值，包含SQL标准的 '' 转义
+STRING_VALUES = ['a', 'bc', 'x y', "O''Brien"]
+
+# (组名, 理想指纹, 变体生成函数)
+GROUPS = []
+
+
+def group(name, expected):
+    def register(func):
+        GROUPS.append((name, expected, func))
+        return func
+    return register
+
+
+def in_list(rng, count, quoted=False):
+    if quoted:
+        return ', '.join(f"'{rng.choice(STRING_VALUES)}{rng.randrange(1000)}'" for _ in range(count))
+    return ', '.join(str(rng.randrange(1, 10 ** 8)) for _ in range(count))
+
+
+@group('point_select', "SELECT * FROM ORDERS WHERE ID = ?")
+def _point_select(rng):
+    return [f"SELECT * FROM orders WHERE id = {rng.randrange(1, 10 ** 9)}" for _ in range(20)] + [
+        f"select * from orders where id={rng.randrange(100)}",
+        f"SELECT  *\n  FROM orders\n WHERE id = {rng.randrange(100)}",
+        f"SELECT * FROM orders WHERE id = '{rng.randrange(100)}'",
+    ]
+
+
+@group('in_list_numbers', "SELECT ID, STATUS FROM ORDERS WHERE USER_ID IN (?)")
+def _in_list_numbers(rng):
+    return [f"SELECT id, status FROM orders WHERE user_id IN ({in_list(rng, count)})"
+            for count in (1, 2, 3, 5, 10, 50, 100, 500, 1000, 5000)]
+
+
+@group('in_list_strings', "SELECT ID FROM USERS WHERE EMAIL IN (?)")
+def _in_list_strings(rng):
+    return [f"SELECT id FROM users WHERE email IN ({in_list(rng, count, quoted=True)})"
+            for count in (1, 2, 3, 10, 100, 1000)] + [
+        "SELECT id FROM users WHERE email IN ('a)b', 'c')",
+        "SELECT id FROM users WHERE email IN ('x,y', 'z')",
+    ]
+
+
+@group('in_list_subquery_mixed', "SELECT * FROM ORDERS WHERE SHOP_ID IN (?) AND USER_ID IN (SELECT ID FROM USERS WHERE LEVEL > ?)")
+def _in_list_subquery(rng):
+    return [f"SELECT * FROM orders WHERE shop_id IN ({in_list(rng, count)}) "
+            f"AND user_id IN (SELECT id FROM users WHERE level > {rng.randrange(10)})"
+            for count in (1, 4, 40, 400)]
+
+
+@group('multi_row_values', "INSERT INTO ORDER_ITEMS (ORDER_ID, SKU_ID, QUANTITY) VALUES (?)")
+def _multi_row_values(rng):
+    variants = []
+    for rows in (1, 2, 3, 10, 100, 1000):
+        values = ', '.join(f"({rng.randrange(10 ** 6)}, {rng.randrange(10 ** 6)}, {rng.randrange(1, 9)})"
+                           for _ in range(rows))
+        variants.append(f"INSERT INTO order_items (order_id, sku_id, quantity) VALUES {values}")
+    variants.append("INSERT INTO order_items (order_id, sku_id, quantity) VALUES\n(1, 2, 3),\n(4, 5, 6)")
+    return variants
+
+
+@group('values_with_functions', "INSERT INTO AUDIT_LOG (ACTOR_ID, ACTION, CREATED_AT) VALUES (?)")
+def _values_with_functions(rng):
+    return [
+        f"INSERT INTO audit_log (actor_id, action, created_at) VALUES ({rng.randrange(100)}, 'login', NOW())",
+        f"INSERT INTO audit_log (actor_id, action, created_at) VALUES ({rng.randrange(100)}, 'logout', NOW()), "
+        f"({rng.randrange(100)}, 'login', NOW())",
+    ]
+
+
+@group('block_comments', "SELECT NAME FROM USERS WHERE ID = ?")
+def _block_comments(rng):
+    return [
+        f"/* app:web trace_id={rng.randrange(10 ** 12):x} */ SELECT name FROM users WHERE id = {rng.randrange(100)}",
+        f"SELECT name /* hot path */ FROM users WHERE id = {rng.randrange(100)}",
+        f"SELECT name FROM users WHERE id = {rng.randrange(100)} /* controller:UserController,action:show */",
+        f"/* multi\n   line */\nSELECT name FROM users WHERE id = {rng.randrange(100)}",
+    ]
+
+
+@group('line_comments', "SELECT NAME FROM USERS WHERE STATUS = ?")
+def _line_comments(rng):
+    return [
+        f"-- report query\nSELECT name FROM users WHERE status = {rng.randrange(5)}",
+        f"SELECT name FROM users -- filter\nWHERE status = {rng.randrange(5)}",
+        f"# legacy comment\nSELECT name FROM users WHERE status = {rng.randrange(5)}",
+        f"SELECT name FROM users WHERE status = {rng.randrange(5)} -- trailing",
+    ]
+
+
+@group('quoted_identifiers', "SELECT ID, ORDER_NO FROM ORDERS WHERE SHOP_ID = ?")
+def _quoted_identifiers(rng):
+    return [
+        f"SELECT `id`, `order_no` FROM `orders` WHERE `shop_id` = {rng.randrange(100)}",
+        f"SELECT id, order_no FROM orders WHERE shop_id = {rng.randrange(100)}",
+        f"SELECT `id`, order_no FROM `orders` WHERE shop_id = {rng.randrange(100)}",
+    ]
+
+
+@group('schema_qualified', "SELECT * FROM SHOP.ORDERS WHERE ID = ?")
+def _schema_qualified(rng):
+    return [
+        f"SELECT * FROM shop.orders WHERE id = {rng.randrange(100)}",
+        f"SELECT * FROM `shop`.`orders` WHERE id = {rng.randrange(100)}",
+    ]
+
+
+@group('escaped_quotes', "SELECT ID FROM CUSTOMERS WHERE LAST_NAME = ? AND CITY = ?")
+def _escaped_quotes(rng):
+    return [
+        "SELECT id FROM customers WHERE last_name = 'O\\'Brien' AND city = 'Dublin'",
+        "SELECT id FROM customers WHERE last_name = 'O''Brien' AND city = 'Cork'",
+        "SELECT id FROM customers WHERE last_name = 'Smith' AND city = 'it\\'s'",
+        "SELECT id FROM customers WHERE last_name = \"D'Arcy\" AND city = 'Paris'",
+        "SELECT id FROM customers WHERE last_name = 'back\\\\slash' AND city = 'Rome'",
+        "SELECT id FROM customers WHERE last_name = 'Li' AND city = 'Bei\\'jing'",
+    ]
+
+
+@group('optimizer_hints', "SELECT ID FROM ORDERS WHERE CREATED_AT > ?")
+def _optimizer_hints(rng):
+    return [
+        f"SELECT /*+ MAX_EXECUTION_TIME({rng.choice([1000, 5000])}) */ id FROM orders WHERE created_at > '2025-01-0{rng.randint(1, 9)}'",
+        f"SELECT id FROM orders WHERE created_at > '2025-02-0{rng.randint(1, 9)}'",
+        f"SELECT /*+ NO_INDEX_MERGE(orders) */ id FROM orders WHERE created_at > '2025-03-0{rng.randint(1, 9)}'",
+    ]
+
+
+@group('index_hints', "SELECT ID FROM ORDERS FORCE INDEX (IDX_STATUS) WHERE STATUS = ?")
+def _index_hints(rng):
+    return [
+        f"SELECT id FROM orders FORCE INDEX (idx_status) WHERE status = '{rng.choice(['paid', 'new'])}'",
+        f"SELECT id FROM orders FORCE INDEX(idx_status) WHERE status = '{rng.choice(['paid', 'new'])}'",
+    ]
+
+
+@group('sql_no_cache', "SELECT SQL_NO_CACHE COUNT(*) FROM PAYMENTS WHERE STATE = ?")
+def _sql_no_cache(rng):
+    return [
+        f"SELECT SQL_NO_CACHE COUNT(*) FROM payments WHERE state = {rng.randrange(4)}",
+        f"select sql_no_cache count(*) from payments where state = {rng.randrange(4)}",
+    ]
+
+
+@group('literals_variety', "SELECT * FROM PAYMENTS WHERE AMOUNT > ? AND FEE < ? AND FLAG = ? AND MEMO = ?")
+def _literals_variety(rng):
+    return [
+        "SELECT * FROM payments WHERE amount > 10.5 AND fee < -3 AND flag = 0x1F AND memo = 'a'",
+        "SELECT * FROM payments WHERE amount > 99 AND fee < 2 AND flag = 1 AND memo = ''",
+        "SELECT * FROM payments WHERE amount > 1e3 AND fee < -0.25 AND flag = 7 AND memo = 'x y z'",
+    ]
+
+
+@group('between_dates', "SELECT COUNT(*) FROM ORDERS WHERE CREATED_AT BETWEEN ? AND ?")
+def _between_dates(rng):
+    return [
+        f"SELECT COUNT(*) FROM orders WHERE created_at BETWEEN '2025-0{rng.randint(1, 9)}-01 00:00:00' AND '2025-0{rng.randint(1, 9)}-28 23:59:59'"
+        for _ in range(5)
+    ]
+
+
+@group('limit_offset', "SELECT ID FROM MESSAGES WHERE RECEIVER_ID = ? ORDER BY ID DESC LIMIT ?")
+def _limit_offset(rng):
+    return [
+        f"SELECT id FROM messages WHERE receiver_id = {rng.randrange(100)} ORDER BY id DESC LIMIT 20",
+        f"SELECT id FROM messages WHERE receiver_id = {rng.randrange(100)} ORDER BY id DESC LIMIT 40, 20",
+        f"SELECT id FROM messages WHERE receiver_id = {rng.randrange(100)} ORDER BY id DESC LIMIT 20 OFFSET 4000",
+    ]
+
+
+@group('update_set', "UPDATE INVENTORY SET STOCK = STOCK - ?, UPDATED_AT = NOW() WHERE SKU_ID = ? AND STOCK >= ?")
+def _update_set(rng):
+    return [
+        f"UPDATE inventory SET stock = stock - {rng.randint(1, 5)}, updated_at = NOW() "
+        f"WHERE sku_id = {rng.randrange(10 ** 6)} AND stock >= {rng.randint(1, 5)}"
+        for _ in range(5)
+    ]
+
+
+@group('null_checks', "SELECT ID FROM COUPONS WHERE USED_AT IS NULL AND USER_ID = ?")
+def _null_checks(rng):
+    return [f"SELECT id FROM coupons WHERE used_at IS NULL AND user_id = {rng.randrange(1000)}" for _ in range(3)]
+
+
+# 以下各组结构与上面相近，但不应与之合并
+@group('order_by_created', "SELECT ID FROM MESSAGES WHERE RECEIVER_ID = ? ORDER BY CREATED_AT DESC LIMIT ?")
+def _order_by_created(rng):
+    return [f"SELECT id FROM messages WHERE receiver_id = {rng.randrange(100)} ORDER BY created_at DESC LIMIT 20"]
+
+
+@group('point_select_other_table', "SELECT * FROM ORDERS_ARCHIVE WHERE ID = ?")
+def _point_select_other_table(rng):
+    return [f"SELECT * FROM orders_archive WHERE id = {rng.randrange(1, 10 ** 9)}" for _ in range(3)]
+
+
+@group('not_in_list', "SELECT ID, STATUS FROM ORDERS WHERE USER_ID NOT IN (?)")
+def _not_in_list(rng):
+    return [f"SELECT id, status FROM orders WHERE user_id NOT IN ({in_list(rng, count)})" for count in (1, 10, 100)]
+
+
+def build_corpus(seed=42):
+    """生成语料，返回 [(组名, 理想指纹, [SQL变体])]"""
+    rng = random.Random(seed)
+    return [(name, expected, func(rng)) for name, expected, func in GROUPS]
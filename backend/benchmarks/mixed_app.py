@@ -0,0 +1,26 @@
+"""
+并发基准测试使用的最小WSGI应用
+/slow 模拟等待数据库的慢统计查询（sleep会被gevent打补丁，与真实socket等待一致），
+/fast 模拟普通的列表查询
+"""
+import os
+import time
+
+SLOW_SECONDS = float(os.getenv('BENCH_SLOW_SECONDS', '2.0'))
+FAST_SECONDS = float(os.getenv('BENCH_FAST_SECONDS', '0.01'))
+
+
+def app(environ, start_response):
+    path = environ.get('PATH_INFO', '/')
+    if path == '/slow':
+        time.sleep(SLOW_SECONDS)
+    elif path == '/fast':
+        time.sleep(FAST_SECONDS)
+    else:
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'not found']
+
+    body = b'{"success": true}'
+    start_response('200 OK', [('Content-Type', 'application/json'),
+                              ('Content-Length', str(len(body)))])
+    return [body]
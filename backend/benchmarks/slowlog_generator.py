@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成慢查询日志生成器
+生成从几MB到10GB以上的慢日志，用于解析器基准测试：
+- 混合传统 "# Time: yymmdd H:MM:SS" 与 ISO 时间头（带/不带时区）
+- MySQL / Percona Server / MariaDB 的扩展字段行
+- 单行、多行格式化SQL，少量100KB以上的超长SQL（大IN列表、多行VALUES）
+- 切换库时输出 "use db;"，每条带 "SET timestamp=...;"
+- SQL模板按Zipf分布选取，指纹基数和热点分布接近生产环境
+相同的 --seed 生成完全相同的文件
+
+使用方法（backend目录下）:
+    python -m benchmarks.slowlog_generator /tmp/slow_1g.log --size 1GB --fingerprints 5000
+"""
+
+import argparse
+import bisect
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+HEADER_STYLES = {
+    # MySQL 5.5/5.6、MariaDB：小时不补零，前面补空格
+    'traditional': 0.3,
+    # MySQL 5.7+ log_timestamps=SYSTEM
+    'iso_tz': 0.5,
+    # 不带时区的ISO格式
+    'iso': 0.2,
+}
+
+SERVER_FLAVORS = {
+    'mysql': 0.5,
+    'percona': 0.3,
+    'mariadb': 0.2,
+}
+
+TABLES = [
+    ('orders', ['id', 'user_id', 'status', 'amount', 'created_at', 'updated_at', 'shop_id']),
+    ('order_items', ['id', 'order_id', 'sku_id', 'quantity', 'price', 'created_at']),
+    ('users', ['id', 'name', 'email', 'mobile', 'status', 'created_at', 'last_login']),
+    ('payments', ['id', 'order_id', 'channel', 'amount', 'state', 'paid_at']),
+    ('inventory', ['sku_id', 'warehouse_id', 'stock', 'locked', 'updated_at']),
+    ('audit_log', ['id', 'actor_id', 'action', 'target', 'payload', 'created_at']),
+    ('coupons', ['id', 'user_id', 'code', 'discount', 'expire_at', 'used']),
+    ('shipments', ['id', 'order_id', 'carrier', 'tracking_no', 'state', 'shipped_at']),
+    ('products', ['id', 'title', 'category_id', 'price', 'status', 'created_at']),
+    ('messages', ['id', 'sender_id', 'receiver_id', 'content', 'read_at', 'created_at']),
+]
+
+# 含转义引号的字符串字面量也要覆盖到
+STRING_PREFIXES = ['a', 'b', 'x', 'test', "O\\'Brien"]
+
+DEFAULT_END = '2025-06-30 23:59:59'
+
+SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+
+def parse_size(text):
+    """解析 500KB / 100MB / 10GB 这样的大小"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B?)\s*', text.upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"无法解析大小: {text}")
+    unit = match.group(2)
+    if unit and not unit.endswith('B'):
+        unit += 'B'
+    return int(float(match.group(1)) * SIZE_UNITS[unit])
+
+
+def weighted_choice(rng, weights):
+    total = sum(weights.values())
+    point = rng.random() * total
+    for key, weight in weights.items():
+        point -= weight
+        if point <= 0:
+            return key
+    return key
+
+
+class SqlTemplate:
+    """一个SQL指纹：固定的语句结构，每次生成时填入不同的字面量"""
+
+    def __init__(self, rng, index):
+        self.index = index
+        self.table, self.columns = TABLES[index % len(TABLES)]
+        self.shape = rng.choice(['point', 'range', 'in_list', 'join', 'aggregate', 'update',
+                                 'delete', 'insert', 'subquery', 'multiline'])
+        # 通过选取不同的列组合得到不同的指纹
+        column_count = 1 + (index // len(TABLES)) % 3
+        self.filters = rng.sample(self.columns, min(column_count, len(self.columns)))
+        self.projection = rng.sample(self.columns, min(1 + index % 4, len(self.columns)))
+        self.join_table, self.join_columns = TABLES[(index * 7 + 3) % len(TABLES)]
+        self.suffix = index // (len(TABLES) * 3)  # 超出基础组合后用别名区分
+
+    def _literal(self, rng, column):
+        if column.endswith('_at') or column == 'expire_at':
+            moment = datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(0, 365 * 86400))
+            return f"'{moment.strftime('%Y-%m-%d %H:%M:%S')}'"
+        if column in ('status', 'state', 'channel', 'carrier', 'action'):
+            return f"'{rng.choice(['active', 'pending', 'done', 'failed', 'canceled'])}'"
+        if column in ('name', 'email', 'title', 'code', 'tracking_no', 'target', 'content', 'payload'):
+            return f"'{rng.choice(STRING_PREFIXES)}{rng.randrange(100000)}'"
+        return str(rng.randrange(1, 10 ** rng.randint(1, 9)))
+
+    def _where(self, rng):
+        return ' AND '.join(f"{column} = {self._literal(rng, column)}" for column in self.filters)
+
+    def _alias(self):
+        return f" t{self.suffix}" if self.suffix else ''
+
+    def render(self, rng, huge=False):
+        table = f"{self.table}{self._alias()}"
+        columns = ', '.join(self.projection)
+        if huge:
+            return self._render_huge(rng, table)
+        if self.shape == 'point':
+            return f"SELECT {columns} FROM {table} WHERE {self._where(rng)} LIMIT 1"
+        if self.shape == 'range':
+            return (f"SELECT {columns} FROM {table} WHERE {self._where(rng)} "
+                    f"AND created_at >= {self._literal(rng, 'created_at')} ORDER BY id DESC LIMIT {rng.choice([10, 20, 50, 100])}")
+        if self.shape == 'in_list':
+            values = ', '.join(str(rng.randrange(1, 10 ** 7)) for _ in range(rng.randint(1, 200)))
+            return f"SELECT {columns} FROM {table} WHERE {self.filters[0]} IN ({values})"
+        if self.shape == 'join':
+            return (f"SELECT a.{self.projection[0]}, b.{self.join_columns[0]} FROM {self.table} a "
+                    f"JOIN {self.join_table} b ON a.id = b.{self.join_columns[0]} "
+                    f"WHERE a.{self.filters[0]} = {self._literal(rng, self.filters[0])}{self._alias()}")
+        if self.shape == 'aggregate':
+            return (f"SELECT {self.filters[0]}, COUNT(*), SUM({self.columns[-1] if self.columns[-1] != 'created_at' else 'id'}) "
+                    f"FROM {table} WHERE created_at BETWEEN {self._literal(rng, 'created_at')} AND {self._literal(rng, 'created_at')} "
+                    f"GROUP BY {self.filters[0]} ORDER BY COUNT(*) DESC")
+        if self.shape == 'update':
+            return f"UPDATE {table} SET {self.projection[0]} = {self._literal(rng, self.projection[0])} WHERE {self._where(rng)}"
+        if self.shape == 'delete':
+            return f"DELETE FROM {table} WHERE {self._where(rng)} LIMIT {rng.choice([100, 1000, 5000])}"
+        if self.shape == 'insert':
+            rows = ', '.join(
+                '(' + ', '.join(self._literal(rng, column) for column in self.projection) + ')'
+                for _ in range(rng.randint(1, 20))
+            )
+            return f"INSERT INTO {self.table} ({columns}) VALUES {rows}"
+        if self.shape == 'subquery':
+            return (f"SELECT {columns} FROM {table} WHERE id IN (SELECT {self.join_columns[0]} FROM {self.join_table} "
+                    f"WHERE {self.join_columns[-1]} > {self._literal(rng, self.join_columns[-1])}) /* report */")
+        # multiline: 应用侧格式化过的SQL，带注释
+        projection = ',\n    '.join(self.projection)
+        where = self._where(rng).replace(' AND ', '\n    AND ')
+        return (f"/* app:{self.index % 5} */ SELECT\n    {projection}\nFROM\n    {table}\n"
+                f"WHERE\n    {where}\nORDER BY\n    id DESC\nLIMIT 20")
+
+    def _render_huge(self, rng, table):
+        """超长SQL：数万个值的IN列表或上千行的批量插入"""
+        if rng.random() < 0.5:
+            values = ', '.join(str(rng.randrange(1, 10 ** 9)) for _ in range(rng.randint(15000, 40000)))
+            return f"SELECT {', '.join(self.projection)} FROM {table} WHERE id IN ({values})"
+        rows = ',\n'.join(
+            '(' + ', '.join(self._literal(rng, column) for column in self.projection) + ')'
+            for _ in range(rng.randint(2000, 5000))
+        )
+        return f"INSERT INTO {self.table} ({', '.join(self.projection)}) VALUES\n{rows}"
+
+
+class SlowLogGenerator:
+    """按目标大小生成合成慢日志"""
+
+    def __init__(self, seed=42, fingerprints=2000, users=30, databases=12, zipf=1.1,
+                 min_query_time=5.0, below_threshold_ratio=0.15, huge_ratio=0.0005,
+                 header_styles=None, flavors=None):
+        self.rng = random.Random(seed)
+        self.templates = [SqlTemplate(self.rng, i) for i in range(fingerprints)]
+        # Zipf分布：少数模板占大部分执行次数
+        weights = [1.0 / ((rank + 1) ** zipf) for rank in range(fingerprints)]
+        total = sum(weights)
+        self.cumulative = []
+        acc = 0.0
+        for weight in weights:
+            acc += weight / total
+            self.cumulative.append(acc)
+        self.users = [f"app_user{i}" for i in range(users)]
+        self.user_db = {user: f"db_{i % databases}" for i, user in enumerate(self.users)}
+        self.min_query_time = min_query_time
+        self.below_threshold_ratio = below_threshold_ratio
+        self.huge_ratio = huge_ratio
+        self.header_styles = header_styles or HEADER_STYLES
+        self.flavors = flavors or SERVER_FLAVORS
+        self.thread_id = 1000
+        self.current_db = {}
+
+    def pick_template(self):
+        index = bisect.bisect_left(self.cumulative, self.rng.random())
+        return self.templates[min(index, len(self.templates) - 1)]
+
+    def _time_header(self, moment, style):
+        if style == 'traditional':
+            return f"# Time: {moment.strftime('%y%m%d')} {moment.hour:>2}:{moment.strftime('%M:%S')}\n"
+        if style == 'iso_tz':
+            return f"# Time: {moment.strftime('%Y-%m-%dT%H:%M:%S.%f')}+08:00\n"
+        return f"# Time: {moment.strftime('%Y-%m-%dT%H:%M:%S.%f')}\n"
+
+    def _query_time(self):
+        rng = self.rng
+        if rng.random() < self.below_threshold_ratio:
+            return rng.uniform(0.5, self.min_query_time * 0.99)
+        return min(self.min_query_time * rng.lognormvariate(0.4, 0.6) + self.min_query_time * 0.01, 3600.0)
+
+    def entry(self, moment):
+        """生成一条慢日志条目"""
+        rng = self.rng
+        template = self.pick_template()
+        user = self.users[template.index % len(self.users)]
+        dbname = self.user_db[user]
+        flavor = weighted_choice(rng, self.flavors)
+        style = weighted_choice(rng, self.header_styles)
+        self.thread_id += rng.randint(0, 3)
+
+        query_time = self._query_time()
+        lock_time = rng.random() * 0.01
+        rows_sent = rng.randint(0, 5000)
+        rows_examined = rows_sent + rng.randint(0, 5000000)
+        host = f"10.{rng.randint(0, 3)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+        lines = [self._time_header(moment, style)]
+        if flavor == 'mysql':
+            lines.append(f"# User@Host: {user}[{user}] @  [{host}]  Id: {self.thread_id:>6}\n")
+            lines.append(f"# Query_time: {query_time:.6f}  Lock_time: {lock_time:.6f} "
+                         f"Rows_sent: {rows_sent}  Rows_examined: {rows_examined}\n")
+        elif flavor == 'percona':
+            lines.append(f"# User@Host: {user}[{user}] @  [{host}]  Id: {self.thread_id:>6}\n")
+            lines.append(f"# Schema: {dbname}  Last_errno: 0  Killed: 0\n")
+            lines.append(f"# Query_time: {query_time:.6f}  Lock_time: {lock_time:.6f}  Rows_sent: {rows_sent}  "
+                         f"Rows_examined: {rows_examined}  Rows_affected: {rng.randint(0, 100)}  Bytes_sent: {rng.randint(100, 10 ** 7)}\n")
+            lines.append(f"# Tmp_tables: {rng.randint(0, 2)}  Tmp_disk_tables: {rng.randint(0, 1)}  "
+                         f"Tmp_table_sizes: {rng.randint(0, 10 ** 6)}\n")
+            lines.append(f"# InnoDB_trx_id: {rng.randrange(16 ** 8):X}\n")
+            lines.append(f"# QC_Hit: No  Full_scan: {rng.choice(['Yes', 'No'])}  Full_join: No  "
+                         f"Tmp_table: No  Tmp_table_on_disk: No\n")
+            lines.append(f"# Filesort: {rng.choice(['Yes', 'No'])}  Filesort_on_disk: No  Merge_passes: 0\n")
+            lines.append(f"#   InnoDB_IO_r_ops: {rng.randint(0, 1000)}  InnoDB_IO_r_bytes: {rng.randint(0, 10 ** 7)}  "
+                         f"InnoDB_IO_r_wait: {rng.random():.6f}\n")
+            lines.append(f"#   InnoDB_rec_lock_wait: {rng.random() * 0.1:.6f}  InnoDB_queue_wait: 0.000000\n")
+            lines.append(f"#   InnoDB_pages_distinct: {rng.randint(1, 5000)}\n")
+        else:
+            lines.append(f"# User@Host: {user}[{user}] @ app-{host.split('.')[-1]} [{host}]\n")
+            lines.append(f"# Thread_id: {self.thread_id}  Schema: {dbname}  QC_hit: No\n")
+            lines.append(f"# Query_time: {query_time:.6f}  Lock_time: {lock_time:.6f}  Rows_sent: {rows_sent}  "
+                         f"Rows_examined: {rows_examined}\n")
+            lines.append(f"# Rows_affected: {rng.randint(0, 100)}  Bytes_sent: {rng.randint(100, 10 ** 6)}\n")
+
+        # 同一连接切换库时才会输出 use 语句
+        if self.current_db.get(user) != dbname or rng.random() < 0.05:
+            lines.append(f"use {dbname};\n")
+            self.current_db[user] = dbname
+        lines.append(f"SET timestamp={int(moment.timestamp())};\n")
+        lines.append(template.render(rng, huge=rng.random() < self.huge_ratio) + ";\n")
+        return ''.join(lines)
+
+    def estimate_entry_size(self, samples=2000):
+        """用独立的随机数生成器估算平均条目大小，不影响正式输出"""
+        state = self.rng.getstate()
+        thread_id = self.thread_id
+        current_db = dict(self.current_db)
+        moment = datetime(2025, 1, 1)
+        size = sum(len(self.entry(moment).encode('utf-8')) for _ in range(samples))
+        self.rng.setstate(state)
+        self.thread_id = thread_id
+        self.current_db = current_db
+        return size / samples
+
+    def write(self, path, target_size, start, end, header=True):
+        """写入文件直到达到目标大小，时间戳在 [start, end] 内单调递增"""
+        average = self.estimate_entry_size()
+        expected_entries = max(1, int(target_size / average))
+        step = (end - start).total_seconds() / expected_entries
+
+        written = 0
+        entries = 0
+        moment = start
+        buffer = []
+        buffered = 0
+        next_report = 256 * 1024 * 1024
+        began = time.time()
+        with open(path, 'w', encoding='utf-8', newline='\n') as f:
+            if header:
+                banner = ("/usr/sbin/mysqld, Version: 8.0.36 (MySQL Community Server - GPL). started with:\n"
+                          "Tcp port: 3306  Unix socket: /var/lib/mysql/mysql.sock\n"
+                          "Time                 Id Command    Argument\n")
+                f.write(banner)
+                written += len(banner)
+            while written < target_size:
+                text = self.entry(moment)
+                buffer.append(text)
+                size = len(text.encode('utf-8'))
+                buffered += size
+                written += size
+                entries += 1
+                # 每条落在自己的时间槽内，保证单调递增
+                moment = min(start + timedelta(seconds=(entries + self.rng.random() * 0.9) * step), end)
+                if buffered >= 8 * 1024 * 1024:
+                    f.write(''.join(buffer))
+                    buffer = []
+                    buffered = 0
+                    if written >= next_report:
+                        next_report += 256 * 1024 * 1024
+                        elapsed = time.time() - began
+                        print(f"已生成 {written / (1024 * 1024):.0f} MB / {target_size / (1024 * 1024):.0f} MB "
+                              f"({written / (1024 * 1024) / max(elapsed, 0.001):.1f} MB/s)", file=sys.stderr)
+            f.write(''.join(buffer))
+        return {'path': path, 'bytes': written, 'entries': entries, 'seconds': round(time.time() - began, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成慢查询日志生成器')
+    parser.add_argument('output', help='输出文件路径')
+    parser.add_argument('--size', type=parse_size, default=parse_size('100MB'),
+                        help='目标文件大小，如 50MB、10GB (默认: 100MB)')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子 (默认: %(default)s)')
+    parser.add_argument('--fingerprints', type=int, default=2000, help='SQL指纹数量 (默认: %(default)s)')
+    parser.add_argument('--users', type=int, default=30, help='用户数量 (默认: %(default)s)')
+    parser.add_argument('--databases', type=int, default=12, help='数据库数量 (默认: %(default)s)')
+    parser.add_argument('--zipf', type=float, default=1.1, help='指纹热度的Zipf指数，越大越集中 (默认: %(default)s)')
+    parser.add_argument('--days', type=int, default=7, help='时间跨度（天） (默认: %(default)s)')
+    parser.add_argument('--end', default=DEFAULT_END,
+                        help='最后一条的时间，固定默认值使相同种子生成相同文件 (默认: %(default)s)')
+    parser.add_argument('--min-time', type=float, default=5.0, help='解析器的慢查询阈值（秒） (默认: %(default)s)')
+    parser.add_argument('--huge-ratio', type=float, default=0.0005, help='100KB以上超长SQL的比例 (默认: %(default)s)')
+    args = parser.parse_args()
+
+    end = datetime.strptime(args.end, '%Y-%m-%d %H:%M:%S')
+    start = end - timedelta(days=args.days)
+    generator = SlowLogGenerator(
+        seed=args.seed,
+        fingerprints=args.fingerprints,
+        users=args.users,
+        databases=args.databases,
+        zipf=args.zipf,
+        min_query_time=args.min_time,
+        huge_ratio=args.huge_ratio,
+    )
+    result = generator.write(args.output, args.size, start, end)
+    print(f"已生成 {result['path']}: {result['bytes'] / (1024 * 1024):.1f} MB，{result['entries']} 条，"
+          f"时间范围 {start} 到 {end}，耗时 {result['seconds']} 秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,28 @@
 """
 性能优化的查询缓存模块
-使用内存缓存减少数据库查询
+使用内存缓存减少数据库查询，支持过期前后台刷新（stale-while-revalidate）
 """
 import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, List
 import hashlib
 import json
+from config import API_CONFIG
+
+logger = logging.getLogger(__name__)
 
 class QueryCache:
-    def __init__(self, default_timeout: int = 300):
+    def __init__(self, default_timeout: int = 300, refresh_workers: int = 2):
         self.cache: Dict[str, Dict[str, Any]] = {}
         self.default_timeout = default_timeout
-    
+        self.refresh_workers = refresh_workers
+        self._lock = threading.RLock()
+        self._refreshing = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
     def _generate_key(self, *args, **kwargs) -> str:
         """生成缓存键"""
         key_data = {
@@ -21,35 +31,90 @@ class QueryCache:
         }
         key_string = json.dumps(key_data, sort_keys=True, default=str)
         return hashlib.md5(key_string.encode()).hexdigest()
-    
+
     def get(self, key: str) -> Optional[Any]:
         """获取缓存值"""
-        if key in self.cache:
-            entry = self.cache[key]
-            if time.time() < entry['expires']:
-                return entry['value']
-            else:
+        entry = self.get_entry(key)
+        return entry['value'] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """获取缓存条目（包含过期时间和陈旧时间），已过期的条目会被删除"""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry['expires']:
                 del self.cache[key]
-        return None
-    
-    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> None:
-        """设置缓存值"""
+                return None
+            return entry
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None,
+            stale_after: Optional[int] = None) -> None:
+        """设置缓存值，stale_after 秒后视为陈旧（仍可返回，但会触发后台刷新）"""
         timeout = timeout or self.default_timeout
-        self.cache[key] = {
-            'value': value,
-            'expires': time.time() + timeout
-        }
-    
+        if stale_after is None or stale_after > timeout:
+            stale_after = timeout
+        now = time.time()
+        with self._lock:
+            self.cache[key] = {
+                'value': value,
+                'stale_at': now + stale_after,
+                'expires': now + timeout
+            }
+
+    def invalidate(self, prefix: str = '') -> None:
+        """删除匹配前缀的缓存，下次访问时同步重新计算"""
+        with self._lock:
+            for key in [key for key in self.cache if key.startswith(prefix)]:
+                del self.cache[key]
+
+    def mark_stale(self, prefix: str = '') -> None:
+        """将匹配前缀的缓存标记为陈旧，下次访问时返回旧值并后台刷新"""
+        with self._lock:
+            for key, entry in self.cache.items():
+                if key.startswith(prefix):
+                    entry['stale_at'] = 0
+
     def clear_expired(self) -> None:
         """清理过期缓存"""
         current_time = time.time()
-        expired_keys = [
-            key for key, entry in self.cache.items() 
-            if current_time >= entry['expires']
-        ]
-        for key in expired_keys:
-            del self.cache[key]
-    
+        with self._lock:
+            expired_keys = [
+                key for key, entry in self.cache.items()
+                if current_time >= entry['expires']
+            ]
+            for key in expired_keys:
+                del self.cache[key]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """延迟创建刷新线程池，保证在gunicorn fork之后的工作进程中创建"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.refresh_workers,
+                    thread_name_prefix='cache-refresh'
+                )
+            return self._executor
+
+    def _schedule_refresh(self, key: str, func: Callable, args, kwargs,
+                          timeout: Optional[int], stale_after: Optional[int]) -> None:
+        """提交后台刷新任务，同一个键同时只刷新一次"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(key, func(*args, **kwargs), timeout, stale_after)
+            except Exception as e:
+                logger.error(f"后台刷新缓存失败 {key}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._get_executor().submit(refresh)
+
     def cache_result(self, timeout: Optional[int] = None):
         """装饰器：缓存函数结果"""
         def decorator(func):
@@ -57,12 +122,12 @@ class QueryCache:
             def wrapper(*args, **kwargs):
                 # 生成缓存键
                 cache_key = f"{func.__name__}:{self._generate_key(*args, **kwargs)}"
-                
+
                 # 尝试从缓存获取
                 cached_result = self.get(cache_key)
                 if cached_result is not None:
                     return cached_result
-                
+
                 # 执行函数并缓存结果
                 result = func(*args, **kwargs)
                 self.set(cache_key, result, timeout)
@@ -70,22 +135,160 @@ class QueryCache:
             return wrapper
         return decorator
 
+    def stale_while_revalidate(self, timeout: Optional[int] = None,
+                               stale_after: Optional[int] = None):
+        """
+        装饰器：陈旧数据先返回，后台线程重新计算
+        - stale_after 之前：直接返回缓存
+        - stale_after 到 timeout 之间：返回缓存，同时后台刷新
+        - 超过 timeout 或未命中：同步计算
+        被装饰函数额外提供 refresh(*args, **kwargs) 用于预热，
+        cached_calls() 返回当前仍在缓存中的各组调用参数
+        """
+        def decorator(func):
+            calls: Dict[str, tuple] = {}
+
+            def make_key(args, kwargs):
+                return f"{func.__name__}:{self._generate_key(*args, **kwargs)}"
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                cache_key = make_key(args, kwargs)
+                entry = self.get_entry(cache_key)
+                if entry is None:
+                    result = func(*args, **kwargs)
+                    self.set(cache_key, result, timeout, stale_after)
+                    with self._lock:
+                        calls[cache_key] = (args, kwargs)
+                    return result
+
+                if time.time() >= entry['stale_at']:
+                    self._schedule_refresh(cache_key, func, args, kwargs, timeout, stale_after)
+                return entry['value']
+
+            def refresh(*args, **kwargs):
+                result = func(*args, **kwargs)
+                cache_key = make_key(args, kwargs)
+                self.set(cache_key, result, timeout, stale_after)
+                with self._lock:
+                    calls[cache_key] = (args, kwargs)
+                return result
+
+            def cached_calls():
+                # 已过期或被清除的键不再刷新
+                with self._lock:
+                    for cache_key in [k for k in calls if k not in self.cache]:
+                        del calls[cache_key]
+                    return list(calls.values())
+
+            wrapper.refresh = refresh
+            wrapper.cached_calls = cached_calls
+            return wrapper
+        return decorator
+
+class RefreshScheduler:
+    """
+    缓存预热与定时刷新调度器
+    启动时预热已注册的查询，之后轮询数据版本（例如明细表最大ID），
+    数据入库后立即重新预热，其余时间在缓存变陈旧前主动刷新
+    """
+    def __init__(self, cache: QueryCache, interval: int = 30, refresh_every: int = 240):
+        self.cache = cache
+        self.interval = interval
+        self.refresh_every = refresh_every
+        self.warmers: List[Callable] = []
+        self.version_source: Optional[Callable[[], Any]] = None
+        self._last_version = None
+        self._last_warm = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def register(self, func: Callable) -> Callable:
+        """注册需要预热的查询（必须是 stale_while_revalidate 装饰过的函数）"""
+        self.warmers.append(func)
+        return func
+
+    def set_version_source(self, func: Callable[[], Any]) -> None:
+        """设置数据版本函数，返回值变化表示有新的入库数据"""
+        self.version_source = func
+
+    def warm_all(self) -> None:
+        """同步刷新全部已注册查询：默认参数的视图，以及当前缓存中的其他参数组合"""
+        for func in self.warmers:
+            calls = func.cached_calls()
+            if ((), {}) not in calls:
+                calls.insert(0, ((), {}))
+            for args, kwargs in calls:
+                try:
+                    func.refresh(*args, **kwargs)
+                except Exception as e:
+                    logger.error(f"预热缓存失败 {func.__name__}{args}: {str(e)}")
+        self._last_warm = time.time()
+
+    def check_and_refresh(self) -> None:
+        """检查数据版本，入库后让全部缓存失效并重新预热"""
+        version = None
+        if self.version_source:
+            try:
+                version = self.version_source()
+            except Exception as e:
+                logger.warning(f"获取数据版本失败: {str(e)}")
+
+        if version is not None and version != self._last_version:
+            if self._last_version is not None:
+                logger.info(f"检测到新的入库数据（版本 {self._last_version} -> {version}），刷新缓存")
+                self.cache.mark_stale()
+            self._last_version = version
+            self.warm_all()
+        elif time.time() - self._last_warm >= self.refresh_every:
+            self.warm_all()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.check_and_refresh()
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        """启动后台调度线程（每个工作进程调用一次）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='cache-scheduler', daemon=True)
+        self._thread.start()
+        logger.info("缓存刷新调度器已启动")
+
+    def stop(self) -> None:
+        self._stop.set()
+
 # 全局缓存实例
-query_cache = QueryCache(default_timeout=300)  # 5分钟默认缓存
+query_cache = QueryCache(default_timeout=API_CONFIG['CACHE_TIMEOUT'])  # 5分钟默认缓存
+
+# 全局刷新调度器
+refresh_scheduler = RefreshScheduler(
+    query_cache,
+    interval=API_CONFIG['CACHE_REFRESH_INTERVAL'],
+    refresh_every=API_CONFIG['CACHE_STALE_AFTER']
+)
 
 def cached_query(timeout: int = 300):
     """查询缓存装饰器"""
     return query_cache.cache_result(timeout)
 
+def swr_cached(timeout: int = 300, stale_after: Optional[int] = None):
+    """陈旧数据先返回、后台刷新的查询缓存装饰器"""
+    return query_cache.stale_while_revalidate(timeout, stale_after)
+
 def clear_cache():
     """清理所有缓存"""
-    query_cache.cache.clear()
+    with query_cache._lock:
+        query_cache.cache.clear()
 
 def clear_user_stats_cache():
     """清理用户统计相关缓存"""
-    keys_to_remove = [
-        key for key in query_cache.cache.keys() 
-        if 'get_user_query_stats' in key or 'get_user_detail_stats' in key
-    ]
-    for key in keys_to_remove:
-        del query_cache.cache[key]
+    with query_cache._lock:
+        keys_to_remove = [
+            key for key in query_cache.cache.keys()
+            if 'user_query_stats' in key or 'user_detail_stats' in key
+        ]
+        for key in keys_to_remove:
+            del query_cache.cache[key]
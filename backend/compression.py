@@ -0,0 +1,144 @@
+"""
+响应压缩与静态资源服务
+- 启动时扫描 frontend/dist 建立内存清单（前端重新构建后自动重新扫描），按 Accept-Encoding 返回构建时预压缩的 .br/.gz 文件
+- 较大的JSON接口响应按需gzip压缩
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from flask import request, send_file
+from werkzeug.security import safe_join
+from config import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 预压缩文件后缀，按优先级排列
+PRECOMPRESSED_VARIANTS = [('br', '.br'), ('gzip', '.gz')]
+
+# 带内容哈希的文件名可以长期缓存
+IMMUTABLE_PREFIX = 'assets/'
+LONG_CACHE_SUFFIXES = ('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.ico', '.svg',
+                       '.woff', '.woff2', '.ttf', '.eot')
+
+def negotiate_encoding(available):
+    """根据请求的Accept-Encoding从可用编码中选出最优的一个，没有可用编码时返回None"""
+    accept = request.accept_encodings
+    for encoding in available:
+        if accept.quality(encoding) > 0:
+            return encoding
+    return None
+
+class StaticAssetManifest:
+    """前端构建产物清单，避免每个请求都访问文件系统
+    前端重新构建后构建目录的修改时间会变化，此时重新扫描；清单中没有的文件再到文件系统查找一次"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.files = {}
+        self.root_mtime = None
+
+    def _root_mtime(self):
+        try:
+            return os.stat(self.root).st_mtime
+        except OSError:
+            return None
+
+    def _entry(self, full_path, rel_path):
+        """单个文件的元数据和可用的预压缩版本"""
+        stat = os.stat(full_path)
+        variants = {}
+        for encoding, suffix in PRECOMPRESSED_VARIANTS:
+            if os.path.isfile(full_path + suffix):
+                variants[encoding] = full_path + suffix
+        return {
+            'path': full_path,
+            'mimetype': mimetypes.guess_type(full_path)[0] or 'application/octet-stream',
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'etag': hashlib.md5(f"{rel_path}:{stat.st_size}:{stat.st_mtime}".encode()).hexdigest(),
+            'variants': variants,
+        }
+
+    def load(self):
+        """扫描构建目录，记录文件元数据和可用的预压缩版本"""
+        files = {}
+        self.root_mtime = self._root_mtime()
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename.endswith(tuple(suffix for _, suffix in PRECOMPRESSED_VARIANTS)):
+                        continue
+                    full_path = os.path.join(dirpath, filename)
+                    rel_path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                    try:
+                        files[rel_path] = self._entry(full_path, rel_path)
+                    except OSError:
+                        continue  # 扫描期间被删除
+        self.files = files
+        compressed = sum(1 for entry in files.values() if entry['variants'])
+        logger.info(f"静态资源清单已加载: {len(files)} 个文件，{compressed} 个有预压缩版本，目录 {self.root}")
+        return self
+
+    def get(self, path):
+        """查找文件元数据: 构建目录有变化时先重新扫描，清单中没有时到文件系统查找"""
+        if self._root_mtime() != self.root_mtime:
+            self.load()
+        entry = self.files.get(path)
+        if entry is not None:
+            return entry
+
+        full_path = safe_join(self.root, path)
+        if full_path is None or not os.path.isfile(full_path) \
+                or full_path.endswith(tuple(suffix for _, suffix in PRECOMPRESSED_VARIANTS)):
+            return None
+        try:
+            entry = self._entry(full_path, path)
+        except OSError:
+            return None
+        self.files[path] = entry
+        return entry
+
+    def serve(self, path):
+        """返回静态文件响应，文件不在清单中时返回None"""
+        entry = self.get(path)
+        if entry is None:
+            return None
+
+        encoding = negotiate_encoding([enc for enc, _ in PRECOMPRESSED_VARIANTS if enc in entry['variants']])
+        file_path = entry['variants'][encoding] if encoding else entry['path']
+        etag = f"{entry['etag']}-{encoding}" if encoding else entry['etag']
+
+        response = send_file(file_path, mimetype=entry['mimetype'], etag=etag,
+                             last_modified=entry['mtime'], conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry['variants']:
+            response.vary.add('Accept-Encoding')
+
+        if path.startswith(IMMUTABLE_PREFIX) or path.endswith(LONG_CACHE_SUFFIXES):
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'  # 1年缓存
+        elif path.endswith('.html'):
+            response.headers['Cache-Control'] = 'public, max-age=3600'  # 1小时缓存
+        return response
+
+def compress_response(response):
+    """after_request钩子：对较大的JSON响应进行gzip压缩"""
+    if (response.direct_passthrough
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype != 'application/json'):
+        return response
+
+    data = response.get_data()
+    if len(data) < APP_CONFIG['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if negotiate_encoding(['gzip']) is None:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=APP_CONFIG['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
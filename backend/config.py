@@ -25,28 +25,115 @@ DB_CONFIG = {
     "database": os.getenv('DB_NAME', 'slow_query_analysis'),
 }
 
+# 只读副本配置 - DB_REPLICA_HOSTS=host1:3306,host2:3306
+# 只读接口优先路由到副本，副本不可用或延迟过大时回退到主库
+REPLICA_DB_CONFIGS = []
+for _replica in filter(None, (h.strip() for h in os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    _host, _, _port = _replica.partition(':')
+    REPLICA_DB_CONFIGS.append({
+        **DB_CONFIG,
+        "host": _host,
+        "port": int(_port or 3306),
+        "user": os.getenv('DB_REPLICA_USER', DB_CONFIG['user']),
+        "password": os.getenv('DB_REPLICA_PASSWORD', DB_CONFIG['password']),
+    })
+
+REPLICA_CONFIG = {
+    "max_lag": float(os.getenv('DB_REPLICA_MAX_LAG', '30')),  # 复制延迟超过此秒数时回退主库
+    "check_interval": float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5')),  # 健康检查间隔（秒）
+}
+
+# 并发模式配置 - 通过 WORKER_PROFILE 选择 sync / gthread / gevent
+WORKER_PROFILES = {
+    # 每个进程同时只处理一个请求，慢请求会独占进程
+    "sync": {
+        "worker_class": "sync",
+        "threads": 1,
+        "worker_connections": 1,
+    },
+    # 每个进程多个线程，慢查询等待数据库时其他线程继续处理请求
+    "gthread": {
+        "worker_class": "gthread",
+        "threads": int(os.getenv('WORKER_THREADS', '8')),
+        "worker_connections": int(os.getenv('WORKER_THREADS', '8')),
+    },
+    # 协程模式，需要 gevent 并使用纯Python MySQL驱动使数据库IO可让出
+    "gevent": {
+        "worker_class": "gevent",
+        "threads": 1,
+        "worker_connections": int(os.getenv('WORKER_CONNECTIONS', '100')),
+    },
+}
+
+WORKER_PROFILE = os.getenv('WORKER_PROFILE', 'sync')
+if WORKER_PROFILE not in WORKER_PROFILES:
+    raise ValueError(f"未知的 WORKER_PROFILE: {WORKER_PROFILE}，可选值: {', '.join(WORKER_PROFILES)}")
+
+def get_worker_concurrency(profile=WORKER_PROFILE):
+    """单个工作进程可同时处理的请求数"""
+    settings = WORKER_PROFILES[profile]
+    if settings['worker_class'] == 'gthread':
+        return settings['threads']
+    return settings['worker_connections']
+
+# mysql-connector 单个连接池最多32个连接
+MAX_POOL_SIZE = 32
+
+# 后台任务（缓存刷新等）额外占用的连接数
+POOL_HEADROOM = 3
+
+def get_pool_size(profile=WORKER_PROFILE):
+    """按并发模式计算每个进程的连接池大小，可用 DB_POOL_SIZE 显式覆盖"""
+    if os.getenv('DB_POOL_SIZE'):
+        return min(int(os.getenv('DB_POOL_SIZE')), MAX_POOL_SIZE)
+    return min(get_worker_concurrency(profile) + POOL_HEADROOM, MAX_POOL_SIZE)
+
 # 连接池配置 - 优化版本
 POOL_CONFIG = {
     "pool_name": "mypool",
-    "pool_size": int(os.getenv('DB_POOL_SIZE', '15')),  # 增加连接池大小
+    "pool_size": get_pool_size(),  # 与每个进程的并发数匹配
     "pool_reset_session": True,
     "autocommit": True,  # 自动提交提高性能
+    # gevent模式下C扩展的阻塞IO无法被协程调度，必须使用纯Python实现
+    "use_pure": WORKER_PROFILES[WORKER_PROFILE]['worker_class'] == 'gevent',
 }
 
+# 连接池耗尽时等待空闲连接的最长时间（秒），超时返回503
+POOL_CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', '10'))
+
 # 应用配置
 APP_CONFIG = {
     "host": os.getenv('APP_HOST', '0.0.0.0'),  # 改为监听所有网络接口
     "port": int(os.getenv('APP_PORT', '5172')),  # 改为5172端口
-    "debug": os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
+    "debug": os.getenv('FLASK_DEBUG', 'False').lower() == 'true',
+    "frontend_dist": os.getenv('FRONTEND_DIST', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend', 'dist')),
+    "COMPRESS_MIN_SIZE": int(os.getenv('COMPRESS_MIN_SIZE', '2048')),  # 超过此大小的JSON响应才压缩（字节）
+    "COMPRESS_LEVEL": int(os.getenv('COMPRESS_LEVEL', '5')),
+    "PROFILING_ENABLED": os.getenv('PROFILING_ENABLED', 'True').lower() == 'true',  # 管理员可通过 ?__profile=1 分析单个请求
 }
 
 # API配置 - 性能优化版本
 API_CONFIG = {
     "DEFAULT_PAGE_SIZE": int(os.getenv('DEFAULT_PAGE_SIZE', '20')),
     "MAX_PAGE_SIZE": int(os.getenv('MAX_PAGE_SIZE', '100')),
-    "QUERY_TIMEOUT": int(os.getenv('QUERY_TIMEOUT', '30')),  # 秒
+    "QUERY_TIMEOUT": int(os.getenv('QUERY_TIMEOUT', '30')),  # 秒，API中每条SELECT的服务端执行时间上限
+    "EXPORT_QUERY_TIMEOUT": int(os.getenv('EXPORT_QUERY_TIMEOUT', '0')),  # 秒，流式导出的执行时间上限，0为不限制
     "CACHE_TIMEOUT": int(os.getenv('CACHE_TIMEOUT', '300')),  # 缓存5分钟
+    "CACHE_STALE_AFTER": int(os.getenv('CACHE_STALE_AFTER', '240')),  # 4分钟后视为陈旧，后台刷新
+    "CACHE_REFRESH_INTERVAL": int(os.getenv('CACHE_REFRESH_INTERVAL', '30')),  # 检查新入库数据的间隔（秒）
+    "EXPORT_BATCH_SIZE": int(os.getenv('EXPORT_BATCH_SIZE', '1000')),  # 流式导出每批行数
+    "JSON_SERIALIZER": os.getenv('JSON_SERIALIZER', 'auto'),  # auto/orjson/json
     "ENABLE_QUERY_CACHE": os.getenv('ENABLE_QUERY_CACHE', 'True').lower() == 'true',
+    "SQL_TRACE_THRESHOLD": float(os.getenv('SQL_TRACE_THRESHOLD', '0.5')),  # 秒，接口自身SQL超过此耗时时记录，0为关闭
+    "SQL_TRACE_BUFFER_SIZE": int(os.getenv('SQL_TRACE_BUFFER_SIZE', '200')),  # 每个工作进程保留的慢SQL条数
+}
+
+# 监控指标配置
+METRICS_CONFIG = {
+    "enabled": os.getenv('METRICS_ENABLED', 'True').lower() == 'true',
+    "dir": os.getenv('METRICS_DIR', ''),  # 各工作进程指标文件的共享目录，默认为系统临时目录下的slowquery_metrics
+    "flush_interval": float(os.getenv('METRICS_FLUSH_INTERVAL', '1')),  # 工作进程写入指标文件的最小间隔（秒），后台线程也按此间隔定期写入
+    "token": os.getenv('METRICS_TOKEN', ''),  # 非空时抓取/metrics需携带 Authorization: Bearer <token>
 }
 
 # 安全配置
@@ -59,8 +146,11 @@ SECURITY_CONFIG = {
 class StatusCode:
     SUCCESS = 200
     BAD_REQUEST = 400
+    UNAUTHORIZED = 401
     NOT_FOUND = 404
+    UNPROCESSABLE = 422
     INTERNAL_ERROR = 500
+    SERVICE_UNAVAILABLE = 503
 
 # 响应消息
 class Messages:
@@ -70,3 +160,5 @@ class Messages:
     UPDATE_ERROR = "更新失败"
     INVALID_PARAMS = "无效的参数"
     NOT_FOUND = "未找到相关数据"
+    SERVER_BUSY = "服务繁忙，请稍后重试"
+    QUERY_TOO_EXPENSIVE = "查询耗时超过限制，请缩小时间范围或增加过滤条件后重试"
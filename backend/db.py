@@ -1,11 +1,462 @@
+import os
+import re
+import sys
+import logging
+import threading
+import time
 import mysql.connector
-from config import DB_CONFIG, POOL_CONFIG
+import mysql.connector.pooling
+from mysql.connector import errors
+from flask import g, has_app_context
+from metrics import add_db_time
+from sql_trace import slow_sql_log
+from config import DB_CONFIG, POOL_CONFIG, POOL_CHECKOUT_TIMEOUT, REPLICA_DB_CONFIGS, REPLICA_CONFIG, API_CONFIG
 
-# 创建连接池
-connection_pool = mysql.connector.pooling.MySQLConnectionPool(
-    **DB_CONFIG,
-    **POOL_CONFIG
-)
+logger = logging.getLogger(__name__)
+
+class PoolTimeoutError(errors.PoolError):
+    """等待空闲连接超时"""
+
+class QueryTimeoutError(errors.DatabaseError):
+    """查询超过执行时间预算被服务端中止"""
+
+    def __init__(self, timeout, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+
+# ER_QUERY_TIMEOUT：超过 MAX_EXECUTION_TIME 被中止（MySQL 5.7.8+，MariaDB 不支持该提示）
+QUERY_TIMEOUT_ERRNOS = (3024,)
+
+_SELECT_PATTERN = re.compile(r'^(\s*(?:/\*(?!\+).*?\*/\s*)*)SELECT\b', re.IGNORECASE | re.DOTALL)
+
+def apply_execution_budget(operation, timeout):
+    """为SELECT语句添加 MAX_EXECUTION_TIME 优化器提示，timeout 为秒，0 表示不限制"""
+    if not timeout or 'MAX_EXECUTION_TIME' in operation.upper():
+        return operation
+    return _SELECT_PATTERN.sub(
+        lambda m: f"{m.group(1)}SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */",
+        operation,
+        count=1
+    )
+
+class BudgetedCursor:
+    """
+    为每条SELECT附加服务端执行时间限制的游标代理，超时转换为 QueryTimeoutError
+    同时记录SQL耗时：计入请求指标，超过阈值的语句写入慢SQL记录
+    """
+
+    def __init__(self, cursor, timeout):
+        self._cursor = cursor
+        self.timeout = timeout
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _translate(self, error):
+        if self._statement is not None:
+            self._statement.error = str(error)
+        if getattr(error, 'errno', None) in QUERY_TIMEOUT_ERRNOS:
+            raise QueryTimeoutError(
+                self.timeout,
+                msg=f"查询执行超过 {self.timeout} 秒被中止",
+                errno=error.errno
+            ) from error
+        raise error
+
+    def _run(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except errors.Error as e:
+            self._translate(e)
+        finally:
+            elapsed = time.perf_counter() - start
+            add_db_time(elapsed)
+            if self._statement is not None:
+                self._statement.elapsed += elapsed
+
+    def _begin(self, operation, params, frame):
+        self._finish()
+        self._statement = slow_sql_log.start(operation, params, frame)
+
+    def _track(self, rows, done):
+        if self._statement is not None:
+            self._statement.rows += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        if self._statement is not None:
+            statement, self._statement = self._statement, None
+            slow_sql_log.finish(statement, getattr(self._cursor, 'rowcount', -1))
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._begin(operation, params, sys._getframe(1))
+        return self._run(self._cursor.execute, apply_execution_budget(operation, self.timeout), params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params):
+        self._begin(operation, None, sys._getframe(1))
+        return self._run(self._cursor.executemany, apply_execution_budget(operation, self.timeout), seq_params)
+
+    def fetchone(self):
+        row = self._run(self._cursor.fetchone)
+        self._track(0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._run(self._cursor.fetchmany, size) if size is not None else self._run(self._cursor.fetchmany)
+        self._track(len(rows) if rows else 0, not rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._run(self._cursor.fetchall)
+        self._track(len(rows) if rows else 0, True)
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+class PoolMetrics:
+    """连接池统计：使用中连接数、等待次数、等待时间、超时和错误次数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+        self.errors = 0
+
+    def record_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def record_release(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.waits += 1
+            self.wait_time_total += seconds
+            self.wait_time_max = max(self.wait_time_max, seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'waits': self.waits,
+                'wait_time_total': round(self.wait_time_total, 4),
+                'wait_time_avg': round(self.wait_time_total / self.waits, 4) if self.waits else 0.0,
+                'wait_time_max': round(self.wait_time_max, 4),
+                'timeouts': self.timeouts,
+                'errors': self.errors,
+            }
+
+class PooledConnection:
+    """
+    连接池连接的代理对象，归还时释放连接池名额
+    request_scoped 的连接在请求内多次 close() 不会归还，由请求结束时统一归还
+    """
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+        self._released = False
+        self.request_scoped = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, max_execution_time=None, **kwargs):
+        """创建游标，SELECT默认受 QUERY_TIMEOUT 限制，可通过 max_execution_time 单独指定（0为不限制）"""
+        timeout = API_CONFIG['QUERY_TIMEOUT'] if max_execution_time is None else max_execution_time
+        return BudgetedCursor(self._conn.cursor(*args, **kwargs), timeout)
+
+    def close(self):
+        if self.request_scoped:
+            return
+        self.release()
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        try:
+            self._conn.close()
+        finally:
+            self._pool._release()
+
+class BlockingConnectionPool:
+    """
+    mysql-connector 连接池在连接耗尽时会立即抛出 PoolError，
+    这里用信号量排队等待空闲连接，超过 checkout_timeout 才报错
+    """
+
+    def __init__(self, db_config, pool_config, checkout_timeout):
+        self.pool = mysql.connector.pooling.MySQLConnectionPool(**db_config, **pool_config)
+        self.size = pool_config['pool_size']
+        self.checkout_timeout = checkout_timeout
+        self.metrics = PoolMetrics()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def get_connection(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            acquired = self._slots.acquire(timeout=timeout)
+            self.metrics.record_wait(time.perf_counter() - start)
+            if not acquired:
+                self.metrics.record_timeout()
+                raise PoolTimeoutError(msg=f"等待数据库连接超时（{timeout}秒），连接池大小 {self.size}")
+
+        try:
+            conn = self.pool.get_connection()
+        except Exception:
+            self.metrics.record_error()
+            self._slots.release()
+            raise
+
+        self.metrics.record_checkout()
+        return PooledConnection(conn, self)
+
+    def _release(self):
+        self.metrics.record_release()
+        self._slots.release()
+
+    def stats(self):
+        data = self.metrics.snapshot()
+        data.update({
+            'pid': os.getpid(),
+            'pool_size': self.size,
+            'available': self.size - data['in_use'],
+            'checkout_timeout': self.checkout_timeout,
+        })
+        return data
+
+class Replica:
+    """只读副本：独立连接池 + 健康/延迟状态"""
+
+    def __init__(self, index, db_config):
+        self.index = index
+        self.db_config = db_config
+        self.name = f"{db_config['host']}:{db_config.get('port', 3306)}"
+        self.pool = None
+        self.healthy = False
+        self.lag = None
+        self.error = None
+        self.checked_at = 0.0
+
+    def get_pool(self):
+        if self.pool is None:
+            pool_config = dict(POOL_CONFIG, pool_name=f"{POOL_CONFIG['pool_name']}_replica{self.index}")
+            self.pool = BlockingConnectionPool(self.db_config, pool_config, POOL_CHECKOUT_TIMEOUT)
+        return self.pool
+
+    def check(self):
+        """检查连通性和复制延迟；未配置复制的实例视为无延迟"""
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_pool().get_connection(timeout=1)
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except errors.Error:
+                # MySQL 8.0.22 之前的版本
+                cursor.execute("SHOW SLAVE STATUS")
+            status = cursor.fetchone()
+
+            if status is None:
+                lag = 0
+            else:
+                lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+
+            self.lag = lag
+            self.error = None
+            # lag 为 None 表示复制线程已停止
+            self.healthy = lag is not None and lag <= REPLICA_CONFIG['max_lag']
+            if not self.healthy:
+                logger.warning(f"只读副本 {self.name} 复制延迟异常: {lag}，回退到主库")
+        except Exception as e:
+            self.healthy = False
+            self.error = str(e)
+            logger.warning(f"只读副本 {self.name} 健康检查失败: {str(e)}")
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+            self.checked_at = time.time()
+
+    def stats(self):
+        data = {
+            'name': self.name,
+            'healthy': self.healthy,
+            'lag': self.lag,
+            'error': self.error,
+            'checked_at': self.checked_at,
+        }
+        if self.pool is not None:
+            data['pool'] = self.pool.stats()
+        return data
+
+class ReplicaRouter:
+    """在健康的只读副本之间轮询分配，全部不可用时返回None（调用方回退主库）"""
+
+    def __init__(self, db_configs):
+        self.replicas = [Replica(i, config) for i, config in enumerate(db_configs)]
+        self._next = 0
+
+    def check_all(self):
+        """检查全部副本的健康状态，由后台线程 replica_monitor 定期调用"""
+        for replica in self.replicas:
+            replica.check()
+
+    def get_connection(self):
+        if not self.replicas:
+            return None
+
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+            if not replica.healthy:
+                continue
+            try:
+                return replica.get_pool().get_connection()
+            except PoolTimeoutError:
+                # 副本繁忙不代表不健康，本次请求改用其他副本或主库
+                continue
+            except Exception as e:
+                replica.healthy = False
+                replica.error = str(e)
+                logger.warning(f"只读副本 {replica.name} 获取连接失败，回退: {str(e)}")
+        return None
+
+# 连接池按进程延迟创建：gunicorn preload_app 模式下在master中创建的连接
+# 会被fork出的所有工作进程共享同一个socket
+connection_pool = None
+replica_router = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _ensure_pools():
+    global connection_pool, replica_router, _pool_pid
+    if connection_pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if connection_pool is None or _pool_pid != os.getpid():
+                # 创建连接池
+                connection_pool = BlockingConnectionPool(DB_CONFIG, POOL_CONFIG, POOL_CHECKOUT_TIMEOUT)
+                replica_router = ReplicaRouter(REPLICA_DB_CONFIGS)
+                _pool_pid = os.getpid()
+
+def get_pool():
+    _ensure_pools()
+    return connection_pool
+
+class ReplicaHealthMonitor:
+    """
+    只读副本健康检查的后台线程，与缓存调度器一起在每个工作进程中启动
+    请求线程只读取上次检查的结果，首次检查完成前只读请求使用主库
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            _ensure_pools()
+            replica_router.check_all()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """启动后台检查线程（每个工作进程调用一次），未配置副本时不启动"""
+        if not REPLICA_DB_CONFIGS or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='replica-health', daemon=True)
+        self._thread.start()
+        logger.info("只读副本健康检查已启动")
+
+    def stop(self):
+        self._stop.set()
+
+replica_monitor = ReplicaHealthMonitor(REPLICA_CONFIG['check_interval'])
+
+def _get_read_connection():
+    """优先从健康的只读副本获取连接，否则使用主库"""
+    _ensure_pools()
+    conn = replica_router.get_connection()
+    return conn if conn is not None else connection_pool.get_connection()
+
+def _get_request_connection(key, checkout):
+    conn = g.get(key)
+    if conn is None:
+        conn = checkout()
+        conn.request_scoped = True
+        setattr(g, key, conn)
+    return conn
 
 def get_db():
-    return connection_pool.get_connection()
+    """
+    获取主库连接（写操作使用）
+    请求内（权限校验和接口处理）共用同一个连接，请求结束时由 close_request_db 归还；
+    请求之外（后台刷新线程等）每次获取独立连接，调用方负责 close()
+    """
+    if has_app_context():
+        return _get_request_connection('_db_conn', lambda: get_pool().get_connection())
+    return get_pool().get_connection()
+
+def get_read_db():
+    """
+    获取只读连接（只读接口使用），路由到只读副本，副本不可用或延迟过大时回退主库
+    与 get_db 一样在请求内复用
+    """
+    if has_app_context():
+        return _get_request_connection('_read_db_conn', _get_read_connection)
+    return _get_read_connection()
+
+def close_request_db(exc=None):
+    """teardown_appcontext 钩子：归还请求绑定的连接"""
+    for key in ('_db_conn', '_read_db_conn'):
+        conn = g.pop(key, None)
+        if conn is None:
+            continue
+        if exc is not None:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        conn.release()
+
+def get_pool_stats():
+    """当前进程的连接池统计（主库和只读副本）"""
+    if connection_pool is None or _pool_pid != os.getpid():
+        return {'pid': os.getpid(), 'initialized': False}
+    return {
+        'pid': os.getpid(),
+        'initialized': True,
+        'primary': connection_pool.stats(),
+        'replicas': [replica.stats() for replica in replica_router.replicas],
+    }
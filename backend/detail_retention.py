@@ -0,0 +1,164 @@
+"""
+明细保留策略：每个 (SQL指纹, 天) 只保存最慢的 K 次执行和其余执行中的 N 条均匀抽样
+- 解析时按 (指纹, 天) 维护一个大小为 K 的最小堆和一个大小为 N 的蓄水池，内存与条目数无关
+- 入库时与数据库中同一 (指纹, 天) 已保存的明细合并: 重新取最慢的 K 条，
+  其余部分按各自代表的执行次数分层抽样，结果仍是整体的均匀抽样；不再保留的旧明细被删除
+- 执行次数、耗时等统计由 rollups 精确汇总，不受明细裁剪影响
+只依赖标准库，由解析器调用
+"""
+import heapq
+import random
+from datetime import timedelta
+
+class DayRetention:
+    """单个 (指纹, 天) 的保留状态"""
+
+    __slots__ = ('top', 'sample', 'seen')
+
+    def __init__(self):
+        self.top = []      # (query_time, 序号, 明细) 的最小堆，保存最慢的 K 条
+        self.sample = []   # 蓄水池抽样
+        self.seen = 0      # 进入蓄水池的执行次数（不在最慢 K 条中的执行）
+
+class DetailRetention:
+    """解析过程中按 (指纹, 天) 裁剪明细"""
+
+    def __init__(self, top_k, sample_size, rng=None):
+        self.top_k = top_k
+        self.sample_size = sample_size
+        self.rng = rng or random.Random()
+        self.days = {}
+        self._sequence = 0
+
+    def add(self, detail):
+        key = (detail['checksum'], detail['timestamp'].date())
+        day = self.days.get(key)
+        if day is None:
+            day = self.days[key] = DayRetention()
+        self._sequence += 1
+        item = (detail['query_time'], self._sequence, detail)
+        if len(day.top) < self.top_k:
+            heapq.heappush(day.top, item)
+            return
+        if self.top_k and item > day.top[0]:
+            item = heapq.heapreplace(day.top, item)
+        self._offer(day, item[2])
+
+    def _offer(self, day, detail):
+        """蓄水池抽样（Algorithm R）"""
+        day.seen += 1
+        if len(day.sample) < self.sample_size:
+            day.sample.append(detail)
+            return
+        slot = self.rng.randrange(day.seen)
+        if slot < self.sample_size:
+            day.sample[slot] = detail
+
+    def __len__(self):
+        return sum(len(day.top) + len(day.sample) for day in self.days.values())
+
+    def retained(self):
+        """当前保留的全部明细"""
+        details = []
+        for day in self.days.values():
+            details.extend(item[2] for item in day.top)
+            details.extend(day.sample)
+        return details
+
+    def _draw(self, strata):
+        """
+        从多个分层中不放回地抽取 sample_size 条
+        strata 为 [(该层的均匀抽样列表, 该层代表的执行次数)]，每次按剩余执行次数的比例选层
+        """
+        pools = []
+        for items, population in strata:
+            items = list(items)
+            self.rng.shuffle(items)
+            pools.append([items, population])
+        drawn = []
+        while len(drawn) < self.sample_size:
+            remaining = sum(population for items, population in pools if items)
+            if remaining <= 0:
+                break
+            point = self.rng.random() * remaining
+            for pool in pools:
+                items, population = pool
+                if not items:
+                    continue
+                if point < population:
+                    drawn.append(items.pop())
+                    pool[1] -= 1
+                    break
+                point -= population
+        return drawn
+
+    def merge(self, key, stored, stored_population):
+        """
+        与已保存的明细合并，返回 (要删除的旧明细id, 要写入的新明细)
+        stored 为 [(id, query_time)]，stored_population 为这些明细所代表的执行次数
+        """
+        day = self.days[key]
+        stored = sorted(stored, key=lambda row: row[1], reverse=True)
+        stored_top, stored_rest = stored[:self.top_k], stored[self.top_k:]
+        stored_rest_population = max(stored_population, len(stored)) - len(stored_top)
+
+        candidates = [(row[1], 'stored', row[0]) for row in stored_top]
+        candidates += [(item[0], 'new', item[2]) for item in day.top]
+        candidates.sort(key=lambda item: item[0], reverse=True)
+        top, demoted = candidates[:self.top_k], candidates[self.top_k:]
+
+        sample = self._draw([
+            ([('stored', row[0]) for row in stored_rest], stored_rest_population),
+            ([('new', detail) for detail in day.sample], day.seen),
+            ([(kind, ref) for _, kind, ref in demoted], len(demoted)),
+        ])
+
+        kept = [(kind, ref) for _, kind, ref in top] + sample
+        kept_ids = {ref for kind, ref in kept if kind == 'stored'}
+        delete_ids = [row[0] for row in stored if row[0] not in kept_ids]
+        inserts = [ref for kind, ref in kept if kind == 'new']
+        return delete_ids, inserts
+
+    def apply(self, cursor, chunk_size=200):
+        """
+        入库前与数据库中已保存的明细合并，删除不再保留的旧明细，返回 (要写入的新明细, 删除的旧明细数)
+        没有执行键的旧明细须已由 rollups.backfill 计入汇总，裁剪后统计仍然完整
+        必须在 rollups.save 之前调用；cursor 为解析器的 pymysql 游标，由调用方提交事务
+        """
+        by_day = {}
+        for checksum, day in self.days:
+            by_day.setdefault(day, []).append(checksum)
+
+        inserts = []
+        delete_ids = []
+        for day, checksums in sorted(by_day.items()):
+            for offset in range(0, len(checksums), chunk_size):
+                chunk = checksums[offset:offset + chunk_size]
+                placeholders = ','.join(['%s'] * len(chunk))
+                cursor.execute(f"""
+                    SELECT checksum, executions FROM slow_query_rollup
+                    WHERE bucket_date = %s AND checksum IN ({placeholders})
+                    FOR UPDATE
+                """, [day] + chunk)
+                populations = dict(cursor.fetchall())
+
+                cursor.execute(f"""
+                    SELECT id, checksum, query_time
+                    FROM slow_query_detail
+                    WHERE timestamp >= %s AND timestamp < %s AND checksum IN ({placeholders})
+                """, [day, day + timedelta(days=1)] + chunk)
+                stored = {}
+                for row in cursor.fetchall():
+                    stored.setdefault(row[1], []).append(row)
+
+                for checksum in chunk:
+                    rows = stored.get(checksum, [])
+                    removed, kept = self.merge((checksum, day), [(row[0], row[2]) for row in rows],
+                                               populations.get(checksum, 0))
+                    delete_ids.extend(removed)
+                    inserts.extend(kept)
+
+        for offset in range(0, len(delete_ids), 1000):
+            chunk = delete_ids[offset:offset + 1000]
+            cursor.execute(f"DELETE FROM slow_query_detail WHERE id IN ({','.join(['%s'] * len(chunk))})", chunk)
+        return inserts, len(delete_ids)
@@ -31,6 +31,9 @@ if [ $? -eq 0 ]; then
     echo "开始解析慢日志..."
     python parse_slow_log.py "$LOCAL_LOG_FILE"
     
+    echo "更新近似重复指纹的聚类..."
+    python fingerprint_clusters.py
+    
     echo "清理临时文件..."
     rm "$LOCAL_LOG_FILE"
     echo "完成！"
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复的SQL指纹聚类（MinHash + LSH）
+normalize_sql 基于正则，多一列、换个别名、调换条件顺序都会产生新的指纹。
+本任务对 normalized_sql 的词序列计算 MinHash 签名，用 LSH 分段把相似的指纹分到同一个桶，
+与簇代表的签名相似度达到阈值的指纹合并为一个簇，结果写入 fingerprint_cluster（每个指纹一行）:
+- cluster_id: 簇中最早出现（id最小）的指纹的 checksum，新指纹加入时保持不变
+- cluster_size: 簇中的指纹数
+列表接口可以按簇折叠（/api/queries?collapse=cluster）
+
+只有语句类型和引用的表（table_refs）相同的指纹才会成为候选，不同表上结构相似的SQL不会合并。
+
+开销: 每个指纹的签名计算与SQL长度成线性（单次哈希的 MinHash，再做旋转填充），
+分段逐个处理、每段一个字典，整体为 O(指纹数 × 段数)，不做两两比较；
+签名以 array 紧凑保存，100万指纹约占 256MB（64个哈希值）
+
+使用方法（backend目录下，建议在解析任务之后定时执行）:
+    python fingerprint_clusters.py
+    python fingerprint_clusters.py --threshold 0.8 --dry-run
+"""
+
+import argparse
+import re
+import sys
+import time
+import zlib
+from array import array
+
+import table_refs
+
+CLUSTER_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS fingerprint_cluster (
+        checksum VARCHAR(32) NOT NULL PRIMARY KEY,
+        cluster_id VARCHAR(32) NOT NULL,
+        cluster_size INT NOT NULL DEFAULT 1,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_cluster_id (cluster_id)
+    )
+"""
+
+NUM_HASHES = 64
+DEFAULT_BANDS = 16          # 16段 × 每段4个哈希值，相似度0.7的两条约99%的概率成为候选
+DEFAULT_THRESHOLD = 0.7     # 候选对的签名相似度达到此值才合并，排除LSH的偶然碰撞
+SHINGLE_SIZE = 3            # 以连续3个词为一个特征
+MAX_SQL_LENGTH = 8192       # 只取SQL的前一段，长的 VALUES 列表不影响结构
+
+_TOKEN = re.compile(r'\w+|[^\w\s]')
+_MASK = 0xFFFFFFFF
+_EMPTY = _MASK + 1
+
+def shingles(normalized_sql):
+    tokens = _TOKEN.findall(normalized_sql[:MAX_SQL_LENGTH])
+    if len(tokens) <= SHINGLE_SIZE:
+        return [' '.join(tokens)]
+    return [' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+
+def signature(normalized_sql, num_hashes=NUM_HASHES):
+    """
+    单次哈希的 MinHash: 每个特征只哈希一次，按哈希值分到 num_hashes 个桶中取最小值，
+    空桶用右侧最近的非空桶的值填充（按距离偏移），使签名的逐位相等概率近似 Jaccard 相似度
+    """
+    values = [_EMPTY] * num_hashes
+    for shingle in shingles(normalized_sql):
+        data = shingle.encode('utf-8')
+        slot = zlib.crc32(data) % num_hashes
+        value = zlib.crc32(data, 0x9E3779B9)
+        if value < values[slot]:
+            values[slot] = value
+    if all(value == _EMPTY for value in values):
+        return [0] * num_hashes
+    for slot in range(num_hashes):
+        if values[slot] == _EMPTY:
+            distance = 1
+            while values[(slot + distance) % num_hashes] == _EMPTY:
+                distance += 1
+            values[slot] = (values[(slot + distance) % num_hashes] + distance * 0x9E3779B1) & _MASK
+    return values
+
+def structure_key(normalized_sql):
+    """语句类型和引用的表，作为LSH桶键的一部分"""
+    key = table_refs.statement_type(normalized_sql) + ':' + ','.join(sorted(table_refs.extract_tables(normalized_sql)))
+    return zlib.crc32(key.encode('utf-8'))
+
+def similarity(signatures, a, b, num_hashes=NUM_HASHES):
+    """两个签名的逐位相等比例（Jaccard 相似度的估计）"""
+    start_a, start_b = a * num_hashes, b * num_hashes
+    same = 0
+    for offset in range(num_hashes):
+        if signatures[start_a + offset] == signatures[start_b + offset]:
+            same += 1
+    return same / num_hashes
+
+def _find(parents, node):
+    root = node
+    while parents[root] != root:
+        root = parents[root]
+    while parents[node] != root:
+        parents[node], node = root, parents[node]
+    return root
+
+def cluster(signatures, structures, bands=DEFAULT_BANDS, threshold=DEFAULT_THRESHOLD, num_hashes=NUM_HASHES):
+    """
+    LSH分段聚类，返回每个指纹所属簇的根（簇中最小的下标，即簇代表）
+    每段只保留桶里第一个指纹；后来的指纹所在簇与它所在簇的代表相似度达到阈值才合并，
+    避免相似关系层层传递，把差异很大的指纹连成一个簇
+    """
+    count = len(structures)
+    rows = num_hashes // bands
+    parents = array('l', range(count))
+    for band in range(bands):
+        heads = {}
+        for index in range(count):
+            start = index * num_hashes + band * rows
+            key = (structures[index], signatures[start:start + rows].tobytes())
+            head = heads.setdefault(key, index)
+            if head == index:
+                continue
+            root_a, root_b = _find(parents, head), _find(parents, index)
+            if root_a != root_b and similarity(signatures, root_a, root_b, num_hashes) >= threshold:
+                parents[max(root_a, root_b)] = min(root_a, root_b)
+    return [_find(parents, index) for index in range(count)]
+
+def load_signatures(cursor):
+    """用无缓冲游标流式读取指纹（按id顺序）并计算签名和结构键"""
+    checksums = []
+    signatures = array('I')
+    structures = array('I')
+    try:
+        cursor.execute("SELECT checksum, LEFT(normalized_sql, %s) FROM slow_query_fingerprint ORDER BY id",
+                       (MAX_SQL_LENGTH,))
+        for checksum, normalized_sql in cursor:
+            checksums.append(checksum)
+            signatures.extend(signature(normalized_sql or ''))
+            structures.append(structure_key(normalized_sql or ''))
+    finally:
+        cursor.close()
+    return checksums, signatures, structures
+
+def save_clusters(conn, checksums, roots, batch_size=5000):
+    sizes = {}
+    for root in roots:
+        sizes[root] = sizes.get(root, 0) + 1
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(CLUSTER_TABLE_DDL)
+        sql = """
+            INSERT INTO fingerprint_cluster (checksum, cluster_id, cluster_size)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE cluster_id = VALUES(cluster_id), cluster_size = VALUES(cluster_size)
+        """
+        for offset in range(0, len(checksums), batch_size):
+            cursor.executemany(sql, [
+                (checksums[index], checksums[roots[index]], sizes[roots[index]])
+                for index in range(offset, min(offset + batch_size, len(checksums)))
+            ])
+        # 清理已删除指纹的映射
+        cursor.execute("""
+            DELETE c FROM fingerprint_cluster c
+            LEFT JOIN slow_query_fingerprint f ON f.checksum = c.checksum
+            WHERE f.checksum IS NULL
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description='近似重复的SQL指纹聚类（MinHash + LSH）')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='合并所需的签名相似度 (默认: %(default)s)')
+    parser.add_argument('--bands', type=int, default=DEFAULT_BANDS, choices=[8, 16, 32],
+                        help='LSH分段数，越多召回越高、候选越多 (默认: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true', help='只显示聚类结果，不写入数据库')
+    args = parser.parse_args()
+
+    import pymysql
+    try:
+        from server_config import DB_CONFIG
+    except ImportError:
+        print("警告: 未找到server_config.py，请确认数据库配置")
+        sys.exit(1)
+
+    conn = pymysql.connect(**DB_CONFIG)
+    try:
+        start = time.time()
+        checksums, signatures, structures = load_signatures(conn.cursor(pymysql.cursors.SSCursor))
+        print(f"已计算 {len(checksums)} 个指纹的签名，耗时 {time.time() - start:.1f}s")
+
+        start = time.time()
+        roots = cluster(signatures, structures, args.bands, args.threshold)
+        clusters = len(set(roots))
+        print(f"聚类完成: {len(checksums)} 个指纹 -> {clusters} 个簇，耗时 {time.time() - start:.1f}s")
+
+        if args.dry_run:
+            sizes = {}
+            for root in roots:
+                sizes[root] = sizes.get(root, 0) + 1
+            for root, size in sorted(sizes.items(), key=lambda item: -item[1])[:20]:
+                if size > 1:
+                    print(f"  {checksums[root]}: {size} 个指纹")
+            return
+
+        save_clusters(conn, checksums, roots)
+        print("聚类结果已保存到 fingerprint_cluster")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
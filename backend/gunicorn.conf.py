@@ -2,6 +2,16 @@
 # Gunicorn配置文件 - 慢查询分析系统
 # ============================================
 # 使用方法：gunicorn -c gunicorn.conf.py app:app
+# 并发模式：WORKER_PROFILE=sync|gthread|gevent gunicorn -c gunicorn.conf.py app:app
+import os
+from config import WORKER_PROFILE, WORKER_PROFILES, POOL_CONFIG
+
+_profile = WORKER_PROFILES[WORKER_PROFILE]
+
+# gevent模式下preload_app会在master中导入应用，必须在导入前打补丁
+if _profile["worker_class"] == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
 
 # ============================================
 # 服务器绑定配置
@@ -13,13 +23,16 @@ bind = "0.0.0.0:5172"
 # 工作进程配置
 # ============================================
 # 工作进程数量 (建议: CPU核心数 × 2 + 1)
-workers = 2
+workers = int(os.getenv('WORKERS', '2'))
+
+# 工作进程类型 (由 WORKER_PROFILE 决定)
+worker_class = _profile["worker_class"]
 
-# 工作进程类型
-worker_class = "sync"
+# gthread模式下每个工作进程的线程数
+threads = _profile["threads"]
 
-# 每个工作进程的连接数
-worker_connections = 1000
+# gevent模式下每个工作进程的最大并发连接数
+worker_connections = _profile["worker_connections"]
 
 # ============================================
 # 超时配置
@@ -109,6 +122,12 @@ daemon = False
 def on_starting(server):
     """服务器启动时调用"""
     server.log.info("慢查询分析系统后端服务正在启动...")
+    server.log.info("并发模式: %s (worker_class=%s, threads=%s, worker_connections=%s, 每进程连接池=%s)",
+                    WORKER_PROFILE, worker_class, threads, worker_connections, POOL_CONFIG["pool_size"])
+
+    # 清空上次运行遗留的工作进程指标文件，/metrics 只汇总本次启动以来的数据
+    import metrics
+    metrics.reset_metrics_dir()
 
 def on_reload(server):
     """配置重载时调用"""
@@ -130,6 +149,11 @@ def post_fork(server, worker):
     """工作进程fork后调用"""
     server.log.info("工作进程 %s 已启动", worker.pid)
 
+def worker_exit(server, worker):
+    """工作进程退出时把最后的指标并入归档文件，保证已退出进程的计数不丢失"""
+    import metrics
+    metrics.archive_current_worker()
+
 def pre_exec(server):
     """执行新程序前调用"""
     server.log.info("重新执行程序")
@@ -153,3 +177,11 @@ def on_exit(server):
 def post_worker_init(worker):
     """工作进程初始化后验证配置"""
     worker.log.info("工作进程 %s 配置验证完成", worker.pid)
+
+    # 后台线程不会跨fork保留，需在每个工作进程中启动缓存预热调度器、副本健康检查和指标定期写入
+    from cache import refresh_scheduler
+    from db import replica_monitor
+    import metrics
+    refresh_scheduler.start()
+    replica_monitor.start()
+    metrics.periodic_flusher.start()
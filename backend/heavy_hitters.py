@@ -0,0 +1,135 @@
+"""
+按总耗时等指标统计的 Top-K 热点SQL（加权 Space-Saving 算法）
+- 解析器入库时按天、按指标维护 Space-Saving 摘要，和明细在同一事务中写入 slow_query_topk
+- 摘要可合并，接口按时间范围读取各窗口的摘要在内存中合并，不需要扫描明细表
+- 每个估计值带误差上界：真实值在 [estimate - error, estimate] 之间
+只依赖标准库，解析器（pymysql）和接口（mysql-connector）共用
+"""
+import heapq
+import json
+
+# 权重指标，与 slow_query_detail 的列名一致
+METRICS = ('query_time', 'rows_examined', 'lock_time')
+
+DEFAULT_CAPACITY = 1000
+
+TOPK_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS slow_query_topk (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        window_date DATE NOT NULL,
+        metric VARCHAR(32) NOT NULL,
+        capacity INT NOT NULL,
+        executions INT NOT NULL,
+        total_weight DOUBLE NOT NULL,
+        sketch LONGTEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_metric_window (metric, window_date)
+    )
+"""
+
+class SpaceSaving:
+    """加权 Space-Saving 摘要：最多保留 capacity 个键，满时替换当前最小的键"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counters = {}  # key -> [估计值, 误差上界]
+        self.total = 0.0
+        self.executions = 0
+        self._heap = []  # (估计值, key)，惰性删除过期项
+
+    def _min_entry(self):
+        while self._heap:
+            count, key = self._heap[0]
+            counter = self.counters.get(key)
+            if counter is not None and counter[0] == count:
+                return count, key
+            heapq.heappop(self._heap)
+        return None
+
+    def add(self, key, weight):
+        self.total += weight
+        self.executions += 1
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += weight
+        elif len(self.counters) < self.capacity:
+            counter = self.counters[key] = [weight, 0.0]
+        else:
+            minimum, victim = self._min_entry()
+            heapq.heappop(self._heap)
+            del self.counters[victim]
+            counter = self.counters[key] = [minimum + weight, minimum]
+        heapq.heappush(self._heap, (counter[0], key))
+        if len(self._heap) > self.capacity * 4:
+            # 过期项太多时重建堆
+            self._heap = [(value[0], k) for k, value in self.counters.items()]
+            heapq.heapify(self._heap)
+
+    def min_count(self):
+        """未被记录的键的估计值上界，摘要未满时为0"""
+        if len(self.counters) < self.capacity:
+            return 0.0
+        entry = self._min_entry()
+        return entry[0] if entry else 0.0
+
+    def to_dict(self):
+        items = sorted(self.counters.items(), key=lambda item: -item[1][0])
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'executions': self.executions,
+            'min': self.min_count(),
+            'items': [[key, round(count, 6), round(error, 6)] for key, (count, error) in items],
+        }
+
+class WindowedTopK:
+    """解析过程中按 (日期, 指标) 维护的一组摘要"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, metrics=METRICS):
+        self.capacity = capacity
+        self.metrics = metrics
+        self.windows = {}
+
+    def add(self, checksum, timestamp, **weights):
+        day = timestamp.date()
+        window = self.windows.get(day)
+        if window is None:
+            window = self.windows[day] = {metric: SpaceSaving(self.capacity) for metric in self.metrics}
+        for metric in self.metrics:
+            window[metric].add(checksum, float(weights.get(metric) or 0))
+
+    def rows(self):
+        """生成写入 slow_query_topk 的行"""
+        for day, window in sorted(self.windows.items()):
+            for metric, sketch in window.items():
+                yield (day, metric, self.capacity, sketch.executions, sketch.total,
+                       json.dumps(sketch.to_dict(), separators=(',', ':')))
+
+    def __len__(self):
+        return len(self.windows)
+
+def merge(summaries, limit=20):
+    """
+    合并多个窗口的摘要，返回估计值最大的 limit 项
+    某个窗口没有记录的键，按该窗口的最小值计入估计值和误差（Space-Saving 可合并性）
+    """
+    summaries = [s if isinstance(s, dict) else json.loads(s) for s in summaries]
+    estimates = {}
+    missing_bound = 0.0
+    for summary in summaries:
+        missing_bound += summary.get('min', 0.0)
+    for summary in summaries:
+        floor = summary.get('min', 0.0)
+        for key, count, error in summary['items']:
+            entry = estimates.get(key)
+            if entry is None:
+                # 先假设在所有窗口都未记录，出现时再替换为实际值
+                entry = estimates[key] = [missing_bound, missing_bound]
+            entry[0] += count - floor
+            entry[1] += error - floor
+
+    top = heapq.nlargest(limit, estimates.items(), key=lambda item: item[1][0])
+    return [
+        {'checksum': key, 'estimate': round(count, 6), 'error': round(error, 6), 'lower_bound': round(count - error, 6)}
+        for key, (count, error) in top
+    ]
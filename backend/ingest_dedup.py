@@ -0,0 +1,232 @@
+"""
+幂等入库: 每次执行的自然键和解析时的去重过滤
+- 执行键: checksum、时间戳（含微秒）、线程Id、耗时、锁等待、返回行数、扫描行数的64位哈希，
+  同一条日志重复解析得到相同的键
+- 已入库的执行键记录在 slow_query_ingested（主键去重），明细表 slow_query_detail.exec_key 上有唯一索引
+- 解析前从 slow_query_ingested 加载时间窗口内的键建布隆过滤器（约每个键1.2字节，误判率1%），
+  本次判定为新的键也加入布隆过滤器（容量不够时追加一层），内存只与键数成正比（每个键约2~3字节）
+- 未命中的条目一定是新的，命中的条目（已入库或本次日志内重复）攒批确认，重复的在计入指纹、汇总之前丢弃:
+  已入库的到数据库按主键查询，本次日志内的查本地的临时键库
+- 解析期间对数据库只读（自动提交的SELECT，不持有锁）: 本次判定为新的键写入本地的临时SQLite文件，
+  由入库时在写入数据的同一事务中写入 slow_query_ingested 后一起提交，不保存时不会改动数据库
+只依赖标准库，由解析器调用
+"""
+import hashlib
+import math
+import sqlite3
+from datetime import date
+
+INGESTED_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS slow_query_ingested (
+        exec_key BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+        bucket_date DATE NOT NULL,
+        INDEX idx_bucket_date (bucket_date)
+    )
+"""
+
+NEW, SUSPECT = 'new', 'suspect'
+
+CONFIRM_BATCH = 500     # 布隆过滤器命中的条目每攒够这么多条确认一次
+WRITE_BATCH = 5000      # 新的键每攒够这么多个写入一次本地键库，入库时也按此批量写入 slow_query_ingested
+INITIAL_CAPACITY = 100000   # 本次解析的键所用布隆过滤器第一层的容量，之后每层翻倍
+KEY_OFFSET = 1 << 63        # SQLite 的整数是有符号64位，本地键库中的键减去该值保存
+
+def execution_key(checksum, timestamp, thread_id, query_time, lock_time, rows_sent, rows_examined):
+    """单次执行的自然键（64位无符号整数）"""
+    data = f"{checksum}|{timestamp.isoformat()}|{thread_id}|{query_time!r}|{lock_time!r}|{rows_sent}|{rows_examined}"
+    return int.from_bytes(hashlib.blake2b(data.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class BloomFilter:
+    """位数组布隆过滤器，k 个位置由键的高低32位双重哈希得到"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity = max(capacity, 1000)
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        low, high = key & 0xFFFFFFFF, (key >> 32) | 1
+        return [(low + i * high) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class IngestFilter:
+    """解析过程中判断每次执行是否已经入库或在本次日志中重复出现"""
+
+    def __init__(self, error_rate=0.01):
+        self.error_rate = error_rate
+        self.blooms = []        # 布隆过滤器各层: 预热加载的已入库键，以及本次判定为新的键
+        self.conn = None        # 查询已入库键的只读连接，未连接时只去除本次日志内的重复
+        self.store = None       # 本次判定为新的键（本地临时SQLite文件，关闭时删除）
+        self.unstored = []      # 还没写入本地键库的 [(键, 日期)]
+        self.admitted = 0       # 本次判定为新的执行数
+        self.written = 0        # 入库时实际写入 slow_query_ingested 的键数
+        self.warmed = 0
+        self.duplicates = 0
+        self.false_positives = 0
+
+    def connect(self, conn):
+        """
+        conn 为 pymysql 连接，只用于预热和确认命中的SELECT（自动提交，不持有锁）；
+        slow_query_ingested 还不存在时没有已入库的键，关闭连接并返回False
+        """
+        try:
+            conn.autocommit(True)
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'slow_query_ingested'
+                """)
+                exists = cursor.fetchone()[0] > 0
+            finally:
+                cursor.close()
+        except Exception:
+            conn.close()
+            raise
+        if not exists:
+            conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    def disconnect(self):
+        """解析结束后关闭只读连接，本次登记的键保留到入库"""
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            finally:
+                self.conn = None
+
+    def warm(self, start_time, end_time):
+        """从 slow_query_ingested 加载 [start_time, end_time] 覆盖的各天的键"""
+        import pymysql
+        window = (start_time.date(), end_time.date())
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT COUNT(*) FROM slow_query_ingested WHERE bucket_date BETWEEN %s AND %s", window)
+            total = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+        if not total:
+            return 0
+
+        bloom = BloomFilter(total, self.error_rate)
+        cursor = self.conn.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute("SELECT exec_key FROM slow_query_ingested WHERE bucket_date BETWEEN %s AND %s", window)
+            for (key,) in cursor:
+                bloom.add(key)
+        finally:
+            cursor.close()
+        self.blooms.append(bloom)
+        self.warmed = bloom.count
+        return self.warmed
+
+    def _remember(self, key, day):
+        """登记新的执行: 加入布隆过滤器，攒批写入本地键库"""
+        bloom = self.blooms[-1] if self.blooms else None
+        if bloom is None or bloom.count >= bloom.capacity:
+            # 追加一层，容量翻倍、误判率减半，总误判率不超过 error_rate 的两倍
+            layers = len(self.blooms)
+            bloom = BloomFilter(max(INITIAL_CAPACITY, bloom.capacity * 2 if bloom else 0), self.error_rate / 2 ** layers)
+            self.blooms.append(bloom)
+        bloom.add(key)
+        self.admitted += 1
+        self.unstored.append((key - KEY_OFFSET, day.toordinal()))
+        if len(self.unstored) >= WRITE_BATCH:
+            self._store()
+
+    def _store(self):
+        if not self.unstored:
+            return
+        if self.store is None:
+            # 空文件名: SQLite 的私有临时库，关闭时删除；本地文件，只有本进程使用，不需要日志和同步
+            self.store = sqlite3.connect('')
+            self.store.execute("PRAGMA journal_mode = OFF")
+            self.store.execute("PRAGMA synchronous = OFF")
+            self.store.execute("CREATE TABLE admitted (exec_key INTEGER PRIMARY KEY, bucket_date INTEGER NOT NULL)")
+        self.store.executemany("INSERT INTO admitted VALUES (?, ?)", self.unstored)
+        self.unstored = []
+
+    def _stored(self, keys):
+        """本次已登记的键中出现在 keys 里的"""
+        if self.store is None or not keys:
+            return set()
+        rows = self.store.execute(f"SELECT exec_key FROM admitted WHERE exec_key IN ({','.join(['?'] * len(keys))})",
+                                  [key - KEY_OFFSET for key in keys])
+        return {row[0] + KEY_OFFSET for row in rows}
+
+    def _ingested(self, keys):
+        """已入库的键中出现在 keys 里的，未连接时为空"""
+        if self.conn is None or not keys:
+            return set()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f"SELECT exec_key FROM slow_query_ingested WHERE exec_key IN ({','.join(['%s'] * len(keys))})",
+                           keys)
+            return {row[0] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def check(self, key, day):
+        """NEW: 新的执行（已登记）；SUSPECT: 可能已入库或本次日志内重复，需要 confirm"""
+        if any(key in bloom for bloom in self.blooms):
+            return SUSPECT
+        self._remember(key, day)
+        return NEW
+
+    def confirm(self, pending):
+        """按主键确认一批 [(键, 日期)]，返回对应的是否为新执行，新的会被登记"""
+        # 先把本次已登记的键写入本地键库，本次日志内的重复也由键库确认
+        self._store()
+        keys = [key for key, day in pending]
+        existing = self._stored(keys) | self._ingested(keys)
+        verdicts = []
+        for key, day in pending:
+            is_new = key not in existing
+            if is_new:
+                existing.add(key)  # 同一批中再次出现的是重复
+                self._remember(key, day)
+                self.false_positives += 1
+            else:
+                self.duplicates += 1
+            verdicts.append(is_new)
+        return verdicts
+
+    def write_keys(self, cursor):
+        """
+        入库时调用: 把本次登记的键按主键顺序分批写入 slow_query_ingested（不提交，与数据在同一事务中），
+        返回实际写入的键数；少于 admitted 时说明部分执行在解析时没能识别为已入库
+        """
+        self._store()
+        self.written = 0
+        if self.store is None:
+            return 0
+        rows = self.store.execute("SELECT exec_key, bucket_date FROM admitted ORDER BY exec_key")
+        while True:
+            batch = rows.fetchmany(WRITE_BATCH)
+            if not batch:
+                break
+            self.written += cursor.executemany(
+                "INSERT IGNORE INTO slow_query_ingested (exec_key, bucket_date) VALUES (%s, %s)",
+                [(key + KEY_OFFSET, date.fromordinal(day)) for key, day in batch]) or 0
+        return self.written
+
+    def close(self):
+        """关闭只读连接并删除本地键库"""
+        try:
+            self.disconnect()
+        finally:
+            if self.store is not None:
+                self.store.close()
+                self.store = None
+            self.unstored = []
@@ -1,10 +1,16 @@
 import mysql.connector
 from config import DB_CONFIG
+from heavy_hitters import TOPK_TABLE_DDL
+from regression_detector import BASELINE_TABLE_DDL, REGRESSION_TABLE_DDL
+from table_refs import FINGERPRINT_TABLES_DDL
+from fingerprint_clusters import CLUSTER_TABLE_DDL
+from rollups import ROLLUP_TABLE_DDL, backfill, ensure_columns, has_pending_details
+from ingest_dedup import INGESTED_TABLE_DDL
 
 def init_tables():
     """初始化慢查询相关表"""
     connection = mysql.connector.connect(**DB_CONFIG)
-    cursor = connection.cursor()
+    cursor = connection.cursor(buffered=True)
     
     try:
         # 创建慢查询指纹表
@@ -26,7 +32,8 @@ def init_tables():
                 INDEX idx_checksum (checksum),
                 INDEX idx_username (username),
                 INDEX idx_dbname (dbname),
-                INDEX idx_last_seen (last_seen)
+                INDEX idx_last_seen (last_seen),
+                FULLTEXT INDEX ft_normalized_sql (normalized_sql)
             )
         """)
         
@@ -42,19 +49,54 @@ def init_tables():
                 rows_sent INT,
                 rows_examined INT,
                 rows_affected INT,
+                bytes_sent BIGINT,
+                tmp_tables INT,
+                tmp_disk_tables INT,
+                full_scan TINYINT(1),
+                full_join TINYINT(1),
+                filesort TINYINT(1),
+                filesort_on_disk TINYINT(1),
+                innodb_io_r_ops BIGINT,
+                innodb_pages_distinct INT,
+                exec_key BIGINT UNSIGNED NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 INDEX idx_checksum (checksum),
                 INDEX idx_timestamp (timestamp),
+                UNIQUE INDEX uk_exec_key (exec_key),
                 FOREIGN KEY (checksum) REFERENCES slow_query_fingerprint(checksum) ON DELETE CASCADE
             )
         """)
         
+        # 按天的Top-K热点SQL摘要
+        cursor.execute(TOPK_TABLE_DDL)
+        
+        # 按指纹的基线和检测到的性能回归
+        cursor.execute(BASELINE_TABLE_DDL)
+        cursor.execute(REGRESSION_TABLE_DDL)
+        
+        # 指纹引用的表和语句类型，用于按表名过滤
+        cursor.execute(FINGERPRINT_TABLES_DDL)
+        
+        # 近似重复指纹的聚类结果
+        cursor.execute(CLUSTER_TABLE_DDL)
+        
+        # 按指纹、按天的汇总统计
+        cursor.execute(ROLLUP_TABLE_DDL)
+        
+        # 已入库的执行键，用于重复解析时去重
+        cursor.execute(INGESTED_TABLE_DDL)
+        
+        # 升级已有的库: 补上新增的列，并把汇总之前入库的明细计入按天汇总
+        ensure_columns(cursor)
+        if has_pending_details(cursor):
+            print(f"已将 {backfill(connection, cursor)} 条明细计入按天汇总")
+        
         connection.commit()
         print("数据表初始化成功！")
         
     except Exception as e:
         connection.rollback()
-        print(f"初始化失败，错误详情:")
+        print("初始化失败，错误详情:")
         print(f"错误类型: {type(e).__name__}")
         print(f"错误信息: {str(e)}")
         import traceback
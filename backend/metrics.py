@@ -0,0 +1,364 @@
+"""
+请求指标采集与 Prometheus 文本格式输出
+- 每个请求记录接口延迟直方图、状态码计数、并发中请求数、数据库耗时和序列化耗时
+- 每个工作进程在请求结束时（节流）和后台线程中定期把自己的指标写入共享目录，/metrics 汇总所有进程（包括已退出进程的计数器）
+- 已退出进程的指标文件并入 archive.json 后删除（工作进程退出时，或汇总时发现进程已不存在），
+  目录中的文件数不随 max_requests 重启增长，进程号被复用时也不会覆盖旧进程的计数
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context, request
+from config import METRICS_CONFIG
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境只有一个进程，不需要文件锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    'http_requests_total': ('counter', '按接口、方法和状态码统计的请求数'),
+    'http_requests_in_flight': ('gauge', '正在处理的请求数'),
+    'http_request_duration_seconds': ('histogram', '请求总耗时'),
+    'http_request_db_seconds': ('histogram', '请求中执行SQL的耗时'),
+    'http_request_serialize_seconds': ('histogram', '请求中JSON序列化的耗时'),
+    'db_pool_checkouts_total': ('counter', '连接池取出连接次数'),
+    'db_pool_waits_total': ('counter', '连接池排队等待次数'),
+    'db_pool_wait_seconds_total': ('counter', '连接池排队等待总时间'),
+    'db_pool_timeouts_total': ('counter', '连接池排队超时次数'),
+    'db_pool_errors_total': ('counter', '连接池获取连接错误次数'),
+    'db_pool_in_use': ('gauge', '正在使用的连接数'),
+}
+
+def _label_key(labels):
+    return json.dumps(sorted(labels.items()), ensure_ascii=False)
+
+class MetricsRegistry:
+    """单个进程内的指标，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, labels, value):
+        with self._lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def add_gauge(self, name, labels, value):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+                    break
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps({
+                'pid': os.getpid(),
+                'counters': self.counters,
+                'gauges': self.gauges,
+                'histograms': self.histograms,
+            }))
+
+registry = MetricsRegistry()
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+_flushed_pid = None     # 已写过指标文件的进程号，fork 后的新进程首次写入前先归档同号旧文件
+_archived = False       # 本进程的指标已归档（进程即将退出），不再写入
+
+ARCHIVE_FILE = 'archive.json'
+
+def get_metrics_dir():
+    """各工作进程共享的指标文件目录"""
+    return METRICS_CONFIG['dir'] or os.path.join(tempfile.gettempdir(), 'slowquery_metrics')
+
+def reset_metrics_dir():
+    """服务启动时清空上一次运行留下的进程指标文件"""
+    path = get_metrics_dir()
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def _collect_pool_metrics():
+    from db import get_pool_stats
+    stats = get_pool_stats()
+    if not stats.get('initialized'):
+        return
+    pools = [('primary', stats['primary'])]
+    pools += [(replica['name'], replica['pool']) for replica in stats['replicas'] if 'pool' in replica]
+    for name, pool in pools:
+        labels = {'pool': name}
+        with registry._lock:
+            for metric, field in (('db_pool_checkouts_total', 'checkouts'), ('db_pool_waits_total', 'waits'),
+                                  ('db_pool_wait_seconds_total', 'wait_time_total'),
+                                  ('db_pool_timeouts_total', 'timeouts'), ('db_pool_errors_total', 'errors')):
+                registry.counters.setdefault(metric, {})[_label_key(labels)] = pool[field]
+        registry.set_gauge('db_pool_in_use', labels, pool['in_use'])
+
+def _write_json(target, data):
+    tmp = f"{target}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, target)
+
+def _read_json(target):
+    try:
+        with open(target, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def _dir_lock(path):
+    """归档时的跨进程排他锁"""
+    with open(os.path.join(path, '.lock'), 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def flush(force=False):
+    """把当前进程的指标写入共享目录（默认最多每 flush_interval 秒一次）"""
+    global _last_flush, _flushed_pid
+    now = time.time()
+    if _archived or (not force and now - _last_flush < METRICS_CONFIG['flush_interval']):
+        return
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush = now
+        _collect_pool_metrics()
+        path = get_metrics_dir()
+        os.makedirs(path, exist_ok=True)
+        pid = os.getpid()
+        if _flushed_pid != pid:
+            # 同号文件属于已退出的旧进程（进程号被复用），先归档，避免被覆盖
+            archive_worker(pid)
+            _flushed_pid = pid
+        _write_json(os.path.join(path, f"worker_{pid}.json"), registry.snapshot())
+    except Exception as e:
+        logger.warning(f"写入指标文件失败: {str(e)}")
+    finally:
+        _flush_lock.release()
+
+class PeriodicFlusher:
+    """
+    每个工作进程定期写入指标的后台线程，与缓存调度器一起在每个工作进程中启动
+    请求结束时的写入有节流，空闲进程最后几个请求的计数和并发中请求数靠它写入共享目录
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            flush(force=True)
+
+    def start(self):
+        """启动后台写入线程（每个工作进程调用一次），未启用指标时不启动"""
+        if not METRICS_CONFIG['enabled'] or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+periodic_flusher = PeriodicFlusher(METRICS_CONFIG['flush_interval'])
+
+def _merge_counters(target, counters):
+    for name, series in counters.items():
+        merged = target.setdefault(name, {})
+        for key, value in series.items():
+            merged[key] = merged.get(key, 0) + value
+
+def _merge_histograms(target, histograms):
+    for name, series in histograms.items():
+        merged_series = target.setdefault(name, {})
+        for key, hist in series.items():
+            merged = merged_series.setdefault(key, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], hist['buckets'])]
+            merged['sum'] += hist['sum']
+            merged['count'] += hist['count']
+
+def archive_worker(pid):
+    """把已退出进程的指标文件并入归档文件后删除：计数器和直方图累加，仪表值丢弃"""
+    path = get_metrics_dir()
+    worker_file = os.path.join(path, f"worker_{pid}.json")
+    if not os.path.exists(worker_file):
+        return
+    with _dir_lock(path):
+        if not os.path.exists(worker_file):
+            return  # 其他进程已归档
+        snap = _read_json(worker_file)
+        if snap is not None:
+            archive_file = os.path.join(path, ARCHIVE_FILE)
+            archive = _read_json(archive_file) or {'counters': {}, 'histograms': {}}
+            _merge_counters(archive['counters'], snap.get('counters', {}))
+            _merge_histograms(archive['histograms'], snap.get('histograms', {}))
+            _write_json(archive_file, archive)
+        os.remove(worker_file)
+
+def archive_current_worker():
+    """gunicorn worker_exit 钩子调用：写入最后的指标后并入归档文件"""
+    global _archived
+    flush(force=True)
+    with _flush_lock:
+        _archived = True
+        archive_worker(os.getpid())
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+
+def _load_snapshots():
+    """读取存活进程的指标文件和归档文件，顺带归档已退出进程留下的文件"""
+    path = get_metrics_dir()
+    snapshots = []
+    if not os.path.isdir(path):
+        return snapshots
+    for filename in os.listdir(path):
+        if not (filename.startswith('worker_') and filename.endswith('.json')):
+            continue
+        try:
+            pid = int(filename[len('worker_'):-len('.json')])
+        except ValueError:
+            continue
+        if pid != os.getpid() and not _pid_alive(pid):
+            try:
+                archive_worker(pid)
+            except OSError as e:
+                logger.warning(f"归档进程 {pid} 的指标文件失败: {str(e)}")
+            continue
+        snap = _read_json(os.path.join(path, filename))
+        if snap is not None:
+            snapshots.append(snap)
+    archive = _read_json(os.path.join(path, ARCHIVE_FILE))
+    if archive is not None:
+        snapshots.append(archive)
+    return snapshots
+
+def _format_labels(key, extra=None):
+    pairs = [tuple(pair) for pair in json.loads(key)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def aggregate():
+    """合并共享目录中所有进程的指标，返回 (counters, gauges, histograms)"""
+    counters, gauges, histograms = {}, {}, {}
+    for snap in _load_snapshots():
+        _merge_counters(counters, snap.get('counters', {}))
+        # 仪表值只统计存活进程（归档文件没有仪表值）
+        _merge_counters(gauges, snap.get('gauges', {}))
+        _merge_histograms(histograms, snap.get('histograms', {}))
+    return counters, gauges, histograms
+
+def render_prometheus():
+    """汇总所有工作进程的指标，输出 Prometheus 文本格式"""
+    flush(force=True)
+    counters, gauges, histograms = aggregate()
+
+    lines = []
+    for name in sorted(set(counters) | set(gauges) | set(histograms)):
+        metric_type, help_text = METRIC_HELP.get(name, ('untyped', name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for key, value in sorted(counters.get(name, {}).items()) + sorted(gauges.get(name, {}).items()):
+            lines.append(f"{name}{_format_labels(key)} {value}")
+        for key, hist in sorted(histograms.get(name, {}).items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, hist['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {hist['count']}")
+            lines.append(f"{name}_sum{_format_labels(key)} {hist['sum']}")
+            lines.append(f"{name}_count{_format_labels(key)} {hist['count']}")
+    return '\n'.join(lines) + '\n'
+
+def add_db_time(seconds):
+    """数据库层调用：累计当前请求执行SQL的耗时"""
+    if has_app_context() and 'metrics_start' in g:
+        g.metrics_db_time = g.get('metrics_db_time', 0.0) + seconds
+
+def add_serialize_time(seconds):
+    """响应层调用：累计当前请求JSON序列化的耗时"""
+    if has_app_context() and 'metrics_start' in g:
+        g.metrics_serialize_time = g.get('metrics_serialize_time', 0.0) + seconds
+
+def _endpoint_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+def before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_endpoint = _endpoint_label()
+    g.metrics_db_time = 0.0
+    g.metrics_serialize_time = 0.0
+    registry.add_gauge('http_requests_in_flight', {}, 1)
+
+def after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+def teardown_request(exc=None):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    registry.add_gauge('http_requests_in_flight', {}, -1)
+
+    labels = {'endpoint': g.get('metrics_endpoint', 'unmatched'), 'method': request.method}
+    status = g.get('metrics_status', 500 if exc is not None else 200)
+    registry.inc('http_requests_total', dict(labels, status=str(status)))
+    registry.observe('http_request_duration_seconds', labels, time.perf_counter() - start)
+    registry.observe('http_request_db_seconds', labels, g.get('metrics_db_time', 0.0))
+    registry.observe('http_request_serialize_seconds', labels, g.get('metrics_serialize_time', 0.0))
+    flush()
+
+def init_app(app):
+    """注册请求指标采集钩子"""
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 import sys
 import os
 from config import DB_CONFIG
+from rollups import fold_pending_details
 
 class SlowLogParser:
     def __init__(self):
@@ -166,7 +167,7 @@ class SlowLogParser:
     def save_to_database(self):
         """保存解析结果到数据库"""
         conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+        cursor = conn.cursor(buffered=True)
         
         try:
             print(f"开始保存 {len(self.fingerprints)} 个指纹和 {len(self.details)} 条详细记录")
@@ -213,6 +214,9 @@ class SlowLogParser:
             conn.commit()
             print("数据保存成功！")
             
+            # 本脚本不写执行键，提交后把新写入的明细计入按天汇总，接口的列表和统计才能看到
+            print(f"已将 {fold_pending_details(conn, cursor)} 条明细计入按天汇总")
+            
         except Exception as e:
             conn.rollback()
             print(f"保存数据失败: {e}")
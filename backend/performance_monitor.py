@@ -9,6 +9,7 @@ from datetime import datetime
 import json
 import os
 from config import DB_CONFIG
+import metrics
 
 class PerformanceMonitor:
     def __init__(self):
@@ -97,8 +98,31 @@ class PerformanceMonitor:
             'disk_free': disk.free // (1024 * 1024 * 1024)  # GB
         }
     
+    def load_service_metrics(self):
+        """从各工作进程的共享指标文件中汇总请求数、错误数和平均响应时间"""
+        counters, gauges, histograms = metrics.aggregate()
+        requests_count = 0
+        error_count = 0
+        for key, value in counters.get('http_requests_total', {}).items():
+            requests_count += value
+            if dict(json.loads(key)).get('status', '').startswith('5'):
+                error_count += value
+
+        durations = histograms.get('http_request_duration_seconds', {}).values()
+        total_time = sum(hist['sum'] for hist in durations)
+        if requests_count:
+            self.metrics['requests_count'] = requests_count
+            self.metrics['error_count'] = error_count
+            self.metrics['avg_response_time'] = total_time / requests_count
+        return {
+            'in_flight': sum(gauges.get('http_requests_in_flight', {}).values()),
+            'db_time': sum(h['sum'] for h in histograms.get('http_request_db_seconds', {}).values()),
+            'serialize_time': sum(h['sum'] for h in histograms.get('http_request_serialize_seconds', {}).values()),
+        }
+
     def get_application_metrics(self):
-        """获取应用性能指标"""
+        """获取应用性能指标（优先使用后端服务写入的共享指标）"""
+        service = self.load_service_metrics()
         uptime = time.time() - self.start_time
         error_rate = (self.metrics['error_count'] / max(self.metrics['requests_count'], 1)) * 100
         
@@ -107,7 +131,10 @@ class PerformanceMonitor:
             'total_requests': self.metrics['requests_count'],
             'avg_response_time': round(self.metrics['avg_response_time'], 3),
             'error_rate': round(error_rate, 2),
-            'requests_per_second': round(self.metrics['requests_count'] / max(uptime, 1), 2)
+            'requests_per_second': round(self.metrics['requests_count'] / max(uptime, 1), 2),
+            'in_flight': service['in_flight'],
+            'db_time_total': round(service['db_time'], 3),
+            'serialize_time_total': round(service['serialize_time'], 3)
         }
     
     def generate_report(self):
@@ -152,6 +179,8 @@ class PerformanceMonitor:
         print(f"   平均响应时间: {app['avg_response_time']}秒")
         print(f"   错误率: {app['error_rate']}%")
         print(f"   QPS: {app['requests_per_second']}")
+        print(f"   处理中请求: {app['in_flight']}")
+        print(f"   数据库总耗时: {app['db_time_total']}秒，序列化总耗时: {app['serialize_time_total']}秒")
         
         # 系统指标
         sys = report['system']
@@ -0,0 +1,132 @@
+"""
+按需性能分析
+请求带 ?__profile=1 时（仅管理员）用 cProfile 运行该请求，返回耗时最多的函数而不是原响应
+?__profile=prof 返回 pstats 原始数据，可用 snakeviz 等工具查看
+未开启时不注册任何钩子
+"""
+import cProfile
+import logging
+import marshal
+import pstats
+import threading
+import time
+from flask import g, request
+from config import APP_CONFIG
+from utils import api_response
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PARAM = '__profile'
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+DEFAULT_TOP = 40
+
+# cProfile 同一时间在一个进程中只能有一个活动的分析器
+_profile_lock = threading.Lock()
+
+def _is_admin():
+    from auth import verify_token, get_user_roles
+    from db import get_read_db
+
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    payload = verify_token(token) if token else None
+    if not payload:
+        return False
+    db = get_read_db()
+    try:
+        return 'admin' in get_user_roles(db, payload['user_id'])
+    finally:
+        db.close()
+
+def top_frames(profiler, sort_key='cumulative', limit=DEFAULT_TOP):
+    """提取耗时最多的函数"""
+    stats = pstats.Stats(profiler)
+    stats.sort_stats(sort_key)
+    frames = []
+    for func in stats.fcn_list[:limit]:
+        primitive_calls, total_calls, tottime, cumtime, _ = stats.stats[func]
+        filename, lineno, name = func
+        frames.append({
+            'function': name,
+            'file': filename,
+            'line': lineno,
+            'ncalls': total_calls,
+            'primitive_calls': primitive_calls,
+            'tottime': round(tottime, 6),
+            'cumtime': round(cumtime, 6),
+        })
+    return stats.total_tt, frames
+
+def before_request():
+    mode = request.args.get(PROFILE_PARAM)
+    if not mode:
+        return None
+    if not _is_admin():
+        return api_response(success=False, message='性能分析仅限管理员使用', status_code=403)
+    if not _profile_lock.acquire(blocking=False):
+        return api_response(success=False, message='当前进程已有请求在进行性能分析，请稍后重试', status_code=409)
+
+    g.profile_mode = mode
+    g.profile_started = time.perf_counter()
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+    return None
+
+def after_request(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+
+    try:
+        # 流式响应（如导出）在这里消费完，使生成器部分也被分析到
+        if response.is_streamed and not response.direct_passthrough:
+            response.get_data()
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+
+    elapsed = time.perf_counter() - g.pop('profile_started')
+    logger.info(f"性能分析 {request.method} {request.path}: {elapsed:.3f}秒")
+
+    if g.pop('profile_mode') == 'prof':
+        # 与 cProfile.Profile.dump_stats 的文件格式相同
+        profiler.create_stats()
+        filename = f"profile_{request.endpoint or 'request'}_{int(time.time())}.prof"
+        profile_response = response.__class__(marshal.dumps(profiler.stats), mimetype='application/octet-stream')
+        profile_response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return profile_response
+
+    sort_key = request.args.get('__profile_sort', 'cumulative')
+    if sort_key not in SORT_KEYS:
+        sort_key = 'cumulative'
+    limit = request.args.get('__profile_top', DEFAULT_TOP, type=int)
+    total_time, frames = top_frames(profiler, sort_key, limit)
+
+    profile_response, _ = api_response(
+        success=True,
+        message="性能分析完成",
+        data={
+            'path': request.full_path,
+            'method': request.method,
+            'status_code': response.status_code,
+            'elapsed': round(elapsed, 6),
+            'profiled_time': round(total_time, 6),
+            'sort': sort_key,
+            'frames': frames,
+        }
+    )
+    return profile_response
+
+def teardown_request(exc=None):
+    """请求异常中止时停止分析并释放锁"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+
+def init_app(app):
+    """注册按需性能分析钩子"""
+    if not APP_CONFIG['PROFILING_ENABLED']:
+        return
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
@@ -0,0 +1,191 @@
+"""
+按SQL指纹的增量回归检测
+- 每次入库后，只对本批涉及的指纹按天汇总（平均耗时、执行次数、平均扫描行数）
+- 与 slow_query_baseline 中保存的指数加权均值/方差（EWMA）比较，
+  超过基线倍数且偏离足够多个标准差时记入 slow_query_regression
+- 比较后把新的天数据合并进基线，已合并过的天不会重复计入；当天尚未结束，留到之后的入库再处理
+- 基线同时保存合并最近一天之前的均值/方差（prev_ 列），最近一天再次入库（分多次入库的日志）时
+  先回退到之前的状态，再按合并后的整天汇总重新比较
+开销只与本批新数据有关，不回扫历史明细；只依赖标准库，解析器和接口共用
+"""
+import math
+from datetime import date
+
+# 检测的指标: 名称 -> slow_query_baseline 中的列前缀
+KINDS = {
+    'latency': 'latency',
+    'frequency': 'frequency',
+    'rows_examined': 'rows',
+}
+
+DEFAULT_SETTINGS = {
+    'alpha': 0.3,          # EWMA平滑系数，越大越偏向最近的天
+    'ratio': 3.0,          # 观测值超过基线的倍数
+    'zscore': 3.0,         # 观测值偏离基线的标准差个数
+    'min_history': 3,      # 基线至少包含的天数，之前只学习不报警
+    'min_executions': 5,   # 当天执行次数少于此值时不检测耗时和扫描行数
+}
+
+BASELINE_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS slow_query_baseline (
+        checksum VARCHAR(32) NOT NULL PRIMARY KEY,
+        buckets INT NOT NULL DEFAULT 0,
+        last_bucket DATE NOT NULL,
+        latency_mean DOUBLE NOT NULL DEFAULT 0,
+        latency_var DOUBLE NOT NULL DEFAULT 0,
+        frequency_mean DOUBLE NOT NULL DEFAULT 0,
+        frequency_var DOUBLE NOT NULL DEFAULT 0,
+        rows_mean DOUBLE NOT NULL DEFAULT 0,
+        rows_var DOUBLE NOT NULL DEFAULT 0,
+        prev_latency_mean DOUBLE NULL,
+        prev_latency_var DOUBLE NULL,
+        prev_frequency_mean DOUBLE NULL,
+        prev_frequency_var DOUBLE NULL,
+        prev_rows_mean DOUBLE NULL,
+        prev_rows_var DOUBLE NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+"""
+
+# 合并最近一天之前的基线状态，为NULL（新增这些列之前的基线）时最近一天不重新比较
+PREVIOUS_COLUMNS = [f'prev_{prefix}_{stat}' for prefix in KINDS.values() for stat in ('mean', 'var')]
+
+REGRESSION_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS slow_query_regression (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        checksum VARCHAR(32) NOT NULL,
+        bucket_date DATE NOT NULL,
+        kind VARCHAR(32) NOT NULL,
+        baseline_value DOUBLE NOT NULL,
+        observed_value DOUBLE NOT NULL,
+        ratio DOUBLE NOT NULL,
+        zscore DOUBLE NOT NULL,
+        executions INT NOT NULL,
+        detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uk_checksum_bucket_kind (checksum, bucket_date, kind),
+        INDEX idx_bucket_date (bucket_date)
+    )
+"""
+
+def _observations(bucket):
+    executions = bucket['executions']
+    return {
+        'latency': bucket['query_time'] / executions,
+        'frequency': float(executions),
+        'rows_examined': bucket['rows_examined'] / executions,
+    }
+
+def _new_baseline(day):
+    baseline = {'buckets': 0, 'last_bucket': day}
+    for prefix in KINDS.values():
+        baseline[f'{prefix}_mean'] = 0.0
+        baseline[f'{prefix}_var'] = 0.0
+    return baseline
+
+def _rewind(baseline):
+    """回退到合并最近一天之前的状态"""
+    baseline['buckets'] -= 1
+    for prefix in KINDS.values():
+        baseline[f'{prefix}_mean'] = baseline[f'prev_{prefix}_mean']
+        baseline[f'{prefix}_var'] = baseline[f'prev_{prefix}_var']
+
+def evaluate(checksum, per_day, baseline, settings, today):
+    """
+    按天顺序比较并更新单个指纹的基线，基线中最近的一天会按新的汇总重新比较
+    返回 (更新后的基线, 回归列表, 重新比较的天)，没有新的天时基线为None
+    """
+    alpha = settings['alpha']
+    regressions = []
+    reevaluated = None
+    changed = False
+    for day in sorted(per_day):
+        if day >= today:
+            # 当天的数据还不完整
+            break
+        if baseline is not None and day <= baseline['last_bucket']:
+            if day < baseline['last_bucket'] or baseline.get('prev_latency_mean') is None:
+                # 更早的天已合并进基线，无法单独回退
+                continue
+            _rewind(baseline)
+            reevaluated = day
+        if baseline is None:
+            baseline = _new_baseline(day)
+        bucket = per_day[day]
+        observed = _observations(bucket)
+
+        for kind, prefix in KINDS.items():
+            value = observed[kind]
+            mean = baseline[f'{prefix}_mean']
+            var = baseline[f'{prefix}_var']
+            baseline[f'prev_{prefix}_mean'] = mean
+            baseline[f'prev_{prefix}_var'] = var
+            if baseline['buckets'] >= settings['min_history'] and mean > 0:
+                enough = kind == 'frequency' or bucket['executions'] >= settings['min_executions']
+                # 方差为0时用均值的10%作为最小波动，避免偶然的小变化被判为无穷大偏离
+                std = max(math.sqrt(var), mean * 0.1)
+                zscore = (value - mean) / std
+                if enough and value >= mean * settings['ratio'] and zscore >= settings['zscore']:
+                    regressions.append((checksum, day, kind, round(mean, 6), round(value, 6),
+                                        round(value / mean, 3), round(zscore, 3), bucket['executions']))
+            if baseline['buckets'] == 0:
+                baseline[f'{prefix}_mean'] = value
+            else:
+                diff = value - mean
+                baseline[f'{prefix}_mean'] = mean + alpha * diff
+                baseline[f'{prefix}_var'] = (1 - alpha) * (var + alpha * diff * diff)
+
+        baseline['buckets'] += 1
+        baseline['last_bucket'] = day
+        changed = True
+    return (baseline if changed else None), regressions, reevaluated
+
+def detect(cursor, buckets, settings=None, today=None, chunk_size=1000):
+    """
+    入库后的分析阶段: 读取涉及指纹的基线、检测回归、写回基线
+    buckets 为 RollupSet.daily_totals 的结果（库中合并后的按天汇总）: {checksum: {date: 汇总}}
+    cursor 为解析器的 pymysql 游标，由调用方提交事务，返回写入的回归条数
+    """
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    today = today or date.today()
+    checksums = list(buckets)
+    baseline_rows = []
+    regressions = []
+    reevaluated = []
+
+    columns = (['checksum', 'buckets', 'last_bucket'] + [f'{p}_{s}' for p in KINDS.values() for s in ('mean', 'var')]
+               + PREVIOUS_COLUMNS)
+    for offset in range(0, len(checksums), chunk_size):
+        chunk = checksums[offset:offset + chunk_size]
+        placeholders = ','.join(['%s'] * len(chunk))
+        cursor.execute(f"SELECT {', '.join(columns)} FROM slow_query_baseline WHERE checksum IN ({placeholders})", chunk)
+        existing = {row[0]: dict(zip(columns[1:], row[1:])) for row in cursor.fetchall()}
+
+        for checksum in chunk:
+            baseline, found, day = evaluate(checksum, buckets[checksum], existing.get(checksum), settings, today)
+            regressions.extend(found)
+            if day is not None:
+                reevaluated.append((checksum, day))
+            if baseline is not None:
+                baseline_rows.append(tuple([checksum] + [baseline[column] for column in columns[1:]]))
+
+    if baseline_rows:
+        updates = ', '.join(f"{column} = VALUES({column})" for column in columns[1:])
+        cursor.executemany(f"""
+            INSERT INTO slow_query_baseline ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+            ON DUPLICATE KEY UPDATE {updates}
+        """, baseline_rows)
+    # 重新比较的天以新的结果为准
+    for offset in range(0, len(reevaluated), chunk_size):
+        chunk = reevaluated[offset:offset + chunk_size]
+        cursor.execute(f"""
+            DELETE FROM slow_query_regression
+            WHERE (checksum, bucket_date) IN ({','.join(['(%s, %s)'] * len(chunk))})
+        """, [value for key in chunk for value in key])
+    if regressions:
+        cursor.executemany("""
+            INSERT IGNORE INTO slow_query_regression
+            (checksum, bucket_date, kind, baseline_value, observed_value, ratio, zscore, executions)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, regressions)
+    return len(regressions)
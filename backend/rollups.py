@@ -0,0 +1,440 @@
+"""
+按 (SQL指纹, 天) 的流式汇总
+- 执行次数、首次/最后执行时间，以及耗时、锁等待、返回行数、扫描行数的 总和/最小/最大/方差（Welford 算法，数值稳定）
+- 耗时的分位数摘要（对数分桶，相对误差1%，可合并），接口据此给出任意时间范围的耗时分布直方图
+- Percona/MariaDB 扩展字段（slow_log_header.EXTRA_FIELDS）的总和，布尔字段为出现次数，如磁盘临时表、全表扫描次数
+解析时内存只与 指纹数 × 天数 有关，与日志条目数无关；入库时与已有的汇总行在内存中合并后写回 slow_query_rollup
+只依赖标准库，解析器和接口共用
+
+没有执行键的明细（引入汇总之前或由旧版解析脚本入库）按明细逐条计入汇总，计入后写入标记键，不会重复计入；
+解析器入库前、旧版解析脚本入库后、init_tables.py 会自动执行，也可以手动执行（backend目录下）:
+    python rollups.py
+"""
+import json
+import math
+import sys
+from datetime import timedelta
+
+from regression_detector import PREVIOUS_COLUMNS
+from slow_log_header import EXTRA_FIELDS, EXTRA_NAMES
+
+METRICS = ('query_time', 'lock_time', 'rows_sent', 'rows_examined')
+
+ROLLUP_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS slow_query_rollup (
+        checksum VARCHAR(32) NOT NULL,
+        bucket_date DATE NOT NULL,
+        executions BIGINT NOT NULL,
+        first_seen DATETIME NOT NULL,
+        last_seen DATETIME NOT NULL,
+        query_time_sum DOUBLE NOT NULL,
+        query_time_min DOUBLE NOT NULL,
+        query_time_max DOUBLE NOT NULL,
+        query_time_m2 DOUBLE NOT NULL,
+        lock_time_sum DOUBLE NOT NULL,
+        lock_time_min DOUBLE NOT NULL,
+        lock_time_max DOUBLE NOT NULL,
+        lock_time_m2 DOUBLE NOT NULL,
+        rows_sent_sum DOUBLE NOT NULL,
+        rows_sent_min DOUBLE NOT NULL,
+        rows_sent_max DOUBLE NOT NULL,
+        rows_sent_m2 DOUBLE NOT NULL,
+        rows_examined_sum DOUBLE NOT NULL,
+        rows_examined_min DOUBLE NOT NULL,
+        rows_examined_max DOUBLE NOT NULL,
+        rows_examined_m2 DOUBLE NOT NULL,
+        rows_affected_sum BIGINT NOT NULL DEFAULT 0,
+        bytes_sent_sum BIGINT NOT NULL DEFAULT 0,
+        tmp_tables_sum BIGINT NOT NULL DEFAULT 0,
+        tmp_disk_tables_sum BIGINT NOT NULL DEFAULT 0,
+        full_scan_sum BIGINT NOT NULL DEFAULT 0,
+        full_join_sum BIGINT NOT NULL DEFAULT 0,
+        filesort_sum BIGINT NOT NULL DEFAULT 0,
+        filesort_on_disk_sum BIGINT NOT NULL DEFAULT 0,
+        innodb_io_r_ops_sum BIGINT NOT NULL DEFAULT 0,
+        innodb_pages_distinct_sum BIGINT NOT NULL DEFAULT 0,
+        query_time_sketch TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (checksum, bucket_date),
+        INDEX idx_bucket_date (bucket_date)
+    )
+"""
+
+EXTRA_COLUMNS = [f'{name}_sum' for name in EXTRA_NAMES]
+
+COLUMNS = (['executions', 'first_seen', 'last_seen'] + [f'{metric}_{part}' for metric in METRICS for part in ('sum', 'min', 'max', 'm2')]
+           + EXTRA_COLUMNS + ['query_time_sketch'])
+
+# 旧明细没有线程Id等信息，无法算出真正的执行键，计入汇总后写入 id | 2^63 作为已计入的标记
+LEGACY_KEY_FLAG = 1 << 63
+
+class RunningStats:
+    """Welford 在线均值/方差，支持合并（Chan 并行算法）"""
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if not other.count:
+            return
+        if not self.count:
+            self.count, self.mean, self.m2, self.min, self.max = other.count, other.mean, other.m2, other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def total(self):
+        return self.mean * self.count
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else 0.0
+
+    @classmethod
+    def from_columns(cls, count, total, minimum, maximum, m2):
+        stats = cls()
+        if count:
+            stats.count, stats.mean, stats.m2, stats.min, stats.max = count, total / count, m2, minimum, maximum
+        return stats
+
+class QuantileSketch:
+    """
+    对数分桶的分位数摘要: 桶 i 覆盖 (gamma^(i-1), gamma^i]，估计值相对误差不超过 accuracy
+    桶数只与数值范围有关（1毫秒到1万秒约800个桶，实际通常几十个），可以直接按桶相加合并
+    """
+
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value, count=1):
+        self.count += count
+        if value <= 1e-9:
+            self.zeros += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other):
+        self.count += other.count
+        self.zeros += other.zeros
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def histogram(self, bins_per_decade=10):
+        """
+        按对数等宽区间重新分组，每个数量级 bins_per_decade 个区间，返回 [(下界, 上界, 次数)]
+        从最小到最大有执行的区间连续输出（中间没有执行的区间次数为0），不含 zeros
+        """
+        bins = {}
+        for index, count in self.buckets.items():
+            value = 2 * self.gamma ** index / (self.gamma + 1)
+            slot = math.floor(math.log10(value) * bins_per_decade)
+            bins[slot] = bins.get(slot, 0) + count
+        if not bins:
+            return []
+        return [(10 ** (slot / bins_per_decade), 10 ** ((slot + 1) / bins_per_decade), bins.get(slot, 0))
+                for slot in range(min(bins), max(bins) + 1)]
+
+    def to_json(self):
+        return json.dumps({'accuracy': self.accuracy, 'zeros': self.zeros,
+                           'buckets': {str(index): count for index, count in sorted(self.buckets.items())}},
+                          separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text) if text else {}
+        sketch = cls(data.get('accuracy', 0.01))
+        sketch.zeros = data.get('zeros', 0)
+        sketch.buckets = {int(index): count for index, count in data.get('buckets', {}).items()}
+        sketch.count = sketch.zeros + sum(sketch.buckets.values())
+        return sketch
+
+class Rollup:
+    """单个 (指纹, 天) 的汇总"""
+
+    __slots__ = ('stats', 'extra', 'sketch', 'first_seen', 'last_seen')
+
+    def __init__(self):
+        self.stats = {metric: RunningStats() for metric in METRICS}
+        self.extra = [0] * len(EXTRA_NAMES)
+        self.sketch = QuantileSketch()
+        self.first_seen = None
+        self.last_seen = None
+
+    @property
+    def executions(self):
+        return self.stats['query_time'].count
+
+    def add(self, timestamp, query_time, lock_time, rows_sent, rows_examined, extra=None):
+        """extra 为按 EXTRA_NAMES 顺序的扩展字段值，日志中没有的字段为None"""
+        if self.first_seen is None or timestamp < self.first_seen:
+            self.first_seen = timestamp
+        if self.last_seen is None or timestamp > self.last_seen:
+            self.last_seen = timestamp
+        stats = self.stats
+        stats['query_time'].add(query_time)
+        stats['lock_time'].add(lock_time or 0.0)
+        stats['rows_sent'].add(rows_sent or 0)
+        stats['rows_examined'].add(rows_examined or 0)
+        if extra:
+            for position, value in enumerate(extra):
+                if value:
+                    self.extra[position] += value
+        self.sketch.add(query_time)
+
+    def merge(self, other):
+        if other.first_seen is not None and (self.first_seen is None or other.first_seen < self.first_seen):
+            self.first_seen = other.first_seen
+        if other.last_seen is not None and (self.last_seen is None or other.last_seen > self.last_seen):
+            self.last_seen = other.last_seen
+        for metric in METRICS:
+            self.stats[metric].merge(other.stats[metric])
+        self.extra = [a + b for a, b in zip(self.extra, other.extra)]
+        self.sketch.merge(other.sketch)
+
+    def to_row(self):
+        row = [self.executions, self.first_seen, self.last_seen]
+        for metric in METRICS:
+            stats = self.stats[metric]
+            row.extend([stats.total, stats.min, stats.max, stats.m2])
+        row.extend(self.extra)
+        row.append(self.sketch.to_json())
+        return row
+
+    @classmethod
+    def from_row(cls, row):
+        """row 为按 COLUMNS 顺序的值"""
+        rollup = cls()
+        executions, rollup.first_seen, rollup.last_seen = row[:3]
+        for position, metric in enumerate(METRICS):
+            total, minimum, maximum, m2 = row[3 + position * 4:7 + position * 4]
+            rollup.stats[metric] = RunningStats.from_columns(executions, total, minimum, maximum, m2)
+        offset = 3 + len(METRICS) * 4
+        rollup.extra = [int(value or 0) for value in row[offset:offset + len(EXTRA_NAMES)]]
+        rollup.sketch = QuantileSketch.from_json(row[-1])
+        return rollup
+
+class RollupSet:
+    """解析过程中维护的全部汇总，键为 (checksum, 日期)"""
+
+    def __init__(self):
+        self.rollups = {}
+
+    def add(self, checksum, timestamp, query_time, lock_time, rows_sent, rows_examined, extra=None):
+        key = (checksum, timestamp.date())
+        rollup = self.rollups.get(key)
+        if rollup is None:
+            rollup = self.rollups[key] = Rollup()
+        rollup.add(timestamp, query_time, lock_time, rows_sent, rows_examined, extra)
+
+    def __len__(self):
+        return len(self.rollups)
+
+    def daily_totals(self, cursor, before, chunk_size=500):
+        """
+        本次涉及的 (指纹, 天) 中 before 之前各天在 slow_query_rollup 中的执行次数和总量（与之前入库的合并后），
+        供回归检测使用: {checksum: {date: {...}}}；须在 save 之后、同一事务中调用
+        """
+        keys = [key for key in self.rollups if key[1] < before]
+        totals = {}
+        for offset in range(0, len(keys), chunk_size):
+            chunk = keys[offset:offset + chunk_size]
+            cursor.execute(f"""
+                SELECT checksum, bucket_date, executions, query_time_sum, rows_examined_sum
+                FROM slow_query_rollup
+                WHERE (checksum, bucket_date) IN ({','.join(['(%s, %s)'] * len(chunk))})
+            """, [value for key in chunk for value in key])
+            for checksum, day, executions, query_time, rows_examined in cursor.fetchall():
+                totals.setdefault(checksum, {})[day] = {
+                    'executions': executions,
+                    'query_time': query_time,
+                    'rows_examined': rows_examined,
+                }
+        return totals
+
+    def save(self, cursor, chunk_size=500):
+        """
+        与数据库中已有的同键汇总合并后写回（加锁读取，并发入库不会丢失计数）
+        cursor 为解析器的 pymysql 游标，由调用方提交事务，返回写入的行数
+        """
+        keys = list(self.rollups)
+        upsert = f"""
+            INSERT INTO slow_query_rollup (checksum, bucket_date, {', '.join(COLUMNS)})
+            VALUES ({', '.join(['%s'] * (len(COLUMNS) + 2))})
+            ON DUPLICATE KEY UPDATE {', '.join(f'{column} = VALUES({column})' for column in COLUMNS)}
+        """
+        for offset in range(0, len(keys), chunk_size):
+            chunk = keys[offset:offset + chunk_size]
+            placeholders = ','.join(['(%s, %s)'] * len(chunk))
+            cursor.execute(f"""
+                SELECT checksum, bucket_date, {', '.join(COLUMNS)}
+                FROM slow_query_rollup
+                WHERE (checksum, bucket_date) IN ({placeholders})
+                FOR UPDATE
+            """, [value for key in chunk for value in key])
+            existing = {(row[0], row[1]): Rollup.from_row(row[2:]) for row in cursor.fetchall()}
+
+            rows = []
+            for key in chunk:
+                rollup = self.rollups[key]
+                previous = existing.get(key)
+                if previous is not None:
+                    previous.merge(rollup)
+                    rollup = previous
+                rows.append([key[0], key[1]] + rollup.to_row())
+            cursor.executemany(upsert, rows)
+        return len(keys)
+
+def ensure_columns(cursor):
+    """
+    已有的明细表、汇总表、基线表补上后来新增的列（执行键及唯一索引、扩展字段、基线的上一状态），
+    指纹表补上全文索引，已有的列和索引不会重复添加
+    旧明细的新列为NULL、旧汇总为0；解析器入库前和补全汇总前都会执行
+    """
+    cursor.execute("""
+        SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ('slow_query_detail', 'slow_query_rollup', 'slow_query_baseline')
+    """)
+    existing = set(cursor.fetchall())
+
+    changes = {'slow_query_detail': [], 'slow_query_rollup': [], 'slow_query_baseline': []}
+    if ('slow_query_detail', 'exec_key') not in existing:
+        changes['slow_query_detail'] += ["ADD COLUMN exec_key BIGINT UNSIGNED NULL", "ADD UNIQUE INDEX uk_exec_key (exec_key)"]
+    for name, column_type in EXTRA_FIELDS:
+        if ('slow_query_detail', name) not in existing:
+            changes['slow_query_detail'].append(f"ADD COLUMN {name} {column_type} NULL")
+        if ('slow_query_rollup', f'{name}_sum') not in existing:
+            changes['slow_query_rollup'].append(f"ADD COLUMN {name}_sum BIGINT NOT NULL DEFAULT 0")
+    # 基线表不存在时（还没做过回归检测）由建表语句创建
+    if any(table == 'slow_query_baseline' for table, _ in existing):
+        for column in PREVIOUS_COLUMNS:
+            if ('slow_query_baseline', column) not in existing:
+                changes['slow_query_baseline'].append(f"ADD COLUMN {column} DOUBLE NULL")
+
+    for table, clauses in changes.items():
+        if clauses:
+            print(f"  为 {table} 添加新列: {len(clauses)} 项变更...")
+            cursor.execute(f"ALTER TABLE {table} {', '.join(clauses)}")
+
+    # /api/queries/search 依赖的全文索引（首次添加时InnoDB会重建指纹表）
+    cursor.execute("""
+        SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'slow_query_fingerprint' AND INDEX_NAME = 'ft_normalized_sql'
+    """)
+    if not cursor.fetchone()[0]:
+        print("  为 slow_query_fingerprint 添加全文索引 ft_normalized_sql...")
+        cursor.execute("ALTER TABLE slow_query_fingerprint ADD FULLTEXT INDEX ft_normalized_sql (normalized_sql)")
+
+def has_pending_details(cursor):
+    """是否还有没计入汇总的明细（exec_key 上有索引，开销很小）"""
+    cursor.execute("SELECT 1 FROM slow_query_detail WHERE exec_key IS NULL LIMIT 1")
+    # 读完结果集，mysql.connector 的非缓冲游标之后还要复用
+    return bool(cursor.fetchall())
+
+def backfill(conn, cursor, chunk_size=1000):
+    """
+    按天把没有执行键的明细逐条并入 slow_query_rollup（与已有的汇总行合并）并写入标记键，
+    每天提交一次，中断后重新执行只处理剩余的明细，返回处理的明细条数
+    """
+    cursor.execute("SELECT DISTINCT DATE(timestamp) FROM slow_query_detail WHERE exec_key IS NULL ORDER BY 1")
+    days = [row[0] for row in cursor.fetchall()]
+    total = 0
+    for day in days:
+        cursor.execute(f"""
+            SELECT id, checksum, timestamp, query_time, lock_time, rows_sent, rows_examined,
+                {', '.join(EXTRA_NAMES)}
+            FROM slow_query_detail
+            WHERE timestamp >= %s AND timestamp < %s AND exec_key IS NULL
+            FOR UPDATE
+        """, (day, day + timedelta(days=1)))
+        ids = []
+        rollups = RollupSet()
+        for row in cursor.fetchall():
+            ids.append(row[0])
+            rollups.add(*row[1:7], row[7:])
+        if not ids:
+            continue
+        rollups.save(cursor)
+        for offset in range(0, len(ids), chunk_size):
+            chunk = ids[offset:offset + chunk_size]
+            cursor.execute(f"""
+                UPDATE slow_query_detail SET exec_key = id | {LEGACY_KEY_FLAG}
+                WHERE id IN ({','.join(['%s'] * len(chunk))})
+            """, chunk)
+        conn.commit()
+        total += len(ids)
+        print(f"  {day}: {len(ids)} 条明细计入 {len(rollups)} 条汇总")
+    return total
+
+def fold_pending_details(conn, cursor):
+    """
+    旧版解析脚本（不写执行键、不维护汇总）入库提交后调用: 建汇总表、补上新增的列，
+    并把没有执行键的明细计入按天汇总，接口的列表和统计才能看到新入库的慢查询；返回计入的明细条数
+    """
+    cursor.execute(ROLLUP_TABLE_DDL)
+    ensure_columns(cursor)
+    return backfill(conn, cursor) if has_pending_details(cursor) else 0
+
+def main():
+    import pymysql
+    try:
+        from server_config import DB_CONFIG
+    except ImportError:
+        print("警告: 未找到server_config.py，请确认数据库配置")
+        sys.exit(1)
+
+    conn = pymysql.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    try:
+        total = fold_pending_details(conn, cursor)
+        print(f"已将 {total} 条明细计入按天汇总")
+    except Exception as e:
+        conn.rollback()
+        print(f"补全汇总失败: {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
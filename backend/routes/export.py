@@ -0,0 +1,226 @@
+from flask import Blueprint, request, Response, stream_with_context
+from auth import permission_required
+from utils import handle_api_error
+import csv
+import io
+import logging
+import zlib
+from datetime import datetime
+from db import get_read_db
+from config import API_CONFIG
+from serializer import dumps
+
+logger = logging.getLogger(__name__)
+
+export_bp = Blueprint('export', __name__)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+FINGERPRINT_COLUMNS = [
+    'checksum', 'normalized_sql', 'username', 'dbname', 'reviewed_status', 'comments',
+    'first_seen', 'last_seen', 'total_occurrences', 'avg_query_time', 'max_query_time',
+    'total_query_time', 'total_rows_examined', 'total_rows_sent'
+]
+
+DETAIL_COLUMNS = [
+    'id', 'checksum', 'timestamp', 'query_time', 'lock_time',
+    'rows_sent', 'rows_examined', 'username', 'dbname', 'sql_text'
+]
+
+def _get_export_options():
+    """解析导出格式和压缩参数"""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {export_format}，可选值: {', '.join(EXPORT_FORMATS)}")
+
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    return export_format, use_gzip
+
+def _stream_rows(query, params, columns, export_format):
+    """
+    使用非缓冲游标逐批读取结果并编码输出
+    连接在生成器结束（包括客户端断开）时归还连接池，内存占用与总行数无关
+    """
+    db = None
+    cursor = None
+    batch_size = API_CONFIG['EXPORT_BATCH_SIZE']
+    try:
+        db = get_read_db()
+        # 非缓冲游标：结果集留在服务端，fetchmany按需拉取
+        cursor = db.cursor(buffered=False, max_execution_time=API_CONFIG['EXPORT_QUERY_TIMEOUT'])
+        cursor.execute(query, params)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if export_format == 'csv' else None
+        if writer:
+            writer.writerow(columns)
+
+        total = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            total += len(rows)
+            if not writer:
+                yield b''.join(dumps(dict(zip(columns, row))) + b'\n' for row in rows)
+                continue
+
+            for row in rows:
+                writer.writerow([
+                    value.isoformat(sep=' ') if isinstance(value, datetime) else value
+                    for value in row
+                ])
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        if writer and total == 0:
+            yield buffer.getvalue().encode('utf-8')
+
+        logger.info(f"导出完成，共 {total} 行")
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+def _gzip_stream(chunks):
+    """流式gzip压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _export_response(query, params, columns, name):
+    """构造流式导出响应"""
+    export_format, use_gzip = _get_export_options()
+    chunks = _stream_rows(query, params, columns, export_format)
+
+    filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    headers = {'X-Accel-Buffering': 'no'}  # 禁止Nginx缓冲整个响应
+    if use_gzip:
+        chunks = _gzip_stream(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = EXPORT_FORMATS[export_format]
+    headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+@export_bp.route('/export/fingerprints')
+@permission_required('SLOW_QUERY_EXPORT')
+@handle_api_error("QUERY_ERROR")
+def export_fingerprints():
+    """导出全部SQL指纹及其统计信息"""
+    conditions = []
+    params = []
+
+    username = request.args.get('username')
+    if username:
+        conditions.append("f.username = %s")
+        params.append(username)
+
+    dbnames = request.args.get('dbnames') or request.args.get('dbname')
+    if dbnames:
+        db_list = [name.strip() for name in dbnames.split(',') if name.strip()]
+        if db_list:
+            conditions.append(f"f.dbname IN ({','.join(['%s'] * len(db_list))})")
+            params.extend(db_list)
+
+    # 时间范围作用于按天汇总，统计只包含范围内各天的执行
+    detail_condition = ""
+    detail_params = []
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    if start_time and end_time:
+        detail_condition = "WHERE bucket_date BETWEEN DATE(%s) AND DATE(%s)"
+        detail_params = [start_time, end_time]
+
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+    query = f'''
+        SELECT
+            f.checksum,
+            f.normalized_sql,
+            f.username,
+            f.dbname,
+            f.reviewed_status,
+            f.comments,
+            f.first_seen,
+            f.last_seen,
+            COALESCE(d.total_occurrences, 0) as total_occurrences,
+            d.avg_query_time,
+            d.max_query_time,
+            d.total_query_time,
+            d.total_rows_examined,
+            d.total_rows_sent
+        FROM slow_query_fingerprint f
+        LEFT JOIN (
+            SELECT
+                checksum,
+                SUM(executions) as total_occurrences,
+                SUM(query_time_sum) / SUM(executions) as avg_query_time,
+                MAX(query_time_max) as max_query_time,
+                SUM(query_time_sum) as total_query_time,
+                SUM(rows_examined_sum) as total_rows_examined,
+                SUM(rows_sent_sum) as total_rows_sent
+            FROM slow_query_rollup
+            {detail_condition}
+            GROUP BY checksum
+        ) d ON f.checksum = d.checksum
+        WHERE {where_clause}
+        ORDER BY total_occurrences DESC
+    '''
+
+    logger.info(f"开始导出SQL指纹，过滤条件: {where_clause}")
+    return _export_response(query, detail_params + params, FINGERPRINT_COLUMNS, 'fingerprints')
+
+@export_bp.route('/export/details')
+@permission_required('SLOW_QUERY_EXPORT')
+@handle_api_error("QUERY_ERROR")
+def export_details():
+    """导出指定时间范围内的全部慢查询执行明细"""
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    if not (start_time and end_time):
+        raise ValueError("导出明细必须指定 start_time 和 end_time")
+
+    conditions = ["d.timestamp BETWEEN %s AND %s"]
+    params = [start_time, end_time]
+
+    checksum = request.args.get('checksum')
+    if checksum:
+        conditions.append("d.checksum = %s")
+        params.append(checksum)
+
+    username = request.args.get('username')
+    if username:
+        conditions.append("f.username = %s")
+        params.append(username)
+
+    query = f'''
+        SELECT
+            d.id,
+            d.checksum,
+            d.timestamp,
+            d.query_time,
+            d.lock_time,
+            d.rows_sent,
+            d.rows_examined,
+            f.username,
+            f.dbname,
+            d.sql_text
+        FROM slow_query_detail d
+        INNER JOIN slow_query_fingerprint f ON f.checksum = d.checksum
+        WHERE {" AND ".join(conditions)}
+        ORDER BY d.timestamp
+    '''
+
+    logger.info(f"开始导出慢查询明细: {start_time} 到 {end_time}")
+    return _export_response(query, params, DETAIL_COLUMNS, 'details')
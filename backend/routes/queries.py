@@ -2,26 +2,45 @@ from flask import Blueprint, request
 from auth import permission_required
 from utils import api_response, handle_api_error
 import logging
-from db import get_db
-from cache import cached_query, clear_user_stats_cache
-from config import API_CONFIG
+import re
+from datetime import date, datetime, timedelta
+import heavy_hitters
+import regression_detector
+from rollups import QuantileSketch
+from db import get_db, get_read_db, QueryTimeoutError
+from cache import swr_cached, refresh_scheduler, query_cache
+from config import API_CONFIG, StatusCode
 
 logger = logging.getLogger(__name__)
 
 queries_bp = Blueprint('queries', __name__)
 
+# /api/queries?sort= 可选的排序字段
+LIST_SORT_COLUMNS = {
+    'occurrences': 'total_occurrences',
+    'avg_query_time': 'avg_query_time',
+    'rows_examined': 'total_rows_examined',
+    'tmp_disk_tables': 'total_tmp_disk_tables',
+    'full_scans': 'total_full_scans',
+    'filesorts_on_disk': 'total_filesorts_on_disk',
+}
+
 @queries_bp.route('/queries')
 @permission_required('SLOW_QUERY_VIEW')
 @handle_api_error("QUERY_ERROR")
 def get_slow_queries():
     """获取慢查询列表"""
+    sort = request.args.get('sort')
+    if sort and sort not in LIST_SORT_COLUMNS:
+        raise ValueError(f"sort 可选值: {', '.join(LIST_SORT_COLUMNS)}")
+    
     db = None
     cursor = None
     count_cursor = None
     
     try:
         logger.debug("开始获取慢查询列表")
-        db = get_db()
+        db = get_read_db()
         cursor = db.cursor(dictionary=True)
         
         # 构建查询条件
@@ -57,6 +76,22 @@ def get_slow_queries():
             conditions.append("dbname = %s")
             params.append(dbname)
         
+        # 按引用的表名/语句类型过滤，走 fingerprint_tables 的索引
+        table = request.args.get('table')
+        if table:
+            table = table.strip().strip('`').split('.')[-1].strip('`').lower()
+            conditions.append("f.checksum IN (SELECT checksum FROM fingerprint_tables WHERE table_name = %s)")
+            params.append(table)
+        
+        stmt_type = request.args.get('stmt_type')
+        if stmt_type:
+            conditions.append("f.checksum IN (SELECT checksum FROM fingerprint_tables WHERE stmt_type = %s)")
+            params.append(stmt_type.strip().upper())
+        
+        # 按近似重复的簇折叠，只保留簇代表（fingerprint_clusters.py 定时计算，尚未聚类的指纹照常显示）
+        if request.args.get('collapse') == 'cluster':
+            conditions.append("(c.cluster_id IS NULL OR c.cluster_id = f.checksum)")
+        
         # 构建基础查询
         base_query = '''
             SELECT SQL_CALC_FOUND_ROWS
@@ -73,19 +108,28 @@ def get_slow_queries():
                 COALESCE(d.total_occurrences, 0) as total_occurrences,
                 d.avg_query_time,
                 d.total_rows_examined,
-                d.total_rows_sent
+                d.total_rows_sent,
+                d.total_tmp_disk_tables,
+                d.total_full_scans,
+                d.total_filesorts_on_disk,
+                COALESCE(c.cluster_id, f.checksum) as cluster_id,
+                COALESCE(c.cluster_size, 1) as cluster_size
             FROM slow_query_fingerprint f
             LEFT JOIN (
                 SELECT 
                     checksum,
-                    COUNT(*) as total_occurrences,
-                    MAX(timestamp) as last_seen,
-                    AVG(query_time) as avg_query_time,
-                    SUM(rows_examined) as total_rows_examined,
-                    SUM(rows_sent) as total_rows_sent
-                FROM slow_query_detail
+                    SUM(executions) as total_occurrences,
+                    MAX(last_seen) as last_seen,
+                    SUM(query_time_sum) / SUM(executions) as avg_query_time,
+                    SUM(rows_examined_sum) as total_rows_examined,
+                    SUM(rows_sent_sum) as total_rows_sent,
+                    SUM(tmp_disk_tables_sum) as total_tmp_disk_tables,
+                    SUM(full_scan_sum) as total_full_scans,
+                    SUM(filesort_on_disk_sum) as total_filesorts_on_disk
+                FROM slow_query_rollup
                 GROUP BY checksum
             ) d ON f.checksum = d.checksum
+            LEFT JOIN fingerprint_cluster c ON c.checksum = f.checksum
             WHERE 1=1
         '''
         
@@ -99,8 +143,11 @@ def get_slow_queries():
         page = int(request.args.get('page', 1))
         offset = (page - 1) * per_page
         
-        # 按执行次数倒序排序，如果有过滤条件则优先按执行次数排序
-        if username or dbname or dbnames:
+        # 指定 sort 时按对应总量倒序（如磁盘临时表数、全表扫描次数，来自Percona/MariaDB扩展字段的按天汇总）；
+        # 否则按执行次数倒序排序，如果有过滤条件则优先按执行次数排序
+        if sort:
+            base_query += f" ORDER BY {LIST_SORT_COLUMNS[sort]} DESC, last_occurrence DESC LIMIT %s OFFSET %s"
+        elif username or dbname or dbnames or table or stmt_type:
             base_query += " ORDER BY total_occurrences DESC, last_occurrence DESC LIMIT %s OFFSET %s"
         else:
             base_query += " ORDER BY last_occurrence DESC LIMIT %s OFFSET %s"
@@ -122,6 +169,9 @@ def get_slow_queries():
             data={'data': data, 'total': total}
         )
         
+    except QueryTimeoutError:
+        # 由应用级错误处理返回结构化的"查询过于昂贵"响应
+        raise
     except Exception as e:
         logger.error(f"获取慢查询列表失败: {str(e)}", exc_info=True)
         return api_response(
@@ -145,7 +195,7 @@ def get_query_details(checksum):
     db = None
     cursor = None
     try:
-        db = get_db()
+        db = get_read_db()
         cursor = db.cursor(dictionary=True)
         
         # 获取基本信息和最新的优化建议
@@ -160,6 +210,16 @@ def get_query_details(checksum):
                 d.query_time,
                 d.rows_examined,
                 d.rows_sent,
+                d.rows_affected,
+                d.bytes_sent,
+                d.tmp_tables,
+                d.tmp_disk_tables,
+                d.full_scan,
+                d.full_join,
+                d.filesort,
+                d.filesort_on_disk,
+                d.innodb_io_r_ops,
+                d.innodb_pages_distinct,
                 f.reviewed_status,
                 f.comments
             FROM slow_query_fingerprint f
@@ -178,18 +238,19 @@ def get_query_details(checksum):
                 status_code=404
             )
             
-        # 获取趋势数据（最近30天）
+        # 获取趋势数据（最近30天），来自按天汇总，不受明细裁剪影响
         trend_query = """
             SELECT 
-                DATE(timestamp) as date,
-                AVG(query_time) as query_time,
-                COUNT(*) as occurrences,
-                AVG(rows_examined) as rows_examined,
-                AVG(rows_sent) as rows_sent
-            FROM slow_query_detail
+                bucket_date as date,
+                query_time_sum / executions as query_time,
+                executions as occurrences,
+                rows_examined_sum / executions as rows_examined,
+                rows_sent_sum / executions as rows_sent,
+                tmp_disk_tables_sum as tmp_disk_tables,
+                full_scan_sum as full_scans
+            FROM slow_query_rollup
             WHERE checksum = %s
-                AND timestamp >= DATE_SUB(CURRENT_DATE, INTERVAL 30 DAY)
-            GROUP BY DATE(timestamp)
+                AND bucket_date >= DATE_SUB(CURRENT_DATE, INTERVAL 30 DAY)
             ORDER BY date ASC
         """
         cursor.execute(trend_query, (checksum,))
@@ -210,6 +271,120 @@ def get_query_details(checksum):
         if db:
             db.close()
 
+@queries_bp.route('/queries/<checksum>/cluster')
+@permission_required('SLOW_QUERY_VIEW')
+@handle_api_error("QUERY_DETAIL_ERROR")
+def get_query_cluster(checksum):
+    """与该指纹属于同一个近似重复簇的全部指纹"""
+    limit = min(request.args.get('limit', API_CONFIG['DEFAULT_PAGE_SIZE'], type=int), API_CONFIG['MAX_PAGE_SIZE'])
+    db = None
+    cursor = None
+    try:
+        db = get_read_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("SELECT cluster_id, cluster_size FROM fingerprint_cluster WHERE checksum = %s", (checksum,))
+        row = cursor.fetchone()
+        cluster_id = row['cluster_id'] if row else checksum
+        
+        cursor.execute("""
+            SELECT 
+                f.checksum,
+                f.normalized_sql,
+                f.username,
+                f.dbname,
+                f.reviewed_status,
+                f.first_seen,
+                f.last_seen
+            FROM fingerprint_cluster c
+            JOIN slow_query_fingerprint f ON f.checksum = c.checksum
+            WHERE c.cluster_id = %s
+            ORDER BY f.id
+            LIMIT %s
+        """, (cluster_id, limit))
+        members = cursor.fetchall()
+        
+        return api_response(
+            success=True,
+            message="查询成功",
+            data={
+                'cluster_id': cluster_id,
+                'cluster_size': row['cluster_size'] if row else 1,
+                'members': members
+            }
+        )
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+HISTOGRAM_PERCENTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+
+@swr_cached(timeout=API_CONFIG['CACHE_TIMEOUT'], stale_after=API_CONFIG['CACHE_STALE_AFTER'])
+def load_query_histogram(checksum, start_date, end_date, bins_per_decade):
+    """合并时间范围内各天的耗时分桶（只读取按天汇总，与执行次数无关，不扫描明细）"""
+    db = None
+    cursor = None
+    
+    try:
+        db = get_read_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT bucket_date, executions, query_time_min, query_time_max, query_time_sketch
+            FROM slow_query_rollup
+            WHERE checksum = %s AND bucket_date BETWEEN %s AND %s
+        """, (checksum, start_date, end_date))
+        rows = cursor.fetchall()
+        
+        sketch = QuantileSketch()
+        for row in rows:
+            sketch.merge(QuantileSketch.from_json(row['query_time_sketch']))
+        
+        return {
+            'checksum': checksum,
+            'start_date': start_date,
+            'end_date': end_date,
+            'days': len(rows),
+            'executions': sum(row['executions'] for row in rows),
+            'min': min((row['query_time_min'] for row in rows), default=None),
+            'max': max((row['query_time_max'] for row in rows), default=None),
+            'percentiles': {
+                f'p{q * 100:g}': round(sketch.quantile(q), 6) if sketch.count else None
+                for q in HISTOGRAM_PERCENTILES
+            },
+            'bins_per_decade': bins_per_decade,
+            'zeros': sketch.zeros,
+            'bins': [
+                {'lower': round(lower, 6), 'upper': round(upper, 6), 'count': count}
+                for lower, upper, count in sketch.histogram(bins_per_decade)
+            ]
+        }
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+@queries_bp.route('/queries/<checksum>/histogram')
+@permission_required('SLOW_QUERY_VIEW')
+@handle_api_error("QUERY_DETAIL_ERROR")
+def get_query_histogram(checksum):
+    """
+    耗时分布直方图: 合并时间范围内各天的对数分桶（相对误差1%），按每个数量级 bins_per_decade 个区间输出，
+    同时给出分位数；区间边界附近的少量执行可能落入相邻区间
+    """
+    start_date, end_date = _date_range_args(default_days=30)
+    bins_per_decade = request.args.get('bins_per_decade', 10, type=int)
+    if not 1 <= bins_per_decade <= 50:
+        raise ValueError("bins_per_decade 取值范围为 1-50")
+    
+    data = load_query_histogram(checksum, start_date, end_date, bins_per_decade)
+    return api_response(
+        success=True,
+        message="查询成功",
+        data=data
+    )
+
 @queries_bp.route('/queries/<checksum>/review', methods=['POST'])
 @permission_required('OPTIMIZATION_EDIT')
 @handle_api_error("UPDATE_REVIEW_ERROR")
@@ -236,6 +411,9 @@ def update_query_review(checksum):
         cursor.execute(update_query, (comments, reviewed_status, checksum))
         db.commit()
         
+        # 审核状态影响用户统计，删除缓存使下次访问重新计算
+        query_cache.invalidate('load_user_query_stats')
+        
         return api_response(
             success=True,
             message="更新成功"
@@ -247,34 +425,21 @@ def update_query_review(checksum):
         if db:
             db.close()
 
-@queries_bp.route('/queries/stats/by-user')
-@permission_required('SLOW_QUERY_VIEW')
-@handle_api_error("STATS_ERROR")
-@cached_query(timeout=300)  # 缓存5分钟
-def get_user_query_stats():
-    """获取按用户统计的慢查询次数 - 性能优化版本"""
+@swr_cached(timeout=API_CONFIG['CACHE_TIMEOUT'], stale_after=API_CONFIG['CACHE_STALE_AFTER'])
+def load_user_query_stats(start_time=None, end_time=None):
+    """查询按用户统计的慢查询次数（结果缓存，陈旧时后台刷新）"""
     db = None
     cursor = None
     
     try:
-        logger.debug("开始获取用户慢查询统计")
-        
-        # 清除缓存以确保获取最新数据
-        clear_user_stats_cache()
-        
-        db = get_db()
+        db = get_read_db()
         cursor = db.cursor(dictionary=True)
         
-        # 构建查询条件
-        conditions = []
         params = []
-        
-        # 处理时间过滤
-        start_time = request.args.get('start_time')
-        end_time = request.args.get('end_time')
         time_condition = ""
         if start_time and end_time:
-            time_condition = " AND d.timestamp BETWEEN %s AND %s"
+            # 统计来自按天汇总，时间范围按天生效
+            time_condition = " AND r.bucket_date BETWEEN DATE(%s) AND DATE(%s)"
             params.extend([start_time, end_time])
         
         # 构建优化的统计查询，包含所有查询（含已优化）
@@ -282,12 +447,12 @@ def get_user_query_stats():
             SELECT 
                 f.username,
                 COUNT(DISTINCT f.id) as unique_queries,
-                COUNT(d.id) as total_occurrences,
-                ROUND(AVG(d.query_time), 4) as avg_query_time,
-                MAX(d.timestamp) as last_query_time,
-                MIN(d.timestamp) as first_query_time
+                SUM(r.executions) as total_occurrences,
+                ROUND(SUM(r.query_time_sum) / SUM(r.executions), 4) as avg_query_time,
+                MAX(r.last_seen) as last_query_time,
+                MIN(r.first_seen) as first_query_time
             FROM slow_query_fingerprint f
-            INNER JOIN slow_query_detail d ON f.checksum = d.checksum
+            INNER JOIN slow_query_rollup r ON f.checksum = r.checksum
             WHERE f.username IS NOT NULL 
                 AND f.username != '' and f.reviewed_status = '待优化'
                 {time_condition}
@@ -304,10 +469,10 @@ def get_user_query_stats():
         total_query = f'''
             SELECT 
                 COUNT(DISTINCT f.id) as total_unique_queries,
-                COUNT(d.id) as total_occurrences,
+                SUM(r.executions) as total_occurrences,
                 COUNT(DISTINCT f.username) as total_users
             FROM slow_query_fingerprint f
-            INNER JOIN slow_query_detail d ON f.checksum = d.checksum
+            INNER JOIN slow_query_rollup r ON f.checksum = r.checksum
             WHERE f.username IS NOT NULL 
                 AND f.username != ''
                 {time_condition}
@@ -316,20 +481,46 @@ def get_user_query_stats():
         cursor.execute(total_query, params)
         total_stats = cursor.fetchone()
         
-        logger.info(f"成功获取用户慢查询统计，共 {len(user_stats)} 个用户")
+        return {
+            'user_stats': user_stats,
+            'total_stats': total_stats,
+            'time_range': {
+                'start_time': start_time,
+                'end_time': end_time
+            }
+        }
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+@queries_bp.route('/queries/stats/by-user')
+@permission_required('SLOW_QUERY_VIEW')
+@handle_api_error("STATS_ERROR")
+def get_user_query_stats():
+    """获取按用户统计的慢查询次数 - 性能优化版本"""
+    try:
+        logger.debug("开始获取用户慢查询统计")
+        
+        # 处理时间过滤
+        start_time = request.args.get('start_time')
+        end_time = request.args.get('end_time')
+        if not (start_time and end_time):
+            start_time = end_time = None
+        
+        data = load_user_query_stats(start_time, end_time)
+        
+        logger.info(f"成功获取用户慢查询统计，共 {len(data['user_stats'])} 个用户")
         return api_response(
             success=True,
             message="统计查询成功",
-            data={
-                'user_stats': user_stats,
-                'total_stats': total_stats,
-                'time_range': {
-                    'start_time': start_time,
-                    'end_time': end_time
-                }
-            }
+            data=data
         )
         
+    except QueryTimeoutError:
+        # 由应用级错误处理返回结构化的"查询过于昂贵"响应
+        raise
     except Exception as e:
         logger.error(f"获取用户慢查询统计失败: {str(e)}", exc_info=True)
         return api_response(
@@ -337,11 +528,6 @@ def get_user_query_stats():
             message=f"获取用户慢查询统计失败: {str(e)}",
             status_code=500
         )
-    finally:
-        if cursor:
-            cursor.close()
-        if db:
-            db.close()
 
 @queries_bp.route('/queries/stats/by-user/<username>')
 @permission_required('SLOW_QUERY_VIEW')
@@ -353,7 +539,7 @@ def get_user_detail_stats(username):
     
     try:
         logger.debug(f"开始获取用户 {username} 的详细慢查询统计")
-        db = get_db()
+        db = get_read_db()
         cursor = db.cursor(dictionary=True)
         
         # 构建查询条件
@@ -364,7 +550,8 @@ def get_user_detail_stats(username):
         start_time = request.args.get('start_time')
         end_time = request.args.get('end_time')
         if start_time and end_time:
-            conditions.append("d.timestamp BETWEEN %s AND %s")
+            # 统计来自按天汇总，时间范围按天生效
+            conditions.append("r.bucket_date BETWEEN DATE(%s) AND DATE(%s)")
             params.extend([start_time, end_time])
         
         # 包含所有查询（含已优化）
@@ -380,15 +567,15 @@ def get_user_detail_stats(username):
                 f.reviewed_status,
                 f.first_seen,
                 f.last_seen,
-                COUNT(d.id) as occurrences,
-                AVG(d.query_time) as avg_query_time,
-                MAX(d.query_time) as max_query_time,
-                MIN(d.query_time) as min_query_time,
-                MAX(d.timestamp) as last_occurrence,
-                SUM(d.rows_examined) as total_rows_examined,
-                SUM(d.rows_sent) as total_rows_sent
+                SUM(r.executions) as occurrences,
+                SUM(r.query_time_sum) / SUM(r.executions) as avg_query_time,
+                MAX(r.query_time_max) as max_query_time,
+                MIN(r.query_time_min) as min_query_time,
+                MAX(r.last_seen) as last_occurrence,
+                SUM(r.rows_examined_sum) as total_rows_examined,
+                SUM(r.rows_sent_sum) as total_rows_sent
             FROM slow_query_fingerprint f
-            INNER JOIN slow_query_detail d ON f.checksum = d.checksum
+            INNER JOIN slow_query_rollup r ON f.checksum = r.checksum
             WHERE {where_clause}
             GROUP BY f.id, f.checksum, f.normalized_sql, f.dbname, f.reviewed_status, f.first_seen, f.last_seen
             ORDER BY occurrences DESC, avg_query_time DESC
@@ -400,13 +587,13 @@ def get_user_detail_stats(username):
         # 获取时间分布统计
         time_distribution_query = f'''
             SELECT 
-                DATE(d.timestamp) as query_date,
-                COUNT(d.id) as daily_count,
-                AVG(d.query_time) as avg_daily_time
+                r.bucket_date as query_date,
+                SUM(r.executions) as daily_count,
+                SUM(r.query_time_sum) / SUM(r.executions) as avg_daily_time
             FROM slow_query_fingerprint f
-            INNER JOIN slow_query_detail d ON f.checksum = d.checksum
+            INNER JOIN slow_query_rollup r ON f.checksum = r.checksum
             WHERE {where_clause}
-            GROUP BY DATE(d.timestamp)
+            GROUP BY r.bucket_date
             ORDER BY query_date DESC
             LIMIT 30
         '''
@@ -419,10 +606,10 @@ def get_user_detail_stats(username):
             SELECT 
                 f.dbname,
                 COUNT(DISTINCT f.id) as unique_queries,
-                COUNT(d.id) as total_occurrences,
-                AVG(d.query_time) as avg_query_time
+                SUM(r.executions) as total_occurrences,
+                SUM(r.query_time_sum) / SUM(r.executions) as avg_query_time
             FROM slow_query_fingerprint f
-            INNER JOIN slow_query_detail d ON f.checksum = d.checksum
+            INNER JOIN slow_query_rollup r ON f.checksum = r.checksum
             WHERE {where_clause}
             GROUP BY f.dbname
             ORDER BY total_occurrences DESC
@@ -447,6 +634,9 @@ def get_user_detail_stats(username):
             }
         )
         
+    except QueryTimeoutError:
+        # 由应用级错误处理返回结构化的"查询过于昂贵"响应
+        raise
     except Exception as e:
         logger.error(f"获取用户 {username} 详细统计失败: {str(e)}", exc_info=True)
         return api_response(
@@ -460,17 +650,14 @@ def get_user_detail_stats(username):
         if db:
             db.close()
 
-@queries_bp.route('/queries/databases')
-@permission_required('SLOW_QUERY_VIEW')
-@handle_api_error("DATABASE_LIST_ERROR")
-def get_database_list():
-    """获取所有数据库名称列表"""
+@swr_cached(timeout=API_CONFIG['CACHE_TIMEOUT'], stale_after=API_CONFIG['CACHE_STALE_AFTER'])
+def load_database_list():
+    """查询所有数据库名称列表（结果缓存，陈旧时后台刷新）"""
     db = None
     cursor = None
     
     try:
-        logger.debug("开始获取数据库列表")
-        db = get_db()
+        db = get_read_db()
         cursor = db.cursor(dictionary=True)
         
         # 获取所有不同的数据库名称，按查询数量排序
@@ -478,10 +665,10 @@ def get_database_list():
             SELECT 
                 f.dbname,
                 COUNT(DISTINCT f.id) as query_count,
-                COUNT(d.id) as total_occurrences,
-                MAX(d.timestamp) as last_activity
+                COALESCE(SUM(r.executions), 0) as total_occurrences,
+                MAX(r.last_seen) as last_activity
             FROM slow_query_fingerprint f
-            LEFT JOIN slow_query_detail d ON f.checksum = d.checksum
+            LEFT JOIN slow_query_rollup r ON f.checksum = r.checksum
             WHERE f.dbname IS NOT NULL 
                 AND f.dbname != ''
             GROUP BY f.dbname
@@ -489,7 +676,21 @@ def get_database_list():
         '''
         
         cursor.execute(database_query)
-        databases = cursor.fetchall()
+        return cursor.fetchall()
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+@queries_bp.route('/queries/databases')
+@permission_required('SLOW_QUERY_VIEW')
+@handle_api_error("DATABASE_LIST_ERROR")
+def get_database_list():
+    """获取所有数据库名称列表"""
+    try:
+        logger.debug("开始获取数据库列表")
+        databases = load_database_list()
         
         logger.info(f"成功获取数据库列表，共 {len(databases)} 个数据库")
         return api_response(
@@ -498,6 +699,9 @@ def get_database_list():
             data=databases
         )
         
+    except QueryTimeoutError:
+        # 由应用级错误处理返回结构化的"查询过于昂贵"响应
+        raise
     except Exception as e:
         logger.error(f"获取数据库列表失败: {str(e)}", exc_info=True)
         return api_response(
@@ -505,23 +709,15 @@ def get_database_list():
             message=f"获取数据库列表失败: {str(e)}",
             status_code=500
         )
-    finally:
-        if cursor:
-            cursor.close()
-        if db:
-            db.close()
 
-@queries_bp.route('/queries/users')
-@permission_required('SLOW_QUERY_VIEW')  
-@handle_api_error("USER_LIST_ERROR")
-def get_user_list():
-    """获取所有用户名称列表"""
+@swr_cached(timeout=API_CONFIG['CACHE_TIMEOUT'], stale_after=API_CONFIG['CACHE_STALE_AFTER'])
+def load_user_list():
+    """查询所有用户名称列表（结果缓存，陈旧时后台刷新）"""
     db = None
     cursor = None
     
     try:
-        logger.debug("开始获取用户列表")
-        db = get_db()
+        db = get_read_db()
         cursor = db.cursor(dictionary=True)
         
         # 获取所有不同的用户名，按查询数量排序
@@ -529,10 +725,10 @@ def get_user_list():
             SELECT 
                 f.username,
                 COUNT(DISTINCT f.id) as query_count,
-                COUNT(d.id) as total_occurrences,
-                MAX(d.timestamp) as last_activity
+                COALESCE(SUM(r.executions), 0) as total_occurrences,
+                MAX(r.last_seen) as last_activity
             FROM slow_query_fingerprint f
-            LEFT JOIN slow_query_detail d ON f.checksum = d.checksum
+            LEFT JOIN slow_query_rollup r ON f.checksum = r.checksum
             WHERE f.username IS NOT NULL 
                 AND f.username != ''
             GROUP BY f.username
@@ -540,7 +736,21 @@ def get_user_list():
         '''
         
         cursor.execute(user_query)
-        users = cursor.fetchall()
+        return cursor.fetchall()
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+@queries_bp.route('/queries/users')
+@permission_required('SLOW_QUERY_VIEW')  
+@handle_api_error("USER_LIST_ERROR")
+def get_user_list():
+    """获取所有用户名称列表"""
+    try:
+        logger.debug("开始获取用户列表")
+        users = load_user_list()
         
         logger.info(f"成功获取用户列表，共 {len(users)} 个用户")
         return api_response(
@@ -549,6 +759,9 @@ def get_user_list():
             data=users
         )
         
+    except QueryTimeoutError:
+        # 由应用级错误处理返回结构化的"查询过于昂贵"响应
+        raise
     except Exception as e:
         logger.error(f"获取用户列表失败: {str(e)}", exc_info=True)
         return api_response(
@@ -556,8 +769,253 @@ def get_user_list():
             message=f"获取用户列表失败: {str(e)}",
             status_code=500
         )
+
+@swr_cached(timeout=API_CONFIG['CACHE_TIMEOUT'], stale_after=API_CONFIG['CACHE_STALE_AFTER'])
+def load_top_queries(metric, start_date, end_date, limit):
+    """合并时间范围内各天的Top-K摘要（只读取摘要表，不扫描明细）"""
+    db = None
+    cursor = None
+    
+    try:
+        db = get_read_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT window_date, executions, total_weight, sketch
+            FROM slow_query_topk
+            WHERE metric = %s AND window_date BETWEEN %s AND %s
+        """, (metric, start_date, end_date))
+        windows = cursor.fetchall()
+        
+        items = heavy_hitters.merge([row['sketch'] for row in windows], limit)
+        total_weight = sum(row['total_weight'] for row in windows)
+        
+        # 补充指纹信息
+        if items:
+            placeholders = ','.join(['%s'] * len(items))
+            cursor.execute(f"""
+                SELECT checksum, normalized_sql, username, dbname, reviewed_status
+                FROM slow_query_fingerprint
+                WHERE checksum IN ({placeholders})
+            """, [item['checksum'] for item in items])
+            fingerprints = {row['checksum']: row for row in cursor.fetchall()}
+            for item in items:
+                item.update(fingerprints.get(item['checksum'], {}))
+                item['share'] = round(item['estimate'] / total_weight, 4) if total_weight else 0.0
+        
+        return {
+            'metric': metric,
+            'start_date': start_date,
+            'end_date': end_date,
+            'windows': len({row['window_date'] for row in windows}),
+            'executions': sum(row['executions'] for row in windows),
+            'total_weight': total_weight,
+            'items': items
+        }
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+def _date_range_args(default_days=7):
+    """按天的时间范围参数: start_date/end_date (YYYY-MM-DD)，或截至 end_date（默认今天）的最近 days 天"""
+    end_date = request.args.get('end_date') or date.today().isoformat()
+    start_date = request.args.get('start_date')
+    if not start_date:
+        days = request.args.get('days', default_days, type=int)
+        if days < 1:
+            raise ValueError("days 必须大于等于1")
+        start_date = (datetime.strptime(end_date, '%Y-%m-%d').date() - timedelta(days=days - 1)).isoformat()
+    # 格式错误或范围颠倒时抛出ValueError，返回400
+    if datetime.strptime(start_date, '%Y-%m-%d') > datetime.strptime(end_date, '%Y-%m-%d'):
+        raise ValueError("start_date 不能晚于 end_date")
+    return start_date, end_date
+
+@queries_bp.route('/queries/top')
+@permission_required('SLOW_QUERY_VIEW')
+@handle_api_error("QUERY_ERROR")
+def get_top_queries():
+    """按总耗时/总扫描行数/总锁等待排序的热点SQL"""
+    metric = request.args.get('metric', 'query_time')
+    if metric not in heavy_hitters.METRICS:
+        raise ValueError(f"metric 可选值: {', '.join(heavy_hitters.METRICS)}")
+    
+    start_date, end_date = _date_range_args()
+    limit = min(request.args.get('limit', API_CONFIG['DEFAULT_PAGE_SIZE'], type=int), API_CONFIG['MAX_PAGE_SIZE'])
+    data = load_top_queries(metric, start_date, end_date, limit)
+    
+    return api_response(
+        success=True,
+        message="查询成功",
+        data=data
+    )
+
+@queries_bp.route('/queries/regressions')
+@permission_required('SLOW_QUERY_VIEW')
+@handle_api_error("QUERY_ERROR")
+def get_query_regressions():
+    """入库后检测到的性能回归（耗时、执行次数、扫描行数相对基线突增）"""
+    conditions = ["r.bucket_date >= %s"]
+    days = request.args.get('days', 7, type=int)
+    params = [(date.today() - timedelta(days=days)).isoformat()]
+    
+    kind = request.args.get('kind')
+    if kind:
+        if kind not in regression_detector.KINDS:
+            raise ValueError(f"kind 可选值: {', '.join(regression_detector.KINDS)}")
+        conditions.append("r.kind = %s")
+        params.append(kind)
+    
+    checksum = request.args.get('checksum')
+    if checksum:
+        conditions.append("r.checksum = %s")
+        params.append(checksum)
+    
+    limit = min(request.args.get('limit', API_CONFIG['DEFAULT_PAGE_SIZE'], type=int), API_CONFIG['MAX_PAGE_SIZE'])
+    params.append(limit)
+    
+    db = None
+    cursor = None
+    try:
+        db = get_read_db()
+        cursor = db.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT 
+                r.checksum,
+                r.bucket_date,
+                r.kind,
+                r.baseline_value,
+                r.observed_value,
+                r.ratio,
+                r.zscore,
+                r.executions,
+                r.detected_at,
+                f.normalized_sql,
+                f.username,
+                f.dbname,
+                f.reviewed_status
+            FROM slow_query_regression r
+            LEFT JOIN slow_query_fingerprint f ON f.checksum = r.checksum
+            WHERE {" AND ".join(conditions)}
+            ORDER BY r.bucket_date DESC, r.ratio DESC
+            LIMIT %s
+        """, params)
+        data = cursor.fetchall()
+        
+        return api_response(
+            success=True,
+            message="查询成功",
+            data=data
+        )
     finally:
         if cursor:
             cursor.close()
         if db:
             db.close()
+
+# InnoDB FULLTEXT 默认的最小词长（innodb_ft_min_token_size），更短的词不在索引中
+SEARCH_MIN_TOKEN = 3
+# ER_FT_MATCHING_KEY_NOT_FOUND: 已有的库还没有添加 ft_normalized_sql 索引
+FULLTEXT_INDEX_MISSING_ERRNO = 1191
+
+def _build_search_expression(q):
+    """把搜索词转换为 BOOLEAN MODE 表达式: 每个词都必须出现，最后一个词按前缀匹配（边输入边搜索）"""
+    tokens = [token for token in re.findall(r'\w+', q) if len(token) >= SEARCH_MIN_TOKEN]
+    if not tokens:
+        raise ValueError(f"搜索词至少需要包含一个长度不小于 {SEARCH_MIN_TOKEN} 的单词")
+    terms = [f'+{token}' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+@queries_bp.route('/queries/search')
+@permission_required('SLOW_QUERY_VIEW')
+@handle_api_error("QUERY_ERROR")
+def search_queries():
+    """按SQL内容全文搜索指纹（slow_query_fingerprint.normalized_sql 的 FULLTEXT 索引），按相关度排序"""
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        raise ValueError("缺少搜索词 q")
+    
+    per_page = min(request.args.get('per_page', API_CONFIG['DEFAULT_PAGE_SIZE'], type=int), API_CONFIG['MAX_PAGE_SIZE'])
+    page = max(request.args.get('page', 1, type=int), 1)
+    
+    if re.fullmatch(r'[0-9a-fA-F]{32}', q):
+        # 直接输入指纹校验和
+        where_clause = "f.checksum = %s"
+        params = [q.lower()]
+        score, score_params = "1", []
+    else:
+        where_clause = "MATCH(f.normalized_sql) AGAINST (%s IN BOOLEAN MODE)"
+        params = [_build_search_expression(q)]
+        score, score_params = where_clause, params
+    
+    db = None
+    cursor = None
+    try:
+        db = get_read_db()
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.execute(f"SELECT COUNT(*) AS total FROM slow_query_fingerprint f WHERE {where_clause}", params)
+        except Exception as e:
+            if getattr(e, 'errno', None) != FULLTEXT_INDEX_MISSING_ERRNO:
+                raise
+            logger.error(f"全文搜索索引不存在: {str(e)}")
+            return api_response(
+                success=False,
+                message="全文搜索索引尚未建立，请运行解析器入库、init_tables.py 或 upgrade_search_index.py 后重试",
+                status_code=StatusCode.SERVICE_UNAVAILABLE
+            )
+        total = cursor.fetchone()['total']
+        
+        data = []
+        if total:
+            cursor.execute(f"""
+                SELECT 
+                    f.id,
+                    f.checksum,
+                    f.normalized_sql,
+                    f.username,
+                    f.dbname,
+                    f.reviewed_status,
+                    f.first_seen,
+                    f.last_seen,
+                    {score} AS score
+                FROM slow_query_fingerprint f
+                WHERE {where_clause}
+                ORDER BY score DESC, f.last_seen DESC
+                LIMIT %s OFFSET %s
+            """, score_params + params + [per_page, (page - 1) * per_page])
+            data = cursor.fetchall()
+        
+        return api_response(
+            success=True,
+            message="查询成功",
+            data={'data': data, 'total': total, 'page': page, 'per_page': per_page}
+        )
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+def get_data_version():
+    """获取慢查询数据版本（明细表和Top-K摘要表的最大ID），入库后该值变化"""
+    db = None
+    cursor = None
+    try:
+        db = get_read_db()
+        cursor = db.cursor()
+        # 每次入库都会写入Top-K摘要，仅汇总模式不写明细时版本也会变化
+        cursor.execute("SELECT (SELECT MAX(id) FROM slow_query_detail), (SELECT MAX(id) FROM slow_query_topk)")
+        return tuple(cursor.fetchone())
+    finally:
+        if cursor:
+            cursor.close()
+        if db:
+            db.close()
+
+# 注册缓存预热：启动时及每次入库后刷新仪表盘查询
+refresh_scheduler.register(load_user_query_stats)
+refresh_scheduler.register(load_database_list)
+refresh_scheduler.register(load_user_list)
+refresh_scheduler.set_version_source(get_data_version)
@@ -0,0 +1,82 @@
+"""
+JSON序列化模块
+优先使用orjson（C实现），未安装时回退到标准库json
+两种实现输出一致：datetime/date与Flask jsonify相同，为HTTP日期格式（"Wed, 21 Oct 2015 07:28:00 GMT"，无时区的按UTC），
+Decimal转为数字，非字符串的字典键（如DATE分组结果）转为字符串
+"""
+import json
+import logging
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from werkzeug.http import http_date
+from config import API_CONFIG
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+def _default(obj):
+    """处理JSON原生不支持的类型（MySQL返回的Decimal、TIME等）"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        # 与 jsonify 一致，前端 new Date(...) 按UTC解析
+        return http_date(obj)
+    if isinstance(obj, time):
+        return obj.isoformat()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode('utf-8', errors='replace')
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _dumps_orjson(obj) -> bytes:
+    # datetime交给_default按HTTP日期格式输出；非字符串键（如DATE分组结果）也允许序列化
+    return orjson.dumps(obj, default=_default,
+                        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+def _key(key):
+    """与orjson的 OPT_NON_STR_KEYS 一致: 日期时间键为ISO格式，其他类型转为字符串"""
+    if isinstance(key, (str, int, float, bool)) or key is None:
+        return key
+    if isinstance(key, (datetime, date, time)):
+        return key.isoformat()
+    return str(key)
+
+def _coerce_keys(obj):
+    if isinstance(obj, dict):
+        return {_key(key): _coerce_keys(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_coerce_keys(item) for item in obj]
+    return obj
+
+def _dumps_json(obj) -> bytes:
+    try:
+        text = json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':'))
+    except TypeError:
+        # 标准库不支持日期等类型的字典键，转换后重试（只在出现这类键时才遍历）
+        text = json.dumps(_coerce_keys(obj), default=_default, ensure_ascii=False, separators=(',', ':'))
+    return text.encode('utf-8')
+
+SERIALIZERS = {
+    'json': _dumps_json,
+}
+if orjson is not None:
+    SERIALIZERS['orjson'] = _dumps_orjson
+
+def get_serializer(name: str = 'auto'):
+    """按名称获取序列化函数，auto表示优先使用最快的可用实现"""
+    if name == 'auto':
+        return SERIALIZERS.get('orjson', _dumps_json)
+    if name not in SERIALIZERS:
+        logger.warning(f"JSON序列化器 {name} 不可用，回退到标准库json")
+        return _dumps_json
+    return SERIALIZERS[name]
+
+# 当前使用的序列化函数
+dumps = get_serializer(API_CONFIG.get('JSON_SERIALIZER', 'auto'))
@@ -23,4 +23,10 @@ PARSE_CONFIG = {
     'days_back': 7,          # 解析最近几天的日志
     'max_sql_length': 5000,  # SQL语句最大长度
     'batch_size': 1000,      # 批量插入大小
+    'topk_capacity': 1000,   # 每天每个指标的Top-K摘要保留的SQL指纹数
+    'regression_ratio': 3.0, # 某天的平均耗时/执行次数/扫描行数超过基线此倍数时记为性能回归
+    # 明细保留策略（默认关闭，保存全部明细）: 设置K后每个指纹每天只保存最慢的K次执行和N次均匀抽样，
+    # 入库时会删除库中同一指纹、同一天超出部分的旧明细，且无法恢复
+    'detail_top_k': None,       # 如 10
+    'detail_sample_size': None, # 如 20
 }
@@ -904,6 +904,9 @@ class SlowLogParser:
             conn.commit()
             print("数据保存成功！")
             
+            # 本脚本不写执行键，提交后把新写入的明细计入按天汇总，接口的列表和统计才能看到
+            self._fold_rollups(conn, cursor)
+            
             # 显示保存统计
             self._show_save_statistics(cursor)
             
@@ -915,6 +918,15 @@ class SlowLogParser:
             cursor.close()
             conn.close()
     
+    def _fold_rollups(self, conn, cursor):
+        """把没有执行键的明细计入 slow_query_rollup（rollups.py 需要Python 3.6+）"""
+        try:
+            from rollups import fold_pending_details
+        except (ImportError, SyntaxError):
+            print("警告: 当前Python版本无法更新按天汇总，请在Python 3下执行 python3 rollups.py")
+            return
+        print("  计入按天汇总: {} 条明细".format(fold_pending_details(conn, cursor)))
+    
     def _show_save_statistics(self, cursor):
         """显示保存统计信息"""
         try:
@@ -7,10 +7,20 @@
 
 import re
 import hashlib
+import json
+import time
 import pymysql
 from datetime import datetime, timedelta
 import sys
 import os
+from heavy_hitters import DEFAULT_CAPACITY, TOPK_TABLE_DDL, WindowedTopK
+import regression_detector
+import table_refs
+from fingerprint_clusters import CLUSTER_TABLE_DDL
+from rollups import ROLLUP_TABLE_DDL, RollupSet, backfill, ensure_columns, has_pending_details
+from detail_retention import DetailRetention
+from slow_log_header import EXTRA_NAMES, extra_values, parse_header
+from ingest_dedup import CONFIRM_BATCH, INGESTED_TABLE_DDL, SUSPECT, IngestFilter, execution_key
 
 # 尝试导入配置文件，如果不存在则使用默认配置
 try:
@@ -46,10 +56,157 @@ except ImportError:
         # 'username': 'database_name',
     }
 
+class ParseTimer:
+    """解析各阶段的累计墙钟时间和CPU时间、吞吐量以及被丢弃条目的原因统计"""
+
+    STAGES = ['read_split', 'timestamp', 'header', 'normalize', 'checksum', 'dedup', 'format', 'db_write', 'regression']
+
+    def __init__(self):
+        self.wall = dict.fromkeys(self.STAGES, 0.0)
+        self.cpu = dict.fromkeys(self.STAGES, 0.0)
+        self.calls = dict.fromkeys(self.STAGES, 0)
+        self.rejected = {}
+        self.bytes_scanned = 0
+        self.rows_written = 0
+        self._entry_wall = 0.0
+        self._entry_cpu = 0.0
+        self.started = self.start()
+
+    @staticmethod
+    def start():
+        return time.perf_counter(), time.process_time()
+
+    def stop(self, stage, started):
+        """把从 started 到现在的耗时计入指定阶段"""
+        self.wall[stage] += time.perf_counter() - started[0]
+        self.cpu[stage] += time.process_time() - started[1]
+        self.calls[stage] += 1
+
+    def stop_entry(self, started):
+        """单个条目解析结束，用于从扫描总耗时中扣除条目解析时间"""
+        self._entry_wall += time.perf_counter() - started[0]
+        self._entry_cpu += time.process_time() - started[1]
+
+    def stop_scan(self, started):
+        """扫描循环结束：扣除条目解析时间后剩余的部分记为读取/切分耗时"""
+        self.wall['read_split'] += time.perf_counter() - started[0] - self._entry_wall
+        self.cpu['read_split'] += time.process_time() - started[1] - self._entry_cpu
+        self.calls['read_split'] += 1
+        self._entry_wall = 0.0
+        self._entry_cpu = 0.0
+
+    def reject(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def report(self, stats, details_count):
+        """生成可序列化为JSON的统计报告"""
+        elapsed = time.perf_counter() - self.started[0]
+        cpu = time.process_time() - self.started[1]
+        stage_wall = sum(self.wall.values())
+        stages = {}
+        for name in self.STAGES:
+            stages[name] = {
+                'wall_seconds': round(self.wall[name], 4),
+                'cpu_seconds': round(self.cpu[name], 4),
+                'calls': self.calls[name],
+                'wall_percent': round(self.wall[name] / stage_wall * 100, 1) if stage_wall else 0.0,
+            }
+        date_range = stats['date_range']
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'elapsed_seconds': round(elapsed, 4),
+            'cpu_seconds': round(cpu, 4),
+            'bytes_scanned': self.bytes_scanned,
+            'bytes_per_second': round(self.bytes_scanned / elapsed, 1) if elapsed else 0.0,
+            'entries': {
+                'total': stats['total_entries'],
+                'parsed': stats['parsed_entries'],
+                'rejected': sum(self.rejected.values()),
+                'per_second': round(stats['total_entries'] / elapsed, 1) if elapsed else 0.0,
+            },
+            'rejected_by_reason': dict(sorted(self.rejected.items(), key=lambda item: -item[1])),
+            'unique_fingerprints': stats['unique_fingerprints'],
+            'details': details_count,
+            'rows_written': self.rows_written,
+            'date_range': {
+                'start': date_range['start'].isoformat() if date_range['start'] else None,
+                'end': date_range['end'].isoformat() if date_range['end'] else None,
+            },
+            'stages': stages,
+            'hot_stage': max(self.STAGES, key=lambda name: self.wall[name]) if stage_wall else None,
+        }
+
+    def print_summary(self):
+        """打印各阶段耗时"""
+        stage_wall = sum(self.wall.values())
+        print("\n阶段耗时:")
+        for name in self.STAGES:
+            if self.calls[name]:
+                percent = self.wall[name] / stage_wall * 100 if stage_wall else 0.0
+                print(f"  {name:<12} 墙钟 {self.wall[name]:8.3f}s  CPU {self.cpu[name]:8.3f}s  {percent:5.1f}%")
+        if self.rejected:
+            print("丢弃条目原因:")
+            for reason, count in sorted(self.rejected.items(), key=lambda item: -item[1]):
+                print(f"  {reason}: {count}")
+
+class MemoryTracer:
+    """在各阶段结束时记录 tracemalloc 快照，输出内存占用和增长最多的代码位置"""
+
+    def __init__(self, top=10, frames=10):
+        import tracemalloc
+        self.tracemalloc = tracemalloc
+        self.top = top
+        self.marks = []
+        self._previous = None
+        tracemalloc.start(frames)
+
+    def mark(self, label):
+        """记录一个阶段边界"""
+        snapshot = self.tracemalloc.take_snapshot().filter_traces([
+            self.tracemalloc.Filter(False, self.tracemalloc.__file__),
+            self.tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        current, peak = self.tracemalloc.get_traced_memory()
+        if self._previous is not None:
+            stats = snapshot.compare_to(self._previous, 'lineno')
+        else:
+            stats = snapshot.statistics('lineno')
+        growth = []
+        for stat in stats[:self.top]:
+            frame = stat.traceback[0]
+            growth.append({
+                'location': f"{frame.filename}:{frame.lineno}",
+                'size': stat.size,
+                'size_diff': getattr(stat, 'size_diff', stat.size),
+                'count': stat.count,
+            })
+        self._previous = snapshot
+        self.marks.append({'stage': label, 'current': current, 'peak': peak, 'top': growth})
+
+        print(f"内存[{label}]: 当前 {current / (1024*1024):.1f} MB，峰值 {peak / (1024*1024):.1f} MB")
+        for item in growth[:3]:
+            print(f"  {item['location']}: {item['size_diff'] / 1024:+.1f} KB")
+
+    def stop(self):
+        self.tracemalloc.stop()
+
 class SlowLogParser:
     def __init__(self, min_query_time=5.0):
         self.fingerprints = {}
         self.details = []
+        self.kept_entries = 0  # 有效条目数，仅汇总模式下不保留明细
+        self.aggregate_only = False  # 仅汇总模式: 只写指纹和汇总，不保留每次执行的明细
+        self.rollups = RollupSet()  # 按 (指纹, 天) 的流式汇总，入库时写入 slow_query_rollup
+        # 明细保留策略: 每个 (指纹, 天) 只保存最慢的K条和N条抽样，为None时保留全部明细
+        self.retention = None
+        if PARSE_CONFIG.get('detail_top_k') is not None:
+            self.retention = DetailRetention(PARSE_CONFIG['detail_top_k'], PARSE_CONFIG.get('detail_sample_size') or 0)
+        # 幂等入库: 按执行键去重，dedup_warmup 为True时解析前从数据库加载时间窗口内已入库的执行，
+        # 为False时只去除本次日志内的重复条目
+        self.dedup = IngestFilter()
+        self.dedup_warmup = True
+        self._pending = []  # 布隆过滤器命中、等待确认的条目
+        self._pending_dropped = 0
         self.debug_mode = False  # 添加调试模式标志
         self.min_query_time = min_query_time  # 最小查询时间阈值
         self.stats = {
@@ -58,6 +215,15 @@ class SlowLogParser:
             'unique_fingerprints': 0,
             'date_range': {'start': None, 'end': None}
         }
+        self.timer = ParseTimer()
+        self.memory_tracer = None  # 启用 --trace-memory 时为 MemoryTracer
+        # 按天维护的Top-K摘要，入库时写入 slow_query_topk
+        self.topk = WindowedTopK(PARSE_CONFIG.get('topk_capacity', DEFAULT_CAPACITY))
+    
+    def _mark_memory(self, label):
+        """阶段边界的内存快照，未启用时不做任何事"""
+        if self.memory_tracer is not None:
+            self.memory_tracer.mark(label)
     
     def normalize_sql(self, sql):
         """规范化SQL语句，生成指纹"""
@@ -262,14 +428,21 @@ class SlowLogParser:
         
         # 显示文件样本
         self._show_log_sample(log_file_path)
+        self._start_dedup(start_time, datetime.now())
         
-        if file_size > 500 * 1024 * 1024:  # 超过500MB的大文件
-            print("检测到大文件，使用流式读取模式...")
-            self._parse_large_file(log_file_path, start_time)
-        else:
-            print("使用标准读取模式...")
-            self._parse_small_file(log_file_path, start_time)
+        try:
+            if file_size > 500 * 1024 * 1024:  # 超过500MB的大文件
+                print("检测到大文件，使用流式读取模式...")
+                self._parse_large_file(log_file_path, start_time)
+            else:
+                print("使用标准读取模式...")
+                self._parse_small_file(log_file_path, start_time)
+            self._finish_dedup()
+        except Exception:
+            self.dedup.close()
+            raise
         
+        self._finalize_details()
         self.stats['unique_fingerprints'] = len(self.fingerprints)
         
         print(f"\n解析完成统计:")
@@ -283,6 +456,10 @@ class SlowLogParser:
         
         # 清空之前的解析结果
         self.details = []
+        self.kept_entries = 0
+        self.rollups = RollupSet()
+        if self.retention is not None:
+            self.retention = DetailRetention(self.retention.top_k, self.retention.sample_size)
         self.fingerprints = {}
         self.stats = {
             'total_entries': 0,
@@ -290,6 +467,8 @@ class SlowLogParser:
             'unique_fingerprints': 0,
             'date_range': {'start': None, 'end': None}
         }
+        self.timer = ParseTimer()
+        self.topk = WindowedTopK(self.topk.capacity)
         
         if not os.path.exists(log_file_path):
             raise FileNotFoundError(f"慢日志文件不存在: {log_file_path}")
@@ -299,34 +478,75 @@ class SlowLogParser:
         
         # 显示文件样本
         self._show_log_sample(log_file_path)
+        self._start_dedup(start_time, end_time)
         
         # 尝试使用时间范围优化
         threshold_bytes = optimization_threshold * 1024 * 1024
         should_optimize = use_optimization and file_size > threshold_bytes
         
-        if should_optimize:
-            print(f"检测到大文件（>{optimization_threshold}MB），使用时间范围优化模式...")
-            self._parse_with_time_optimization(log_file_path, start_time, end_time)
-        elif file_size > 500 * 1024 * 1024:  # 超过500MB的超大文件
-            print("检测到超大文件，使用流式读取模式...")
-            self._parse_large_file_with_range(log_file_path, start_time, end_time)
-        else:
-            print("使用标准读取模式...")
-            self._parse_small_file_with_range(log_file_path, start_time, end_time)
+        try:
+            if should_optimize:
+                print(f"检测到大文件（>{optimization_threshold}MB），使用时间范围优化模式...")
+                self._parse_with_time_optimization(log_file_path, start_time, end_time)
+            elif file_size > 500 * 1024 * 1024:  # 超过500MB的超大文件
+                print("检测到超大文件，使用流式读取模式...")
+                self._parse_large_file_with_range(log_file_path, start_time, end_time)
+            else:
+                print("使用标准读取模式...")
+                self._parse_small_file_with_range(log_file_path, start_time, end_time)
+            self._finish_dedup()
+        except Exception:
+            self.dedup.close()
+            raise
         
+        self._finalize_details()
         self.stats['unique_fingerprints'] = len(self.fingerprints)
+        self._mark_memory('parse')
         
         print(f"\n解析完成统计:")
         print(f"  总日志条目: {self.stats['total_entries']}")
         print(f"  成功解析: {self.stats['parsed_entries']}")
         print(f"  唯一SQL指纹: {self.stats['unique_fingerprints']}")
         print(f"  详细执行记录: {len(self.details)}")
+        print(f"  按天汇总记录: {len(self.rollups)}")
+        if self.dedup.duplicates:
+            print(f"  重复执行（已入库或日志内重复）: {self.dedup.duplicates}")
         if self.stats['date_range']['start'] and self.stats['date_range']['end']:
             print(f"  时间范围: {self.stats['date_range']['start']} 到 {self.stats['date_range']['end']}")
+        self.timer.print_summary()
         
         # 返回解析结果
         return self.details
 
+    def _start_dedup(self, start_time, end_time):
+        """
+        重置去重状态，用只读连接按需预热过滤器；解析期间不改动数据库，
+        本次判定为新的执行键由 save_to_database 与数据一起写入。连接失败时只去除本次日志内的重复条目
+        """
+        self.dedup.close()
+        self.dedup = IngestFilter()
+        self._pending = []
+        self._pending_dropped = 0
+        stage_start = self.timer.start()
+        try:
+            if not self.dedup.connect(pymysql.connect(**DB_CONFIG)):
+                print("去重过滤器: 还没有已入库的执行，只去除本次日志内的重复条目")
+            elif self.dedup_warmup:
+                warmed = self.dedup.warm(start_time, end_time)
+                print(f"去重过滤器: 已加载时间窗口内 {warmed} 个已入库的执行")
+        except Exception as e:
+            self.dedup.disconnect()
+            print(f"警告: 无法连接数据库（{e}），本次解析只去除日志内的重复条目，已入库的执行无法去重")
+        self.timer.stop('dedup', stage_start)
+    
+    def _finish_dedup(self):
+        """确认剩余的待定条目，并从成功解析数中扣除确认为重复的条目；之后关闭只读连接，不在等待确认时占用"""
+        self._flush_pending()
+        self.stats['parsed_entries'] -= self._pending_dropped
+        if self.dedup.conn is not None:
+            print(f"去重过滤器: 误判 {self.dedup.false_positives} 条（已到数据库确认）")
+        self.dedup.disconnect()
+    
     def _parse_with_time_optimization(self, log_file_path, start_time, end_time):
         """使用时间范围优化的解析方法"""
         import time
@@ -623,18 +843,21 @@ class SlowLogParser:
     def _parse_range_data(self, log_file_path, start_offset, end_offset, start_time, end_time):
         """解析指定范围内的数据"""
         range_size = end_offset - start_offset
+        scan = self.timer.start()
         
         with open(log_file_path, 'r', encoding='utf-8', errors='ignore') as f:
             f.seek(start_offset)
             
             # 读取指定范围的数据
             data = f.read(range_size)
+        self.timer.bytes_scanned += range_size
         
         print(f"读取范围数据: {len(data) / (1024*1024):.2f} MB")
         
         # 分割日志条目
         entries = re.split(r'# Time: ', data)
         self.stats['total_entries'] = len(entries) - 1 if len(entries) > 1 else 0
+        self._mark_memory('read_split')
         
         print(f"找到 {self.stats['total_entries']} 个日志条目，开始解析...")
         
@@ -643,14 +866,19 @@ class SlowLogParser:
             if i % 1000 == 0:
                 print(f"已处理 {i}/{self.stats['total_entries']} 个条目...")
             
+            entry_start = self.timer.start()
             try:
                 if self._parse_entry_with_range(entry, start_time, end_time):
                     processed += 1
             except Exception as e:
+                self.timer.reject('error')
                 if self.debug_mode:
                     print(f"解析第{i}个条目时出错: {e}")
                 continue
+            finally:
+                self.timer.stop_entry(entry_start)
         
+        self.timer.stop_scan(scan)
         self.stats['parsed_entries'] = processed
         print(f"范围解析完成，有效处理 {processed} 个条目")
 
@@ -668,6 +896,8 @@ class SlowLogParser:
         processed = 0
         
         print("使用标准流式解析模式...")
+        self.timer.bytes_scanned += os.path.getsize(log_file_path)
+        scan = self.timer.start()
         
         with open(log_file_path, 'r', encoding='utf-8', errors='ignore') as f:
             for line_num, line in enumerate(f, 1):
@@ -678,12 +908,16 @@ class SlowLogParser:
                 if is_new_entry:
                     # 处理前一个条目
                     if entry_buffer:
+                        entry_start = self.timer.start()
                         try:
                             if self._parse_single_entry_with_time_check(entry_buffer, start_time, end_time):
                                 processed += 1
                         except Exception as e:
+                            self.timer.reject('error')
                             if self.debug_mode:
                                 print(f"解析条目时出错: {e}")
+                        finally:
+                            self.timer.stop_entry(entry_start)
                     
                     # 开始新条目
                     entry_buffer = line
@@ -698,13 +932,18 @@ class SlowLogParser:
             
             # 处理最后一个条目
             if entry_buffer:
+                entry_start = self.timer.start()
                 try:
                     if self._parse_single_entry_with_time_check(entry_buffer, start_time, end_time):
                         processed += 1
                 except Exception as e:
+                    self.timer.reject('error')
                     if self.debug_mode:
                         print(f"解析最后条目时出错: {e}")
+                finally:
+                    self.timer.stop_entry(entry_start)
         
+        self.timer.stop_scan(scan)
         self.stats['total_entries'] = entry_count
         self.stats['parsed_entries'] = processed
         print(f"标准模式解析完成，总条目: {entry_count}，有效处理: {processed} 个")
@@ -714,12 +953,14 @@ class SlowLogParser:
         # 获取第一行来检查时间戳
         lines = entry_text.strip().split('\n')
         if not lines:
+            self.timer.reject('empty')
             return False
         
         first_line = lines[0].strip()
         timestamp = None
         
         # 尝试解析时间戳
+        ts_start = self.timer.start()
         if first_line.startswith('# Time:'):
             # 传统MySQL慢日志格式
             timestamp_match = re.search(r'^# Time: (.+)$', first_line)
@@ -733,8 +974,10 @@ class SlowLogParser:
             if self.debug_mode:
                 print(f"调试: 尝试解析ISO时间戳: '{first_line}'")
             timestamp = self._parse_iso_timestamp(first_line)
+        self.timer.stop('timestamp', ts_start)
         
         if not timestamp:
+            self.timer.reject('bad_timestamp')
             if self.debug_mode:
                 print(f"调试: 时间戳解析失败")
             return False
@@ -744,6 +987,7 @@ class SlowLogParser:
             
         # 检查时间范围
         if timestamp < start_time or timestamp > end_time:
+            self.timer.reject('out_of_range')
             if self.debug_mode:
                 print(f"调试: 时间戳 {timestamp} 不在范围内 ({start_time} - {end_time})")
             return False
@@ -759,6 +1003,7 @@ class SlowLogParser:
                 print(f"调试: _parse_entry_with_range 返回结果: {result}")
             return result
         except Exception as e:
+            self.timer.reject('error')
             if self.debug_mode:
                 print(f"条目解析失败: {e}")
         
@@ -771,6 +1016,8 @@ class SlowLogParser:
         processed = 0
         
         print("开始流式解析大文件...")
+        self.timer.bytes_scanned += os.path.getsize(log_file_path)
+        scan = self.timer.start()
         
         with open(log_file_path, 'r', encoding='utf-8', errors='ignore') as f:
             while True:
@@ -804,13 +1051,17 @@ class SlowLogParser:
                     if entry_count % 1000 == 0:
                         print(f"已处理 {entry_count} 个条目...")
                     
+                    entry_start = self.timer.start()
                     try:
                         if self._parse_entry_with_range(entry, start_time, end_time):
                             processed += 1
                     except Exception as e:
+                        self.timer.reject('error')
                         if self.debug_mode:
                             print(f"解析第{entry_count}个条目时出错: {e}")
                         continue
+                    finally:
+                        self.timer.stop_entry(entry_start)
             
             # 处理最后一个条目
             if buffer and buffer.strip():
@@ -820,14 +1071,18 @@ class SlowLogParser:
                     entry = buffer
                     
                 entry_count += 1
+                entry_start = self.timer.start()
                 try:
                     if self._parse_entry_with_range(entry, start_time, end_time):
                         processed += 1
                 except Exception as e:
+                    self.timer.reject('error')
                     if self.debug_mode:
                         print(f"解析最后一个条目时出错: {e}")
-                    pass
+                finally:
+                    self.timer.stop_entry(entry_start)
         
+        self.timer.stop_scan(scan)
         self.stats['total_entries'] = entry_count
         self.stats['parsed_entries'] = processed
         print(f"大文件解析完成，共处理 {entry_count} 个条目")
@@ -836,33 +1091,38 @@ class SlowLogParser:
         """使用时间范围解析单个日志条目"""
         lines = entry.strip().split('\n')
         if len(lines) < 3:
+            self.timer.reject('truncated')
             return False
             
         # 解析时间戳 - 第一行可能是"# Time: ..."格式或纯ISO格式
         timestamp_line = lines[0].strip()
         
         # 调试信息：显示前几个时间戳的格式
-        if (self.debug_mode or len(self.details) < 5):
+        if (self.debug_mode or self.kept_entries < 5):
             print(f"调试: 时间戳行 = '{timestamp_line}'")
         
         # 使用专门的时间戳提取函数
+        ts_start = self.timer.start()
         if timestamp_line.startswith('# Time:'):
             timestamp = self._extract_timestamp_from_line(timestamp_line)
         else:
             # 处理纯ISO时间戳格式
             timestamp = self._parse_iso_timestamp(timestamp_line)
+        self.timer.stop('timestamp', ts_start)
         
         if not timestamp:
-            if (self.debug_mode or len(self.details) < 5):
+            self.timer.reject('bad_timestamp')
+            if (self.debug_mode or self.kept_entries < 5):
                 print(f"调试: 时间戳解析失败")
             return False
         
-        if (self.debug_mode or len(self.details) < 5):
+        if (self.debug_mode or self.kept_entries < 5):
             print(f"调试: 解析成功，时间戳 = {timestamp}")
         
         # 检查时间是否在指定范围内
         if timestamp < start_time or timestamp > end_time:
-            if (self.debug_mode or len(self.details) < 5):
+            self.timer.reject('out_of_range')
+            if (self.debug_mode or self.kept_entries < 5):
                 print(f"调试: 时间戳 {timestamp} 不在范围内 ({start_time} - {end_time})，跳过")
             return False
         
@@ -987,7 +1247,7 @@ class SlowLogParser:
         timestamp_line = lines[0].strip()
         
         # 调试信息：显示前几个时间戳的格式
-        if len(self.details) < 5:
+        if self.kept_entries < 5:
             print(f"调试: 时间戳行 = '{timestamp_line}'")
         
         # 首先尝试ISO格式解析
@@ -998,16 +1258,16 @@ class SlowLogParser:
             timestamp = self._parse_traditional_timestamp(timestamp_line)
         
         if not timestamp:
-            if len(self.details) < 5:
+            if self.kept_entries < 5:
                 print(f"调试: 时间戳解析失败")
             return False
         
-        if len(self.details) < 5:
+        if self.kept_entries < 5:
             print(f"调试: 解析成功，时间戳 = {timestamp}")
         
         # 只处理最近N天的日志
         if timestamp < start_time:
-            if len(self.details) < 5:
+            if self.kept_entries < 5:
                 print(f"调试: 时间戳 {timestamp} 早于起始时间 {start_time}，跳过")
             return False
         
@@ -1019,35 +1279,31 @@ class SlowLogParser:
         
         # 解析用户和数据库信息
         user_host_line = None
-        query_time = 0
-        lock_time = 0
-        rows_sent = 0
-        rows_examined = 0
         
         sql_start_idx = -1
         for i, line in enumerate(lines[1:], 1):
             if line.startswith('# User@Host:'):
                 user_host_line = line
-                if len(self.details) < 5:
+                if self.kept_entries < 5:
                     print(f"调试: 用户主机行 = '{user_host_line}'")
             elif line.startswith('# Query_time:'):
-                # 解析性能指标
-                match = re.search(r'Query_time:\s*([\d.]+)\s*Lock_time:\s*([\d.]+)\s*Rows_sent:\s*(\d+)\s*Rows_examined:\s*(\d+)', line)
-                if match:
-                    query_time = float(match.group(1))
-                    lock_time = float(match.group(2))
-                    rows_sent = int(match.group(3))
-                    rows_examined = int(match.group(4))
-                if len(self.details) < 5:
+                if self.kept_entries < 5:
                     print(f"调试: 查询时间行 = '{line}'")
             elif not line.startswith('#') and line.strip():
                 sql_start_idx = i
-                if len(self.details) < 5:
+                if self.kept_entries < 5:
                     print(f"调试: SQL开始索引 = {sql_start_idx}, 行 = '{line[:100]}...'")
                 break
         
+        # 一次解析全部头部字段: 性能指标、线程Id、Schema 以及 Percona/MariaDB 的扩展字段
+        header = parse_header(lines[1:sql_start_idx])
+        query_time = header.get('query_time', 0)
+        lock_time = header.get('lock_time', 0)
+        rows_sent = header.get('rows_sent', 0)
+        rows_examined = header.get('rows_examined', 0)
+        
         if sql_start_idx == -1 or not user_host_line:
-            if len(self.details) < 5:
+            if self.kept_entries < 5:
                 print(f"调试: SQL开始索引({sql_start_idx}) 或用户主机行({user_host_line}) 缺失")
             return False
         
@@ -1079,11 +1335,11 @@ class SlowLogParser:
                         dbname = 'unknown'
                 elif len(user_match.groups()) >= 2:
                     dbname = user_match.group(2)
-                if len(self.details) < 5:
+                if self.kept_entries < 5:
                     print(f"调试: 匹配成功，用户={username}, 数据库={dbname}")
                 break
         else:
-            if len(self.details) < 5:
+            if self.kept_entries < 5:
                 print(f"调试: 用户主机行匹配失败: {user_host_line}")
             # 即使用户行解析失败，也不要返回False，使用默认值
             username = 'unknown'
@@ -1118,19 +1374,23 @@ class SlowLogParser:
                 # 过滤掉明显不是数据库名的内容
                 if potential_dbname and not potential_dbname.upper() in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'FROM', 'WHERE', 'SET', 'VALUES']:
                     dbname = potential_dbname
-                    if len(self.details) < 5:
+                    if self.kept_entries < 5:
                         print(f"调试: 从USE语句中提取数据库名: {dbname}")
                     break
         
+        # Percona/MariaDB 头部的 Schema 字段
+        if dbname == 'unknown' and header.get('schema'):
+            dbname = header['schema']
+        
         # 如果没有找到USE语句，尝试根据用户名推断数据库名
         if dbname == 'unknown' and username != 'unknown':
             dbname = self.infer_database_from_username(username)
-            if len(self.details) < 5:
+            if self.kept_entries < 5:
                 if dbname != 'unknown':
                     print(f"调试: 根据用户名 '{username}' 推断数据库名为 '{dbname}'")
                 else:
                     print(f"调试: 未找到USE语句且用户名 '{username}' 无匹配映射，数据库名保持为unknown")
-        elif dbname == 'unknown' and len(self.details) < 5:
+        elif dbname == 'unknown' and self.kept_entries < 5:
             print(f"调试: 未找到USE语句且用户名为unknown，数据库名保持为unknown")
         
         # 清理SQL语句：移除USE语句，因为它不是实际的查询
@@ -1141,7 +1401,7 @@ class SlowLogParser:
             cleaned_sql = raw_sql
             
         if not cleaned_sql or len(cleaned_sql) < 10:  # 忽略过短的SQL
-            if len(self.details) < 5:
+            if self.kept_entries < 5:
                 print(f"调试: SQL太短或为空: '{cleaned_sql}'")
             return False
         
@@ -1150,17 +1410,17 @@ class SlowLogParser:
         
         # 过滤掉包含 "index not used" 关键字的语句
         if re.search(r'index\s+not\s+used', raw_sql, re.IGNORECASE):
-            if len(self.details) < 5:
+            if self.kept_entries < 5:
                 print(f"调试: 跳过包含'index not used'关键字的语句")
             return False
         
         # 只记录执行时间超过阈值的慢查询
         if query_time < self.min_query_time:
-            if len(self.details) < 5:
+            if self.kept_entries < 5:
                 print(f"调试: 跳过执行时间{query_time}s小于{self.min_query_time}秒的查询")
             return False
         
-        if len(self.details) < 5:
+        if self.kept_entries < 5:
             print(f"调试: 成功解析条目，SQL长度={len(raw_sql)}，执行时间={query_time}s")
         
         # 检查SQL长度并给出警告（但不截断）
@@ -1171,31 +1431,8 @@ class SlowLogParser:
         normalized_sql = self.normalize_sql(raw_sql)
         checksum = self.generate_checksum(normalized_sql)
         
-        # 存储指纹信息
-        if checksum not in self.fingerprints:
-            self.fingerprints[checksum] = {
-                'checksum': checksum,
-                'normalized_sql': normalized_sql,
-                'raw_sql': raw_sql,  # 存储完整的原始SQL，不截断
-                'username': username,
-                'dbname': dbname,
-                'first_seen': timestamp,
-                'last_seen': timestamp,
-                'reviewed_status': '待优化',
-                'comments': None,
-                'count': 1
-            }
-        else:
-            # 更新时间范围和计数
-            fp = self.fingerprints[checksum]
-            if timestamp > fp['last_seen']:
-                fp['last_seen'] = timestamp
-            if timestamp < fp['first_seen']:
-                fp['first_seen'] = timestamp
-            fp['count'] += 1
-        
-        # 存储详细信息
-        self.details.append({
+        # 存储详细信息，重复的执行在计入指纹和汇总之前丢弃
+        detail = {
             'checksum': checksum,
             'sql_text': raw_sql,  # 存储完整的SQL文本，不截断
             'timestamp': timestamp,
@@ -1204,42 +1441,45 @@ class SlowLogParser:
             'rows_sent': rows_sent,
             'rows_examined': rows_examined,
             'username': username,
-            'dbname': dbname
-        })
+            'dbname': dbname,
+            'exec_key': execution_key(checksum, timestamp, header.get('thread_id', 0),
+                                      query_time, lock_time, rows_sent, rows_examined),
+            'extra': extra_values(header)  # 按 EXTRA_NAMES 顺序的扩展字段
+        }
+        return self._admit(detail, normalized_sql)
         
     def _parse_entry_content(self, lines, timestamp):
         """解析日志条目的内容部分（不包括时间戳解析）"""
+        header_start = self.timer.start()
         # 解析用户和数据库信息
         user_host_line = None
-        query_time = 0
-        lock_time = 0
-        rows_sent = 0
-        rows_examined = 0
         
         sql_start_idx = -1
         for i, line in enumerate(lines[1:], 1):
             if line.startswith('# User@Host:'):
                 user_host_line = line
-                if (self.debug_mode or len(self.details) < 5):
+                if (self.debug_mode or self.kept_entries < 5):
                     print(f"调试: 用户主机行 = '{user_host_line}'")
             elif line.startswith('# Query_time:'):
-                # 解析性能指标
-                match = re.search(r'Query_time:\s*([\d.]+)\s*Lock_time:\s*([\d.]+)\s*Rows_sent:\s*(\d+)\s*Rows_examined:\s*(\d+)', line)
-                if match:
-                    query_time = float(match.group(1))
-                    lock_time = float(match.group(2))
-                    rows_sent = int(match.group(3))
-                    rows_examined = int(match.group(4))
-                if (self.debug_mode or len(self.details) < 5):
+                if (self.debug_mode or self.kept_entries < 5):
                     print(f"调试: 查询时间行 = '{line}'")
             elif not line.startswith('#') and line.strip():
                 sql_start_idx = i
-                if (self.debug_mode or len(self.details) < 5):
+                if (self.debug_mode or self.kept_entries < 5):
                     print(f"调试: SQL开始索引 = {sql_start_idx}, 行 = '{line[:100]}...'")
                 break
         
+        # 一次解析全部头部字段: 性能指标、线程Id、Schema 以及 Percona/MariaDB 的扩展字段
+        header = parse_header(lines[1:sql_start_idx])
+        query_time = header.get('query_time', 0)
+        lock_time = header.get('lock_time', 0)
+        rows_sent = header.get('rows_sent', 0)
+        rows_examined = header.get('rows_examined', 0)
+        
         if sql_start_idx == -1 or not user_host_line:
-            if (self.debug_mode or len(self.details) < 5):
+            self.timer.stop('header', header_start)
+            self.timer.reject('missing_header')
+            if (self.debug_mode or self.kept_entries < 5):
                 print(f"调试: SQL开始索引({sql_start_idx}) 或用户主机行({user_host_line}) 缺失")
             return False
         
@@ -1271,11 +1511,11 @@ class SlowLogParser:
                         dbname = 'unknown'
                 elif len(user_match.groups()) >= 2:
                     dbname = user_match.group(2)
-                if (self.debug_mode or len(self.details) < 5):
+                if (self.debug_mode or self.kept_entries < 5):
                     print(f"调试: 匹配成功，用户={username}, 数据库={dbname}")
                 break
         else:
-            if (self.debug_mode or len(self.details) < 5):
+            if (self.debug_mode or self.kept_entries < 5):
                 print(f"调试: 用户主机行匹配失败: {user_host_line}")
             # 即使用户行解析失败，也不要返回False，使用默认值
             username = 'unknown'
@@ -1310,19 +1550,23 @@ class SlowLogParser:
                 # 过滤掉明显不是数据库名的内容
                 if potential_dbname and not potential_dbname.upper() in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'FROM', 'WHERE', 'SET', 'VALUES']:
                     dbname = potential_dbname
-                    if (self.debug_mode or len(self.details) < 5):
+                    if (self.debug_mode or self.kept_entries < 5):
                         print(f"调试: 从USE语句中提取数据库名: {dbname}")
                     break
         
+        # Percona/MariaDB 头部的 Schema 字段
+        if dbname == 'unknown' and header.get('schema'):
+            dbname = header['schema']
+        
         # 如果没有找到USE语句，尝试根据用户名推断数据库名
         if dbname == 'unknown' and username != 'unknown':
             dbname = self.infer_database_from_username(username)
-            if (self.debug_mode or len(self.details) < 5):
+            if (self.debug_mode or self.kept_entries < 5):
                 if dbname != 'unknown':
                     print(f"调试: 根据用户名 '{username}' 推断数据库名为 '{dbname}'")
                 else:
                     print(f"调试: 未找到USE语句且用户名 '{username}' 无匹配映射，数据库名保持为unknown")
-        elif dbname == 'unknown' and (self.debug_mode or len(self.details) < 5):
+        elif dbname == 'unknown' and (self.debug_mode or self.kept_entries < 5):
             print(f"调试: 未找到USE语句且用户名为unknown，数据库名保持为unknown")
         
         # 清理SQL语句：移除USE语句，因为它不是实际的查询
@@ -1333,7 +1577,9 @@ class SlowLogParser:
             cleaned_sql = raw_sql
             
         if not cleaned_sql or len(cleaned_sql) < 10:  # 忽略过短的SQL
-            if (self.debug_mode or len(self.details) < 5):
+            self.timer.stop('header', header_start)
+            self.timer.reject('sql_too_short')
+            if (self.debug_mode or self.kept_entries < 5):
                 print(f"调试: SQL太短或为空: '{cleaned_sql}'")
             return False
         
@@ -1342,35 +1588,95 @@ class SlowLogParser:
         
         # 过滤掉包含 "index not used" 关键字的语句
         if re.search(r'index\s+not\s+used', raw_sql, re.IGNORECASE):
-            if (self.debug_mode or len(self.details) < 5):
+            self.timer.stop('header', header_start)
+            self.timer.reject('index_not_used')
+            if (self.debug_mode or self.kept_entries < 5):
                 print(f"调试: 跳过包含'index not used'关键字的语句")
             return False
         
         # 只记录执行时间超过阈值的慢查询
         if query_time < self.min_query_time:
-            if (self.debug_mode or len(self.details) < 5):
+            self.timer.stop('header', header_start)
+            self.timer.reject('below_min_time')
+            if (self.debug_mode or self.kept_entries < 5):
                 print(f"调试: 跳过执行时间{query_time}s小于{self.min_query_time}秒的查询")
             return False
         
-        if (self.debug_mode or len(self.details) < 5):
+        if (self.debug_mode or self.kept_entries < 5):
             print(f"调试: 成功解析条目，SQL长度={len(raw_sql)}，执行时间={query_time}s")
         
         # 检查SQL长度并给出警告（但不截断）
         if len(raw_sql) > 100000:  # 100KB
             print(f"警告: 发现超长SQL语句（{len(raw_sql)}字符），可能影响性能")
         
+        self.timer.stop('header', header_start)
+        
         # 规范化SQL
+        stage_start = self.timer.start()
         normalized_sql = self.normalize_sql(raw_sql)
+        self.timer.stop('normalize', stage_start)
+        stage_start = self.timer.start()
         checksum = self.generate_checksum(normalized_sql)
+        self.timer.stop('checksum', stage_start)
+        
+        detail = {
+            'checksum': checksum,
+            'sql_text': raw_sql,  # 存储完整的原始SQL，不截断
+            'timestamp': timestamp,
+            'query_time': query_time,
+            'lock_time': lock_time,
+            'rows_sent': rows_sent,
+            'rows_examined': rows_examined,
+            'username': username,
+            'dbname': dbname,
+            'exec_key': execution_key(checksum, timestamp, header.get('thread_id', 0),
+                                      query_time, lock_time, rows_sent, rows_examined),
+            'extra': extra_values(header)  # 按 EXTRA_NAMES 顺序的扩展字段
+        }
+        return self._admit(detail, normalized_sql)
+    
+    def _admit(self, detail, normalized_sql):
+        """去重后记录条目；可能已入库的条目攒批后到数据库确认"""
+        verdict = self.dedup.check(detail['exec_key'], detail['timestamp'].date())
+        if verdict == SUSPECT:
+            self._pending.append((detail, normalized_sql))
+            if len(self._pending) >= CONFIRM_BATCH:
+                self._flush_pending()
+            return True
+        self._record_entry(detail, normalized_sql)
+        return True
+    
+    def _flush_pending(self):
+        """确认攒批的条目，返回其中已入库而被丢弃的条数"""
+        if not self._pending:
+            return 0
+        stage_start = self.timer.start()
+        verdicts = self.dedup.confirm([(detail['exec_key'], detail['timestamp'].date()) for detail, _ in self._pending])
+        self.timer.stop('dedup', stage_start)
+        dropped = 0
+        for (detail, normalized_sql), is_new in zip(self._pending, verdicts):
+            if is_new:
+                self._record_entry(detail, normalized_sql)
+            else:
+                self.timer.reject('duplicate')
+                dropped += 1
+        self._pending = []
+        self._pending_dropped += dropped
+        return dropped
+    
+    def _record_entry(self, detail, normalized_sql):
+        """把一次执行计入指纹、汇总和Top-K，并按保留策略保存明细"""
+        checksum = detail['checksum']
+        timestamp = detail['timestamp']
         
         # 存储指纹信息
         if checksum not in self.fingerprints:
             self.fingerprints[checksum] = {
                 'checksum': checksum,
                 'normalized_sql': normalized_sql,
-                'raw_sql': raw_sql,  # 存储完整的原始SQL，不截断
-                'username': username,
-                'dbname': dbname,
+                'raw_sql': detail['sql_text'],  # 存储完整的原始SQL，不截断
+                'username': detail['username'],
+                'dbname': detail['dbname'],
                 'first_seen': timestamp,
                 'last_seen': timestamp,
                 'reviewed_status': '待优化',
@@ -1386,21 +1692,33 @@ class SlowLogParser:
                 fp['first_seen'] = timestamp
             fp['count'] += 1
         
-        # 存储详细信息
-        self.details.append({
-            'checksum': checksum,
-            'sql_text': raw_sql,  # 存储完整的原始SQL，不截断
-            'formatted_sql': self.format_sql(raw_sql),  # 格式化完整的SQL
-            'timestamp': timestamp,
-            'query_time': query_time,
-            'lock_time': lock_time,
-            'rows_sent': rows_sent,
-            'rows_examined': rows_examined,
-            'username': username,
-            'dbname': dbname
-        })
+        query_time, rows_examined, lock_time = detail['query_time'], detail['rows_examined'], detail['lock_time']
+        self.kept_entries += 1
+        self.rollups.add(checksum, timestamp, query_time, lock_time, detail['rows_sent'], rows_examined, detail['extra'])
+        self.topk.add(checksum, timestamp, query_time=query_time, rows_examined=rows_examined, lock_time=lock_time)
+        if self.aggregate_only:
+            # 仅汇总模式: 不格式化SQL、不保留明细
+            return
         
-        return True
+        if self.retention is not None:
+            # 按保留策略裁剪，格式化推迟到解析结束后只对保留下来的明细进行
+            self.retention.add(detail)
+            return
+        
+        stage_start = self.timer.start()
+        detail['formatted_sql'] = self.format_sql(detail['sql_text'])  # 格式化完整的SQL
+        self.timer.stop('format', stage_start)
+        self.details.append(detail)
+    
+    def _finalize_details(self):
+        """启用保留策略时，解析结束后取出保留的明细并格式化SQL"""
+        if self.retention is None:
+            return
+        self.details = self.retention.retained()
+        stage_start = self.timer.start()
+        for detail in self.details:
+            detail['formatted_sql'] = self.format_sql(detail['sql_text'])
+        self.timer.stop('format', stage_start)
     
     def save_to_database(self):
         """保存解析结果到数据库"""
@@ -1411,6 +1729,7 @@ class SlowLogParser:
         print(f"\n开始保存数据到数据库...")
         print(f"  指纹记录: {len(self.fingerprints)}")
         print(f"  详细记录: {len(self.details)}")
+        print(f"  按天汇总记录: {len(self.rollups)}")
         
         conn = pymysql.connect(**DB_CONFIG)
         cursor = conn.cursor()
@@ -1419,6 +1738,9 @@ class SlowLogParser:
             # 检查并报告超长SQL
             self._check_sql_lengths()
             
+            # 建表、补列等只在确认保存后执行
+            self._prepare_tables(conn, cursor)
+            
             # 保存指纹信息
             fingerprint_sql = """
                 INSERT INTO slow_query_fingerprint 
@@ -1444,18 +1766,38 @@ class SlowLogParser:
                     fp['comments']
                 ))
             
+            write_start = self.timer.start()
             cursor.executemany(fingerprint_sql, fingerprint_data)
+            self.timer.stop('db_write', write_start)
+            self.timer.rows_written += len(fingerprint_data)
             print(f"  已保存 {cursor.rowcount} 条指纹记录")
             
+            # 指纹引用的表和语句类型，已有映射的指纹不会重复写入
+            table_data = []
+            for fp in self.fingerprints.values():
+                table_data.extend(table_refs.mapping_rows(fp['checksum'], fp['raw_sql']))
+            cursor.executemany("""
+                INSERT IGNORE INTO fingerprint_tables (checksum, table_name, stmt_type)
+                VALUES (%s, %s, %s)
+            """, table_data)
+            
             # 保存详细信息
-            detail_sql = """
+            detail_sql = f"""
                 INSERT IGNORE INTO slow_query_detail 
-                (checksum, sql_text, timestamp, query_time, lock_time, rows_sent, rows_examined)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                (checksum, sql_text, timestamp, query_time, lock_time, rows_sent, rows_examined, exec_key,
+                 {', '.join(EXTRA_NAMES)})
+                VALUES ({', '.join(['%s'] * (8 + len(EXTRA_NAMES)))})
             """
             
+            details = self.details
+            if self.retention is not None:
+                # 与库中同一 (指纹, 天) 已保存的明细合并裁剪，须在保存汇总之前
+                details, deleted = self.retention.apply(cursor)
+                print(f"  明细保留策略: 每个指纹每天最慢 {self.retention.top_k} 条 + 抽样 {self.retention.sample_size} 条，"
+                      f"删除 {deleted} 条不再保留的旧明细")
+            
             detail_data = []
-            for detail in self.details:
+            for detail in details:
                 detail_data.append((
                     detail['checksum'],
                     detail.get('formatted_sql', detail.get('sql_text', '')),  # 优先使用格式化SQL，回退到原始SQL
@@ -1463,15 +1805,47 @@ class SlowLogParser:
                     detail['query_time'],
                     detail['lock_time'],
                     detail['rows_sent'],
-                    detail['rows_examined']
+                    detail['rows_examined'],
+                    detail['exec_key'],
+                    *detail['extra']
                 ))
             
-            cursor.executemany(detail_sql, detail_data)
-            print(f"  已保存 {cursor.rowcount} 条详细记录")
+            write_start = self.timer.start()
+            if detail_data:
+                cursor.executemany(detail_sql, detail_data)
+                print(f"  已保存 {cursor.rowcount} 条详细记录")
+            
+            # 按天汇总与已有的汇总行合并后写回
+            saved = self.rollups.save(cursor)
+            print(f"  已保存 {saved} 条按天汇总记录")
+            
+            # 回归检测按合并后的整天汇总判断，当天还没结束不参与
+            daily_totals = self.rollups.daily_totals(cursor, datetime.now().date())
+            
+            # 本次入库的执行键与数据在同一事务中写入，重新解析重叠的时间窗口时据此去重
+            written = self.dedup.write_keys(cursor)
+            print(f"  已登记 {written} 个执行键")
+            if written < self.dedup.admitted:
+                print(f"  警告: {self.dedup.admitted - written} 个执行此前已入库（由同时运行的解析任务写入，"
+                      f"或解析时未连接数据库/未预热），这些执行的汇总会重复计数")
+            
+            # Top-K摘要与明细在同一事务中提交
+            topk_rows = list(self.topk.rows())
+            cursor.executemany("""
+                INSERT INTO slow_query_topk
+                (window_date, metric, capacity, executions, total_weight, sketch)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, topk_rows)
+            print(f"  已保存 {len(self.topk)} 天的Top-K摘要")
             
             conn.commit()
+            self.timer.stop('db_write', write_start)
+            self.timer.rows_written += len(detail_data) + len(self.rollups)
+            self._mark_memory('db_write')
             print("数据保存成功！")
             
+            self._detect_regressions(conn, cursor, daily_totals)
+            
             # 显示保存统计
             self._show_save_statistics(cursor)
             
@@ -1495,6 +1869,52 @@ class SlowLogParser:
             cursor.close()
             conn.close()
     
+    def _prepare_tables(self, conn, cursor):
+        """入库时建表、补列，并把还没计入按天汇总的明细计入汇总（DDL会隐式提交，必须在写入数据之前执行）"""
+        cursor.execute(TOPK_TABLE_DDL)
+        cursor.execute(regression_detector.BASELINE_TABLE_DDL)
+        cursor.execute(regression_detector.REGRESSION_TABLE_DDL)
+        cursor.execute(table_refs.FINGERPRINT_TABLES_DDL)
+        cursor.execute(CLUSTER_TABLE_DDL)
+        cursor.execute(ROLLUP_TABLE_DDL)
+        cursor.execute(INGESTED_TABLE_DDL)
+        ensure_columns(cursor)
+        
+        # 汇总之前入库的明细（或旧版解析脚本写入的明细）先计入按天汇总，之后的列表和统计只读汇总表
+        if has_pending_details(cursor):
+            print("  发现未计入按天汇总的明细，先补全汇总...")
+            print(f"  已将 {backfill(conn, cursor)} 条明细计入按天汇总")
+        conn.commit()
+    
+    def _detect_regressions(self, conn, cursor, daily_totals):
+        """分析阶段: 只对本批涉及的指纹按天与基线比较，失败不影响已提交的数据"""
+        settings = {key: PARSE_CONFIG[f'regression_{key}'] for key in regression_detector.DEFAULT_SETTINGS
+                    if f'regression_{key}' in PARSE_CONFIG}
+        stage_start = self.timer.start()
+        try:
+            found = regression_detector.detect(cursor, daily_totals, settings)
+            conn.commit()
+            print(f"  回归检测: 发现 {found} 项性能回归")
+        except Exception as e:
+            conn.rollback()
+            print(f"  回归检测失败（数据已保存）: {e}")
+        finally:
+            self.timer.stop('regression', stage_start)
+    
+    def write_stats_json(self, path):
+        """把解析统计写入JSON文件，path 为 '-' 时输出到标准输出"""
+        report = self.timer.report(self.stats, len(self.details))
+        if self.memory_tracer is not None:
+            report['memory'] = self.memory_tracer.marks
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if path == '-':
+            print(content)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            print(f"解析统计已保存: {path}")
+        return report
+    
     def _check_sql_lengths(self):
         """检查SQL长度统计"""
         max_raw_sql_len = 0
@@ -1574,6 +1994,8 @@ def main():
   python %(prog)s --min-time 10                      # 只记录超过10秒的慢查询
   python %(prog)s --start "2025-01-01" --end "2025-01-07"  # 指定时间范围
   python %(prog)s /path/to/slow.log --days 1 --auto-save --min-time 3  # 自动保存超过3秒的查询
+  python %(prog)s /path/to/slow.log --stats-json parse_stats.json      # 输出各阶段耗时统计
+  python %(prog)s /path/to/slow.log --profile parse.prof --trace-memory  # 性能和内存分析
         """
     )
     
@@ -1604,6 +2026,33 @@ def main():
     parser.add_argument('--optimization-threshold', type=int, default=100,
                       help='启用时间优化的文件大小阈值（MB），默认100MB以上的文件使用优化')
     
+    parser.add_argument('--stats-json', metavar='PATH',
+                      help='将各阶段耗时、吞吐量和丢弃原因统计写入JSON文件（- 表示输出到标准输出）')
+    
+    parser.add_argument('--profile', metavar='OUT.prof',
+                      help='使用cProfile分析解析和入库过程并保存结果（不包含交互等待时间）')
+    
+    parser.add_argument('--trace-memory', action='store_true',
+                      help='使用tracemalloc在各阶段结束时记录内存快照')
+    
+    parser.add_argument('--aggregate-only', action='store_true',
+                      help='仅汇总模式: 只写指纹和按天汇总（次数、总和/最值/方差、耗时分位数），不保存每次执行的明细，内存只与指纹数有关')
+    
+    parser.add_argument('--detail-top-k', type=int, default=PARSE_CONFIG.get('detail_top_k'),
+                      help='明细保留策略: 每个指纹每天保存最慢的K次执行，入库时删除库中超出部分的旧明细 (默认: 不裁剪，保存全部明细)')
+    
+    parser.add_argument('--detail-sample-size', type=int, default=PARSE_CONFIG.get('detail_sample_size') or 0,
+                      help='明细保留策略: 设置 --detail-top-k 时每个指纹每天另外保存N次执行的均匀抽样 (默认: %(default)s)')
+    
+    parser.add_argument('--keep-all-details', action='store_true',
+                      help='不裁剪明细，保存每一次执行（忽略配置中的明细保留策略）')
+    
+    parser.add_argument('--no-dedup-warmup', action='store_true',
+                      help='解析前不从数据库加载已入库的执行（时间窗口内已入库的执行很多时可加快启动），只去除本次日志内的重复条目')
+    
+    parser.add_argument('--topk-capacity', type=int, default=PARSE_CONFIG.get('topk_capacity', DEFAULT_CAPACITY),
+                      help=f'每天每个指标的Top-K摘要保留的SQL指纹数，越大越精确（默认: {DEFAULT_CAPACITY}）')
+    
     args = parser.parse_args()
     
     print("=" * 60)
@@ -1672,13 +2121,30 @@ def main():
         print(f"python {sys.argv[0]} /path/to/slow.log")
         sys.exit(1)
     
+    log_parser = None
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
     try:
         # 创建解析器
         log_parser = SlowLogParser(min_query_time=args.min_time)
         log_parser.debug_mode = args.debug
+        log_parser.topk = WindowedTopK(args.topk_capacity)
+        log_parser.aggregate_only = args.aggregate_only
+        log_parser.dedup_warmup = not args.no_dedup_warmup
+        if args.keep_all_details or args.detail_top_k is None:
+            log_parser.retention = None
+        else:
+            log_parser.retention = DetailRetention(args.detail_top_k, args.detail_sample_size)
+        if args.trace_memory:
+            log_parser.memory_tracer = MemoryTracer()
+            log_parser._mark_memory('start')
         
         # 解析慢日志
         use_optimization = not args.no_time_optimization
+        if profiler:
+            profiler.enable()
         log_parser.parse_slow_log_with_time_range(
             args.log_path, 
             start_time, 
@@ -1686,6 +2152,8 @@ def main():
             use_optimization=use_optimization,
             optimization_threshold=args.optimization_threshold
         )
+        if profiler:
+            profiler.disable()
         
         if log_parser.stats['parsed_entries'] == 0:
             print("未找到符合条件的慢查询记录")
@@ -1712,7 +2180,11 @@ def main():
                     print("请修改脚本中的DB_CONFIG配置后重新运行")
                     return
             
+            if profiler:
+                profiler.enable()
             log_parser.save_to_database()
+            if profiler:
+                profiler.disable()
         else:
             print("解析完成，未保存到数据库")
             
@@ -1722,6 +2194,21 @@ def main():
         print(f"程序执行出错: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        # 删除本地临时键库
+        if log_parser is not None:
+            log_parser.dedup.close()
+        # 中断或出错时也输出已统计的数据
+        if args.stats_json and log_parser is not None:
+            log_parser.write_stats_json(args.stats_json)
+        if log_parser is not None and log_parser.memory_tracer is not None:
+            log_parser.memory_tracer.stop()
+        if profiler:
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"\n性能分析结果已保存: {args.profile}（可用 python -m pstats 或 snakeviz 查看）")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
 
 if __name__ == '__main__':
     main()
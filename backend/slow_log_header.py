@@ -0,0 +1,110 @@
+"""
+慢日志条目头部（# 开头的行）的解析
+一次扫描取出所有 键: 值 对并按字段类型转换，字段名统一为小写:
+- MySQL: Query_time/Lock_time/Rows_sent/Rows_examined，User@Host 行的 Id；
+  开启 log_slow_extra（8.0.14+）时还有 Thread_id/Errno/Bytes_sent/Created_tmp_disk_tables/Start/End 等
+- Percona Server: Rows_affected/Bytes_sent/Tmp_tables/Tmp_disk_tables/Full_scan/Filesort/InnoDB_IO_r_ops/InnoDB_pages_distinct 等
+- MariaDB: Thread_id/Schema/QC_hit 行，以及 Rows_affected/Tmp_tables/Full_scan/Filesort 等
+未知字段按值的形式推断类型（整数/小数/Yes-No），值为空的字段（如 MariaDB 的 Schema:）跳过
+EXTRA_FIELDS 中的字段写入 slow_query_detail 的同名列，并在 slow_query_rollup 中按天求和（布尔字段为出现次数）
+只依赖标准库，解析器和接口共用
+"""
+import re
+
+# 写入明细列、参与汇总的字段及明细列类型
+EXTRA_FIELDS = [
+    ('rows_affected', 'INT'),
+    ('bytes_sent', 'BIGINT'),
+    ('tmp_tables', 'INT'),
+    ('tmp_disk_tables', 'INT'),
+    ('full_scan', 'TINYINT(1)'),
+    ('full_join', 'TINYINT(1)'),
+    ('filesort', 'TINYINT(1)'),
+    ('filesort_on_disk', 'TINYINT(1)'),
+    ('innodb_io_r_ops', 'BIGINT'),
+    ('innodb_pages_distinct', 'INT'),
+]
+EXTRA_NAMES = [name for name, _ in EXTRA_FIELDS]
+
+FIELD_TYPES = {
+    'query_time': float, 'lock_time': float, 'rows_sent': int, 'rows_examined': int,
+    'rows_affected': int, 'bytes_sent': int, 'bytes_received': int,
+    'thread_id': int, 'schema': str, 'qc_hit': bool, 'errno': int, 'killed': int,
+    'tmp_tables': int, 'tmp_disk_tables': int, 'tmp_table_sizes': int,
+    'full_scan': bool, 'full_join': bool, 'tmp_table': bool, 'tmp_table_on_disk': bool,
+    'filesort': bool, 'filesort_on_disk': bool, 'merge_passes': int, 'priority_queue': bool,
+    'innodb_trx_id': str, 'innodb_io_r_ops': int, 'innodb_io_r_bytes': int, 'innodb_io_r_wait': float,
+    'innodb_rec_lock_wait': float, 'innodb_queue_wait': float, 'innodb_pages_distinct': int,
+    'log_slow_rate_type': str, 'log_slow_rate_limit': int, 'start': str, 'end': str,
+}
+
+# MySQL log_slow_extra 与 Percona/MariaDB 含义相同的字段
+ALIASES = {
+    'id': 'thread_id',
+    'created_tmp_tables': 'tmp_tables',
+    'created_tmp_disk_tables': 'tmp_disk_tables',
+    'sort_merge_passes': 'merge_passes',
+}
+
+_THREAD_ID = re.compile(r'\bId:\s*(\d+)')
+
+# 日志中的字段名 -> (小写规范名, 类型)，首次遇到时解析
+_RESOLVED = {}
+
+def _convert(field_type, value):
+    if field_type is bool:
+        return value.lower() in ('yes', 'true', '1')
+    return field_type(value)
+
+def _infer(value):
+    if value.isdigit():
+        return int(value)
+    if value in ('Yes', 'No'):
+        return value == 'Yes'
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def _resolve(key):
+    name = key[:-1].lower()
+    name = ALIASES.get(name, name)
+    resolved = _RESOLVED[key] = (name, FIELD_TYPES.get(name))
+    return resolved
+
+def parse_header(lines):
+    """
+    解析条目的头部行（不含 # Time: 行），返回 {小写字段名: 值}
+    按空白切分，以冒号结尾的词是字段名，后面一个不以冒号结尾的词是它的值（值不含空白）
+    """
+    record = {}
+    for line in lines:
+        if line.startswith('# User@Host:'):
+            # 用户和主机由调用方解析，这里只取线程Id
+            match = _THREAD_ID.search(line)
+            if match:
+                record['thread_id'] = int(match.group(1))
+            continue
+        if not line.startswith('#'):
+            continue
+        tokens = line[1:].split()
+        for position, token in enumerate(tokens):
+            if not token.endswith(':') or position + 1 >= len(tokens):
+                continue
+            value = tokens[position + 1]
+            if value.endswith(':'):
+                continue  # 空值，如 MariaDB 的 "Schema:  QC_hit: No"
+            name, field_type = _RESOLVED.get(token) or _resolve(token)
+            try:
+                record[name] = _convert(field_type, value) if field_type else _infer(value)
+            except ValueError:
+                continue
+    return record
+
+def extra_values(record):
+    """EXTRA_FIELDS 的值（布尔转为0/1，没有的字段为None），顺序与 EXTRA_NAMES 一致"""
+    values = []
+    for name in EXTRA_NAMES:
+        value = record.get(name)
+        values.append(int(value) if isinstance(value, bool) else value)
+    return values
@@ -10,6 +10,7 @@ import re
 import hashlib
 import pymysql
 from datetime import datetime, timedelta
+from rollups import fold_pending_details
 import argparse
 
 class SlowLogParser:
@@ -458,6 +459,9 @@ class SlowLogParser:
                 print(f"  SQL指纹记录: {len(self.fingerprints)} 条")
                 print(f"  详细执行记录: {len(self.details)} 条")
                 
+                # 本脚本不写执行键，提交后把新写入的明细计入按天汇总，接口的列表和统计才能看到
+                print(f"  计入按天汇总: {fold_pending_details(connection, cursor)} 条明细")
+                
         except Exception as e:
             print(f"数据库保存失败: {e}")
         finally:
@@ -0,0 +1,181 @@
+"""
+接口自身的慢SQL记录
+- BudgetedCursor 对每条语句计时（执行 + 取数），超过阈值的语句写入环形缓冲区
+- 每个工作进程追加写入共享目录下的 slowsql_<pid>.jsonl，管理接口汇总所有进程
+- EXPLAIN FORMAT=JSON 只在管理接口请求时按需执行，不增加正常请求的开销
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import has_request_context, request
+from config import API_CONFIG
+from metrics import get_metrics_dir
+from serializer import dumps
+
+logger = logging.getLogger(__name__)
+
+# 记录的SQL和单个参数的最大长度，超长参数的语句不能再执行EXPLAIN
+MAX_SQL_LENGTH = 8000
+MAX_PARAM_LENGTH = 1000
+
+class TracedStatement:
+    """一条语句从 execute 到取完结果的耗时和行数"""
+
+    __slots__ = ('sql', 'params', 'filename', 'lineno', 'started_at', 'elapsed', 'rows', 'error')
+
+    def __init__(self, sql, params, frame):
+        self.sql = sql
+        self.params = params
+        self.filename = frame.f_code.co_filename if frame is not None else ''
+        self.lineno = frame.f_lineno if frame is not None else 0
+        self.started_at = time.time()
+        self.elapsed = 0.0
+        self.rows = 0
+        self.error = None
+
+def _normalize_params(params):
+    """转换为可序列化、可重新执行的参数，返回 (params, explainable)"""
+    if params is None:
+        return None, True
+    if isinstance(params, dict):
+        items = list(params.items())
+    else:
+        items = list(enumerate(params))
+
+    explainable = True
+    normalized = {}
+    for key, value in items:
+        if isinstance(value, (bytes, bytearray)):
+            value = value.decode('utf-8', errors='replace')
+        if isinstance(value, str) and len(value) > MAX_PARAM_LENGTH:
+            value = value[:MAX_PARAM_LENGTH] + '...'
+            explainable = False
+        normalized[key] = value
+    if isinstance(params, dict):
+        return normalized, explainable
+    return [normalized[i] for i in range(len(items))], explainable
+
+class SlowStatementLog:
+    """当前进程的慢SQL环形缓冲区"""
+
+    def __init__(self, threshold, size):
+        self.threshold = threshold
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=size)
+        self._pid = os.getpid()
+        self._seq = 0
+        self._written = 0
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def start(self, operation, params, frame=None):
+        """开始计时一条语句，未启用时返回None"""
+        if not self.enabled:
+            return None
+        return TracedStatement(operation, params, frame)
+
+    def finish(self, statement, rowcount=-1):
+        """语句结束，超过阈值时记录"""
+        if statement.elapsed < self.threshold:
+            return
+        sql = statement.sql.decode('utf-8', errors='replace') if isinstance(statement.sql, bytes) else str(statement.sql)
+        if sql.lstrip().upper().startswith('EXPLAIN'):
+            return
+
+        params, explainable = _normalize_params(statement.params)
+        entry = {
+            'timestamp': datetime.fromtimestamp(statement.started_at).isoformat(timespec='milliseconds'),
+            'duration': round(statement.elapsed, 4),
+            'rows': statement.rows if statement.rows else max(rowcount, 0),
+            'sql': sql[:MAX_SQL_LENGTH],
+            'params': params,
+            'explainable': explainable and len(sql) <= MAX_SQL_LENGTH and sql.lstrip().upper().startswith('SELECT'),
+            'caller': f"{os.path.basename(statement.filename)}:{statement.lineno}",
+            'error': statement.error,
+            'pid': os.getpid(),
+        }
+        if has_request_context():
+            rule = request.url_rule
+            entry['endpoint'] = rule.rule if rule is not None else request.path
+            entry['method'] = request.method
+        self.record(entry)
+
+    def _path(self):
+        return os.path.join(get_metrics_dir(), f"slowsql_{os.getpid()}.jsonl")
+
+    def record(self, entry):
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork后不继承父进程的记录
+                self._entries.clear()
+                self._pid = os.getpid()
+                self._seq = 0
+                self._written = 0
+            self._seq += 1
+            entry['id'] = f"{self._pid}-{self._seq}"
+            self._entries.append(entry)
+            logger.warning(f"慢SQL {entry['duration']}秒 ({entry['caller']}): {entry['sql'][:200]}")
+
+            try:
+                os.makedirs(get_metrics_dir(), exist_ok=True)
+                if self._written >= self.size * 2:
+                    # 追加写入的文件超过缓冲区两倍时按当前缓冲区重写
+                    tmp = self._path() + '.tmp'
+                    with open(tmp, 'wb') as f:
+                        f.write(b''.join(dumps(item) + b'\n' for item in self._entries))
+                    os.replace(tmp, self._path())
+                    self._written = len(self._entries)
+                else:
+                    with open(self._path(), 'ab') as f:
+                        f.write(dumps(entry) + b'\n')
+                    self._written += 1
+            except OSError as e:
+                logger.warning(f"写入慢SQL记录失败: {str(e)}")
+
+    def recent(self, limit=100):
+        """汇总所有工作进程记录的慢SQL，按时间倒序"""
+        entries = {}
+        directory = get_metrics_dir()
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                if not (filename.startswith('slowsql_') and filename.endswith('.jsonl')):
+                    continue
+                try:
+                    with open(os.path.join(directory, filename), encoding='utf-8') as f:
+                        lines = deque(f, maxlen=self.size)
+                except OSError:
+                    continue
+                for line in lines:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue
+                    entries[item['id']] = item
+        with self._lock:
+            for item in self._entries:
+                entries[item['id']] = dict(item)
+        return sorted(entries.values(), key=lambda item: item['timestamp'], reverse=True)[:limit]
+
+def explain(db, entry):
+    """对记录的SELECT执行 EXPLAIN FORMAT=JSON，返回执行计划"""
+    if not entry.get('explainable'):
+        return None
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"EXPLAIN FORMAT=JSON {entry['sql']}", entry.get('params'))
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+    finally:
+        cursor.close()
+
+slow_sql_log = SlowStatementLog(
+    threshold=API_CONFIG['SQL_TRACE_THRESHOLD'],
+    size=API_CONFIG['SQL_TRACE_BUFFER_SIZE']
+)
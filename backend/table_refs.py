@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQL指纹引用的表和语句类型
+- 解析器生成新指纹时从原始SQL中提取 FROM/JOIN/UPDATE/INTO/TABLE 后的表名和语句类型，
+  写入 fingerprint_tables 映射表（每个指纹每张表一行），接口按表名/语句类型过滤时走索引，
+  不再对 normalized_sql 做 LIKE 全表扫描
+- 未识别出表名的指纹（如 SELECT 1）写入 table_name 为空的一行，保证按语句类型过滤时不遗漏
+- 表名统一为小写、去掉反引号和库名前缀；函数参数中的 FROM（如 EXTRACT(YEAR FROM d)）可能被误识别为表
+只依赖标准库，解析器（pymysql）和接口（mysql-connector）共用
+
+为已有指纹补全映射（backend目录下）:
+    python table_refs.py
+"""
+import re
+import sys
+
+FINGERPRINT_TABLES_DDL = """
+    CREATE TABLE IF NOT EXISTS fingerprint_tables (
+        checksum VARCHAR(32) NOT NULL,
+        table_name VARCHAR(64) NOT NULL,
+        stmt_type VARCHAR(16) NOT NULL,
+        PRIMARY KEY (checksum, table_name),
+        INDEX idx_table_name (table_name, checksum),
+        INDEX idx_stmt_type (stmt_type, checksum)
+    )
+"""
+
+# 只扫描SQL的前一段，超长的 INSERT ... VALUES 后面只有数据
+MAX_SCAN_LENGTH = 64 * 1024
+
+_COMMENTS = re.compile(r'/\*.*?\*/|(?:--|#)[^\n]*', re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"", re.DOTALL)
+
+# 表名列表在下一个子句关键字或括号处结束
+_TABLE_CLAUSE = re.compile(
+    r'\b(?:FROM|JOIN|UPDATE|INTO|TABLE)\s+(.*?)'
+    r'(?=\b(?:WHERE|JOIN|INNER|LEFT|RIGHT|CROSS|STRAIGHT_JOIN|NATURAL|ON|USING|SET|GROUP|ORDER|HAVING|LIMIT|UNION'
+    r'|VALUES?|SELECT|FORCE|USE|IGNORE|PARTITION|FOR|LOCK|WINDOW|INTO)\b|[();]|$)',
+    re.IGNORECASE | re.DOTALL,
+)
+_IDENTIFIER = re.compile(r'^`?([\w$]+)`?(?:\s*\.\s*`?([\w$]+)`?)?')
+
+# 紧跟在 FROM/INTO 等关键字后但不是表名的词
+_NOT_TABLES = {'dual', 'outfile', 'dumpfile', 'lateral', 'if', 'low_priority', 'delayed', 'high_priority',
+               'quick', 'temporary', 'only'}
+
+def _strip(sql):
+    """去掉注释和字符串字面量"""
+    sql = _COMMENTS.sub(' ', sql[:MAX_SCAN_LENGTH])
+    return _STRINGS.sub("''", sql)
+
+def statement_type(sql):
+    """语句类型（SELECT/INSERT/UPDATE/DELETE/REPLACE/...），WITH 开头的按 SELECT 处理"""
+    match = re.match(r'[\s(]*([A-Za-z]+)', _strip(sql))
+    if not match:
+        return 'OTHER'
+    stmt_type = match.group(1).upper()
+    if stmt_type == 'WITH':
+        return 'SELECT'
+    return stmt_type[:16]
+
+def extract_tables(sql):
+    """返回SQL引用的表名（小写、去重、按出现顺序）"""
+    tables = []
+    for match in _TABLE_CLAUSE.finditer(_strip(sql)):
+        for part in match.group(1).split(','):
+            ident = _IDENTIFIER.match(part.strip())
+            if not ident:
+                continue
+            name = (ident.group(2) or ident.group(1)).lower()
+            if name not in _NOT_TABLES and not name.isdigit() and name not in tables:
+                tables.append(name[:64])
+    return tables
+
+def mapping_rows(checksum, sql):
+    """生成写入 fingerprint_tables 的行"""
+    stmt_type = statement_type(sql)
+    tables = extract_tables(sql) or ['']
+    return [(checksum, table, stmt_type) for table in tables]
+
+def backfill(cursor, batch_size=1000):
+    """为还没有映射的已有指纹补全 fingerprint_tables，返回处理的指纹数"""
+    total = 0
+    last_id = 0
+    while True:
+        cursor.execute("""
+            SELECT f.id, f.checksum, COALESCE(f.raw_sql, f.normalized_sql)
+            FROM slow_query_fingerprint f
+            WHERE f.id > %s
+            AND NOT EXISTS (SELECT 1 FROM fingerprint_tables t WHERE t.checksum = f.checksum)
+            ORDER BY f.id
+            LIMIT %s
+        """, (last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return total
+        mapping = []
+        for row_id, checksum, sql in rows:
+            mapping.extend(mapping_rows(checksum, sql or ''))
+            last_id = row_id
+        cursor.executemany("""
+            INSERT IGNORE INTO fingerprint_tables (checksum, table_name, stmt_type)
+            VALUES (%s, %s, %s)
+        """, mapping)
+        total += len(rows)
+
+def main():
+    import pymysql
+    try:
+        from server_config import DB_CONFIG
+    except ImportError:
+        print("警告: 未找到server_config.py，请确认数据库配置")
+        sys.exit(1)
+
+    conn = pymysql.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(FINGERPRINT_TABLES_DDL)
+        total = backfill(cursor)
+        conn.commit()
+        print(f"已为 {total} 个指纹补全表名映射")
+    except Exception as e:
+        conn.rollback()
+        print(f"补全表名映射失败: {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
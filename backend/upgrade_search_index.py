@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全文搜索索引升级脚本
+为 slow_query_fingerprint.normalized_sql 添加 FULLTEXT 索引，供 /api/queries/search 使用
+新安装由 init_tables.py 直接建出该索引，已有的库在解析器下次入库或执行 init_tables.py 时自动添加，
+也可以执行本脚本提前添加（会先确认）
+"""
+
+import pymysql
+import sys
+
+# 尝试导入配置文件
+try:
+    from server_config import DB_CONFIG
+except ImportError:
+    print("警告: 未找到server_config.py，请确认数据库配置")
+    sys.exit(1)
+
+INDEX_NAME = 'ft_normalized_sql'
+
+def index_exists(cursor):
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM INFORMATION_SCHEMA.STATISTICS
+        WHERE TABLE_SCHEMA = %s
+        AND TABLE_NAME = 'slow_query_fingerprint'
+        AND INDEX_NAME = %s
+    """, (DB_CONFIG['database'], INDEX_NAME))
+    return cursor.fetchone()[0] > 0
+
+def upgrade_search_index():
+    """添加全文索引"""
+    print("=" * 60)
+    print("全文搜索索引升级工具")
+    print("=" * 60)
+
+    print("数据库配置:")
+    print(f"  主机: {DB_CONFIG['host']}")
+    print(f"  用户: {DB_CONFIG['user']}")
+    print(f"  数据库: {DB_CONFIG['database']}")
+
+    conn = pymysql.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+
+    try:
+        if index_exists(cursor):
+            print(f"\n索引 {INDEX_NAME} 已存在，无需升级")
+            return
+
+        cursor.execute("SELECT COUNT(*) FROM slow_query_fingerprint")
+        total = cursor.fetchone()[0]
+        print(f"\n指纹表共 {total} 条记录")
+        print("首次添加FULLTEXT索引时InnoDB会重建表，期间指纹表的写入会被阻塞")
+
+        # 确认是否继续
+        response = input("\n确认要添加全文索引吗? (y/N): ")
+        if not response.lower() in ['y', 'yes']:
+            print("升级已取消")
+            return
+
+        sql = f"ALTER TABLE slow_query_fingerprint ADD FULLTEXT INDEX {INDEX_NAME} (normalized_sql)"
+        print(f"\n执行: {sql}")
+        cursor.execute(sql)
+
+        if not index_exists(cursor):
+            print("升级失败: 未找到新建的索引")
+            sys.exit(1)
+        print(f"✓ 索引 {INDEX_NAME} 添加完成，/api/queries/search 可以使用了")
+
+    except Exception as e:
+        print(f"\n升级失败: {e}")
+
+        # 显示详细错误信息
+        import traceback
+        print("\n详细错误信息:")
+        traceback.print_exc()
+
+        sys.exit(1)
+
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == '__main__':
+    upgrade_search_index()
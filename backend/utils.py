@@ -1,9 +1,13 @@
 from functools import wraps
 import logging
+import time
 import traceback
-from flask import jsonify, current_app
+from flask import current_app
 from config import StatusCode, Messages
 from mysql.connector import Error as MySQLError
+from serializer import dumps
+from db import PoolTimeoutError, QueryTimeoutError
+from metrics import add_serialize_time
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -17,7 +21,11 @@ def api_response(success=True, message="", data=None, status_code=StatusCode.SUC
     }
     if not success:
         logger.error(f"API Error: {message}")
-    return jsonify(response), status_code
+    # 使用快速序列化器代替jsonify（datetime输出ISO格式，Decimal输出数字）
+    start = time.perf_counter()
+    body = dumps(response)
+    add_serialize_time(time.perf_counter() - start)
+    return current_app.response_class(body, mimetype='application/json'), status_code
 
 def handle_api_error(error_type="QUERY_ERROR"):
     """
@@ -28,6 +36,9 @@ def handle_api_error(error_type="QUERY_ERROR"):
         def decorated_function(*args, **kwargs):
             try:
                 return f(*args, **kwargs)
+            except (PoolTimeoutError, QueryTimeoutError):
+                # 由应用级错误处理返回503/422
+                raise
             except MySQLError as e:
                 logger.error(f"Database error in {f.__name__}: {str(e)}")
                 logger.debug(traceback.format_exc())
@@ -1,8 +1,38 @@
 import { defineConfig } from 'vite'
 import react from '@vitejs/plugin-react-swc'
+import fs from 'node:fs'
+import path from 'node:path'
+import zlib from 'node:zlib'
+
+// 构建完成后生成 .gz/.br 预压缩文件，由后端按 Accept-Encoding 直接返回
+function precompress({ threshold = 1024, test = /\.(js|css|html|svg|json)$/ } = {}) {
+  let outDir = 'dist'
+  return {
+    name: 'precompress',
+    apply: 'build',
+    configResolved(config) {
+      outDir = path.resolve(config.root, config.build.outDir)
+    },
+    closeBundle() {
+      const walk = (dir) => fs.readdirSync(dir, { withFileTypes: true }).flatMap((entry) => {
+        const fullPath = path.join(dir, entry.name)
+        return entry.isDirectory() ? walk(fullPath) : [fullPath]
+      })
+      for (const file of walk(outDir)) {
+        if (!test.test(file)) continue
+        const content = fs.readFileSync(file)
+        if (content.length < threshold) continue
+        fs.writeFileSync(`${file}.gz`, zlib.gzipSync(content, { level: 9 }))
+        fs.writeFileSync(`${file}.br`, zlib.brotliCompressSync(content, {
+          params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 11 }
+        }))
+      }
+    }
+  }
+}
 
 export default defineConfig({
-  plugins: [react()],
+  plugins: [react(), precompress()],
   server: {
     host: '0.0.0.0',
     port: 3000,